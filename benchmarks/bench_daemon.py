@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Time daemon mode's incremental updates and how long its HTTP endpoint takes to answer, for a large collection.
+
+    python benchmarks/bench_daemon.py [games] [requests]
+
+Nothing is read from disk or the network: the daemon's state is built straight from generated playtimes and sizes.
+"""
+
+import http.client
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+DIRECTORY = tempfile.mkdtemp(prefix="steam_gb_per_hour_daemon_")
+# Must be set before utils is imported, so the real caches are never touched
+os.environ["STEAM_GB_PER_HOUR_ROOT"] = DIRECTORY
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import daemon, data_getter  # noqa: E402
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    rng = random.Random(21)
+    appids = [(i + 1) * 10 for i in range(games)]
+    playtimes = {appid: rng.randint(1, 100000) for appid in appids}
+    names = {appid: "Synthetic game {}".format(appid) for appid in appids}
+    installed = data_getter.InstalledGames(
+        sizes={appid: {"size": rng.randint(1, 150 * 1000 * 1000 * 1000)} for appid in appids},
+        manifests={},
+        unreadable=set()
+    )
+
+    started = time.perf_counter()
+    state = daemon.ReportState(playtimes, names, installed)
+    print("Initial ranking of {} games: {:.3f}s".format(games, time.perf_counter() - started))
+
+    updates = []
+    for _ in range(20):
+        appid = rng.choice(appids)
+        installed.sizes[appid]["size"] = rng.randint(1, 150 * 1000 * 1000 * 1000)
+        started = time.perf_counter()
+        state.update([appid])
+        updates.append(time.perf_counter() - started)
+    print("One manifest changing: {:.3f}s median, including rebuilding the served JSON".format(
+        statistics.median(updates)
+    ))
+
+    server = daemon.serve(state, 0)
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+    try:
+        for path in ("/summary", "/games?top=10", "/report"):
+            times = []
+            for _ in range(requests if path != "/report" else max(1, requests // 20)):
+                started = time.perf_counter()
+                connection.request("GET", path)
+                response = connection.getresponse()
+                body = response.read()
+                times.append(time.perf_counter() - started)
+
+            print("GET {:14} {:8.1f} us median, {:8.1f} us p99 ({} bytes)".format(
+                path, statistics.median(times) * 1e6, sorted(times)[int(len(times) * 0.99)] * 1e6, len(body)
+            ))
+    finally:
+        connection.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Time appending to the history and querying it, and show how big it gets, for a long-running account.
+
+    python benchmarks/bench_history.py [games] [snapshots] [changed share]
+
+Each snapshot changes the playtime or size of the given share of games (default 1%), like a run every few hours.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+DIRECTORY = tempfile.mkdtemp(prefix="steam_gb_per_hour_history_")
+# Must be set before utils is imported, so the real history is never touched
+os.environ["STEAM_GB_PER_HOUR_ROOT"] = DIRECTORY
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import history  # noqa: E402
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    snapshots = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    changed_share = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+
+    rng = random.Random(22)
+    appids = [(i + 1) * 10 for i in range(games)]
+    playtimes = {appid: rng.randint(0, 6000) for appid in appids}
+    sizes = {appid: rng.randint(1, 150 * 1000 * 1000 * 1000) for appid in appids if rng.random() < 0.3}
+
+    timestamp = 1700000000
+    started = time.perf_counter()
+    for _ in range(snapshots):
+        for appid in rng.sample(appids, max(1, int(games * changed_share))):
+            playtimes[appid] += rng.randint(1, 240)
+        history.record("bench", playtimes, sizes, timestamp)
+        timestamp += 4 * 60 * 60
+    appending = time.perf_counter() - started
+
+    directory = history.history_dir("bench")
+    total = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print("{} snapshots of {} games: {:.1f} ms per append, {:.1f} KB on disk ({:.1f} bytes per snapshot)".format(
+        snapshots, games, appending / snapshots * 1000, total / 1000, total / snapshots
+    ))
+
+    for query in ("gb_per_hour", "hours_per_week", "library_growth"):
+        started = time.perf_counter()
+        with history.History(directory) as h:
+            getattr(h, query)()
+        print("{:16} {:8.1f} ms".format(query, (time.perf_counter() - started) * 1000))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
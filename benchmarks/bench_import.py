@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Measure how long importing the library API takes, using python -X importtime in a fresh interpreter, and check that
+importing it doesn't pull in modules that are only needed once work starts.
+
+    python benchmarks/bench_import.py [module] [max_ms]
+
+Exits with status 1 if the import takes longer than max_ms (best of 5 runs), or imports a deferred module.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Imported on first use, never at import time
+DEFERRED_MODULES = ("requests", "urllib3")
+
+
+def import_times(module: str):
+    """
+    Import module in a new interpreter, from a directory with no config, and return (module -> cumulative
+    microseconds, total microseconds).
+    """
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+            cwd=cwd, env={**os.environ, "PYTHONPATH": os.path.abspath(ROOT)},
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True
+        )
+
+    # Lines look like "import time:      self [us] |  cumulative | imported package", innermost imports first
+    times = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[name.strip()] = int(cumulative_us)
+        total += int(self_us)
+
+    return times, total
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "utils.api"
+    max_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 150
+
+    runs = [import_times(module) for _ in range(5)]
+    times, total = min(runs, key=lambda run: run[1])
+
+    print("import {}: {:.1f} ms (best of {})".format(module, total / 1000, len(runs)))
+
+    own = sorted(
+        ((name, us) for name, us in times.items() if name.startswith("utils")), key=lambda item: -item[1]
+    )
+    for name, us in own[:10]:
+        print("  {:30} {:8.1f} ms".format(name, us / 1000))
+
+    failed = False
+
+    deferred = [name for name in times if name.split(".")[0] in DEFERRED_MODULES]
+    if deferred:
+        print("Imported modules that should be deferred: {}".format(", ".join(sorted(deferred))))
+        failed = True
+
+    if total / 1000 > max_ms:
+        print("Import took longer than {} ms".format(max_ms))
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Check that looking up names and sizes costs the same per game however many games an account owns.
+
+    python benchmarks/bench_membership.py [--apps 200000] [--owned 1000,5000,20000,80000] [--repeats 3]
+
+A name index of --apps games and an installed library covering half of them are generated in a temporary directory,
+then steam_ids_to_names and select_game_filesizes are timed for accounts owning each of the --owned counts. Every
+owned game is in the index, so nothing is downloaded. The last column is the time per game relative to the
+smallest account, which should stay close to 1 or fall: select_game_filesizes also goes over every installed
+manifest once per call, which small accounts pay more for per game.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+DIRECTORY = tempfile.mkdtemp(prefix="steam_gb_per_hour_membership_")
+# Must be set before utils is imported, so the real caches are never touched
+os.environ["STEAM_GB_PER_HOUR_ROOT"] = DIRECTORY
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import basiclogger, constants, data_getter, name_index, namespaces, negative_cache  # noqa: E402
+
+
+def best_of(repeats: int, func) -> float:
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+
+    return min(times)
+
+
+def main():
+    args = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+    apps = int(args.get("--apps", 200000))
+    owned_counts = [int(n) for n in args.get("--owned", "1000,5000,20000,80000").split(",") if n]
+    repeats = int(args.get("--repeats", 3))
+
+    basiclogger.set_loglevel(basiclogger.LOGLEVEL.CRITICAL)
+    constants.ensure_directories()
+    namespaces.use_namespace(namespaces.account_hash("BENCHMARK", "membership"))
+
+    rng = random.Random(18)
+    appids = [(i + 1) * 10 for i in range(apps)]
+    name_index.build_index(
+        ((appid, "Synthetic game {}".format(appid)) for appid in appids),
+        os.path.join(DIRECTORY, "cache", "steam_game_names.idx")
+    )
+
+    installed_ids = appids[::2]
+    installed = data_getter.InstalledGames(
+        sizes={appid: {"size": appid * 1000, "path": "", "installdir": ""} for appid in installed_ids},
+        manifests={appid: "" for appid in installed_ids},
+        unreadable=set()
+    )
+
+    print("{:>8}  {:>14}  {:>14}  {:>6}".format("owned", "names us/game", "sizes us/game", "ratio"))
+    first = None
+    for owned in owned_counts:
+        # Owned games are a mix of installed and not, and arrive as strings and ints like they can from callers
+        games = rng.sample(appids, min(owned, apps))
+        games = [str(game) if i % 2 else game for i, game in enumerate(games)]
+
+        names = best_of(repeats, lambda: data_getter.steam_ids_to_names(games))
+        # Uninstalled games are added to the negative cache by the first run, so start each run without them
+        sizes = best_of(repeats, lambda: (
+            negative_cache.get().entries.clear(), data_getter.select_game_filesizes(installed, games)
+        ))
+
+        per_game = (names + sizes) / len(games)
+        first = first or per_game
+        print("{:>8}  {:>14.2f}  {:>14.2f}  {:>6.2f}".format(
+            len(games), names / len(games) * 1e6, sizes / len(games) * 1e6, per_game / first
+        ))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Time building the name search index (--search) for a catalogue the size of Steam's, and searching it.
+
+    python benchmarks/bench_name_search.py [games]
+
+Names are made up from a pool of words, so there are common words ("the", "of") listed by many games and rare ones
+listed by a few, much like the real catalogue. Each search is timed once with typos (fuzzy) and once as prefixes.
+"""
+
+import itertools
+import os
+import random
+import shutil
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+DIRECTORY = tempfile.mkdtemp(prefix="steam_gb_per_hour_name_search_")
+# Must be set before utils is imported, so the real caches are never touched
+os.environ["STEAM_GB_PER_HOUR_ROOT"] = DIRECTORY
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import constants, name_index, name_search  # noqa: E402
+
+
+def made_up_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+
+def with_typo(rng: random.Random, word: str) -> str:
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    rng = random.Random(25)
+    vocabulary = ["the", "of", "simulator", "edition", "soundtrack", "dlc", "2", "3"] + [
+        made_up_word(rng) for _ in range(games // 4)
+    ]
+    # Earlier words are picked far more often than later ones
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    names = [
+        " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(1, 6))).title()
+        + rng.choice(("", ":", " -", "!"))
+        for _ in range(games)
+    ]
+
+    index_path = os.path.join(DIRECTORY, "names.idx")
+    started = time.perf_counter()
+    name_index.build_index((((i + 1) * 10, name) for i, name in enumerate(names)), index_path)
+    print("{:32} {:8.3f}s".format("Name index ({} games)".format(games), time.perf_counter() - started))
+
+    with name_index.NameIndex(index_path) as index:
+        started = time.perf_counter()
+        words = name_search.build_search(index, index_path)
+        print("{:32} {:8.3f}s  ({} words, {:.1f} MB)".format(
+            "Search index", time.perf_counter() - started, words,
+            os.path.getsize(name_search.search_path(index_path)) / (1000 * 1000)
+        ))
+
+    queries = [name.lower().split()[:2] for name in rng.sample(names, 200)]
+    with name_search.open_search(index_path) as search:
+        for label, search_for, query_of in (
+            ("Fuzzy search, with a typo", search.fuzzy, lambda words: " ".join(
+                [with_typo(rng, words[0])] + words[1:]
+            )),
+            ("Prefix search", search.prefix, lambda words: " ".join(word[:3] for word in words)),
+        ):
+            times = []
+            for words in queries:
+                query = query_of(words)
+                started = time.perf_counter()
+                search_for(query, constants.SEARCH_CANDIDATES)
+                times.append(time.perf_counter() - started)
+
+            times.sort()
+            print("{:32} {:8.2f}ms median, {:.2f}ms 95th percentile".format(
+                label, statistics.median(times) * 1000, times[int(len(times) * 0.95)] * 1000
+            ))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Time the uninstall planner (--free) for libraries of a few hundred up to a hundred thousand installed games, and
+compare its plans with uninstalling the games with the most GB per hour first.
+
+    python benchmarks/bench_planner.py [share of the installed size to free]
+
+Nothing is read from disk or the network: sizes and playtimes are generated, with a few games unplayed. Freeing
+30% (the default) means uninstalling many games, which is where the planner has the most to work through.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+DIRECTORY = tempfile.mkdtemp(prefix="steam_gb_per_hour_planner_")
+# Must be set before utils is imported, so the real config and caches are never touched
+os.environ["STEAM_GB_PER_HOUR_ROOT"] = DIRECTORY
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import planner  # noqa: E402
+from utils.stats import BYTES_PER_GB, MINUTES_PER_HOUR  # noqa: E402
+
+
+def main():
+    share = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+
+    rng = random.Random(24)
+    print("{:>7} {:>9} {:>10} {:>12} {:>12} {:>12} {:>9}".format(
+        "games", "time", "GB freed", "lost (h)", "greedy (h)", "bound (h)", "exact"
+    ))
+    for games in (300, 1000, 3000, 10000, 100000):
+        appids = [(i + 1) * 10 for i in range(games)]
+        sizes = {appid: int(rng.lognormvariate(2, 1.5) * BYTES_PER_GB) + 1 for appid in appids}
+        playtimes = {appid: 0 if rng.random() < 0.02 else int(rng.lognormvariate(5, 2)) + 1 for appid in appids}
+
+        started = time.perf_counter()
+        plan = planner.plan(sizes, playtimes, int(sum(sizes.values()) * share))
+        elapsed = time.perf_counter() - started
+
+        print("{:>7} {:>8.3f}s {:>10.0f} {:>12.1f} {:>12.1f} {:>12.1f} {:>9}".format(
+            games, elapsed, plan.freed / BYTES_PER_GB, plan.lost_minutes / MINUTES_PER_HOUR,
+            plan.greedy_minutes / MINUTES_PER_HOUR, plan.lower_bound / MINUTES_PER_HOUR, "yes" if plan.exact else "no"
+        ))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
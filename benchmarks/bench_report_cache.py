@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Time writing a report from scratch against writing it again from the stored one, for a large collection.
+
+    python benchmarks/bench_report_cache.py [games] [changed games] [format]
+
+Times a run with nothing stored, one where nothing changed, and one where the given number of games (default 20)
+changed playtime.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+DIRECTORY = tempfile.mkdtemp(prefix="steam_gb_per_hour_report_cache_")
+# Must be set before utils is imported, so the real caches are never touched
+os.environ["STEAM_GB_PER_HOUR_ROOT"] = DIRECTORY
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import report  # noqa: E402
+
+
+def timed(write) -> float:
+    started = time.perf_counter()
+    write()
+    return time.perf_counter() - started
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    changed = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    report_format = sys.argv[3] if len(sys.argv) > 3 else "table"
+
+    rng = random.Random(23)
+    appids = [(i + 1) * 10 for i in range(games)]
+    playtimes = {appid: rng.randint(1, 100000) for appid in appids}
+    sizes = {appid: rng.randint(1, 150 * 1000 * 1000 * 1000) for appid in appids}
+    names = {appid: "Synthetic game {}".format(appid) for appid in appids}
+
+    options = report.ReportOptions(format=report_format, echo=False)
+    path = os.path.join(DIRECTORY, "results")
+    cache_dir = os.path.join(DIRECTORY, "reports")
+
+    def write(memoized=True):
+        report.write_report(path, playtimes, names, sizes, None, options, cache_dir if memoized else None)
+
+    print("{} games, {} format".format(games, report_format))
+    print("{:28} {:8.3f}s".format("Without the cache", timed(lambda: write(memoized=False))))
+    print("{:28} {:8.3f}s".format("Nothing stored yet", timed(write)))
+    print("{:28} {:8.3f}s".format("Nothing changed", timed(write)))
+
+    for appid in rng.sample(appids, changed):
+        playtimes[appid] += rng.randint(1, 600)
+    print("{:28} {:8.3f}s".format("{} games changed".format(changed), timed(write)))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
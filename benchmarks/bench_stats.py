@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare the report statistics on columns against the dict-based ranking they replaced, for a large collection.
+
+    python benchmarks/bench_stats.py [games] [repeats]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.stats import GameColumns  # noqa: E402
+
+
+def dict_ranking(playtimes, game_filesizes):
+    """
+    The old report: two sorts with lambda keys, a dict of GB/hr and two generator sums for the average.
+    """
+    sorted_playtimes = sorted(playtimes, key=lambda t: -playtimes[t])
+    sorted_playtimes = list(filter(
+        lambda pt: pt in game_filesizes and game_filesizes[pt] > 0 and pt in playtimes and playtimes[pt] > 0,
+        sorted_playtimes
+    ))
+    filesize_values = {
+        gameid: (game_filesizes[gameid] / (1000 * 1000 * 1000)) / (playtimes[gameid] / 60)
+        for gameid in sorted_playtimes
+    }
+    ranked = sorted(sorted_playtimes, key=lambda t: -filesize_values[t])
+
+    average = sum(game_filesizes[gameid] / 1000 / 1000 / 1000 for gameid in ranked) / \
+        sum(playtimes[gameid] / 60 for gameid in ranked)
+    return ranked[0], ranked[-1], average
+
+
+def column_summary(playtimes, game_filesizes):
+    columns = GameColumns.from_dicts(playtimes, game_filesizes)
+    return (
+        columns.top(1), columns.top(1, most=False), columns.average(), columns.percentiles(), columns.histogram(),
+        columns.top(10)
+    )
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    rng = random.Random(19)
+    playtimes = {appid: rng.randint(1, 100000) for appid in range(10, games * 10 + 1, 10)}
+    game_filesizes = {appid: rng.randint(1, 150 * 1000 * 1000 * 1000) for appid in playtimes}
+
+    for label, func in (("dict ranking", dict_ranking), ("columns (with percentiles, histogram, top 10)",
+                                                          column_summary)):
+        seconds = min(timeit.repeat(lambda: func(playtimes, game_filesizes), number=1, repeat=repeats))
+        print("{:48} {:8.3f}s".format(label, seconds))
+
+    columns = GameColumns.from_dicts(playtimes, game_filesizes)
+    seconds = min(timeit.repeat(columns.pareto_frontier, number=1, repeat=repeats))
+    print("{:48} {:8.3f}s".format("Pareto frontier", seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Benchmark the data_getter functions and the whole main.py flow against generated Steam libraries and a fake Steam
+API, with cold caches, warm caches and partly invalidated caches.
+
+    python benchmarks/bench_suite.py [--libraries 4] [--manifests 20000] [--apps 200000] [--owned 25000]
+                                     [--repeats 3] [--targets playtimes,names,sizes,measure,main]
+                                     [--save results.json] [--baseline baseline.json] [--tolerance 1.25]
+
+Fixtures are generated into a temporary directory (or --dir, which is reused if it already has them), which the
+program is pointed at with STEAM_GB_PER_HOUR_ROOT, so the real config and caches are never touched. Every run is
+a fresh process, so nothing is cached in memory between runs.
+
+Scenarios:
+    cold     the cache directory is emptied before each run
+    warm     the same run again with everything cached
+    partial  before each run, a tenth of the manifests are rewritten, new games are added to the app list and
+             owned by the account, and cached API responses are made to look old
+
+--save writes the results as JSON. --baseline compares against a saved file and exits with status 1 if anything
+got slower than --tolerance times its baseline.
+"""
+
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS_DIR, "..")
+sys.path.insert(0, ROOT)
+
+from fake_steam_api import FakeSteamState, serve  # noqa: E402
+from bench_vdf import synthetic_manifest  # noqa: E402
+
+APIKEY = "BENCHMARK"
+STEAMID = "76561190000000000"
+
+TARGETS = ("playtimes", "names", "sizes", "measure", "main")
+SCENARIOS = ("cold", "warm", "partial")
+
+# Share of the manifests rewritten, and of the owned games added, by a partial invalidation
+INVALIDATED_SHARE = 0.1
+
+
+def generate(directory: str, libraries: int, manifests: int, apps: int, owned: int, files_per_game: int = 2):
+    """
+    Write config, Steam libraries and API fixtures to directory. Game IDs are 10, 20, 30, ... so there are gaps for
+    the apps added by partial invalidations.
+    """
+    rng = random.Random(440)
+
+    appids = [(i + 1) * 10 for i in range(apps)]
+    app_list = [{"appid": appid, "name": "Synthetic game {}".format(appid), "last_modified": 1} for appid in appids]
+
+    installed = appids[:manifests]
+    # Most owned games are installed; the rest are spread over the catalogue, plus a few Steam doesn't list
+    owned_ids = installed[:int(owned * 0.8)]
+    owned_ids += rng.sample(appids[manifests:], max(0, min(owned - len(owned_ids) - 10, apps - manifests)))
+    owned_ids += [appids[-1] + (i + 1) * 10 for i in range(10)]
+
+    steamlibs = []
+    for lib in range(libraries):
+        steamapps = os.path.join(directory, "library{}".format(lib), "steamapps")
+        os.makedirs(os.path.join(steamapps, "common"), exist_ok=True)
+        steamlibs.append(steamapps)
+
+    for i, appid in enumerate(installed):
+        steamapps = steamlibs[i % libraries]
+        with open(os.path.join(steamapps, "appmanifest_{}.acf".format(appid)), "w", encoding="utf-8") as f:
+            f.write(synthetic_manifest(appid, rng.randint(1, 4)))
+
+        game_dir = os.path.join(steamapps, "common", "Synthetic {}".format(appid))
+        os.makedirs(game_dir, exist_ok=True)
+        for n in range(files_per_game):
+            with open(os.path.join(game_dir, "data{}.pak".format(n)), "wb") as f:
+                f.write(b"\0" * rng.randint(1, 8192))
+
+    config_dir = os.path.join(directory, "config")
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, "api_key"), "w") as f:
+        f.write(APIKEY)
+    with open(os.path.join(config_dir, "steam_id"), "w") as f:
+        f.write(STEAMID)
+    with open(os.path.join(config_dir, "steam_libraries.json"), "w") as f:
+        json.dump(steamlibs, f)
+
+    with open(os.path.join(directory, "apps.json"), "w", encoding="utf-8") as f:
+        json.dump(app_list, f)
+
+    save_owned(directory, [{"appid": appid, "playtime_forever": rng.randint(1, 6000)} for appid in owned_ids])
+
+
+def load_fixture(directory: str, name: str):
+    with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_owned(directory: str, games):
+    with open(os.path.join(directory, "owned.json"), "w", encoding="utf-8") as f:
+        json.dump({STEAMID: games}, f)
+
+
+def invalidate(directory: str, state: FakeSteamState, rng: random.Random):
+    """
+    Rewrite some manifests, add some new games to the app list and the account, and age cached API responses.
+    """
+    steamlibs = load_fixture(os.path.join(directory, "config"), "steam_libraries.json")
+    manifests = sorted(
+        os.path.join(steamapps, name) for steamapps in steamlibs for name in os.listdir(steamapps)
+        if name.startswith("appmanifest_")
+    )
+    for path in rng.sample(manifests, max(1, int(len(manifests) * INVALIDATED_SHARE))):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n")
+
+    # New games get IDs between existing ones, so they're never already cached
+    games = state.owned_games[STEAMID]
+    # Later than the last refresh, even if that was this second
+    now = int(time.time()) + 1
+    taken = {app["appid"] for app in state.apps}
+    new_apps = []
+    while len(new_apps) < max(1, int(len(games) * INVALIDATED_SHARE / 10)):
+        appid = rng.randrange(1, state.apps[-1]["appid"])
+        if appid not in taken:
+            taken.add(appid)
+            new_apps.append({"appid": appid, "name": "New game {}".format(appid), "last_modified": now})
+
+    state.apps = sorted(state.apps + new_apps, key=lambda app: app["appid"])
+    games.extend({"appid": app["appid"], "playtime_forever": rng.randint(1, 6000)} for app in new_apps)
+    save_owned(directory, games)
+
+    # Make every cached response older than any TTL, so it has to be revalidated
+    for dirpath, dirnames, filenames in os.walk(os.path.join(directory, "cache")):
+        for filename in filenames:
+            if filename.endswith(".json") and os.path.basename(dirpath) == "http":
+                path = os.path.join(dirpath, filename)
+                with open(path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta["fetched_at"] = 0
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+
+
+def clear_cache(directory: str):
+    shutil.rmtree(os.path.join(directory, "cache"), ignore_errors=True)
+    os.makedirs(os.path.join(directory, "cache"))
+
+
+def run_target(directory: str, target: str, base_url: str) -> float:
+    """
+    Run one target in a new process and return how many seconds it took.
+    """
+    env = {**os.environ, "STEAM_GB_PER_HOUR_ROOT": directory, "STEAM_API_BASE": base_url}
+
+    if target == "main":
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "main.py"), "-v", "0"], cwd=directory, env=env,
+            stdout=subprocess.DEVNULL, check=True
+        )
+        return time.perf_counter() - started
+
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", target], cwd=directory, env=env,
+        stdout=subprocess.PIPE, check=True, universal_newlines=True
+    )
+    return json.loads(result.stdout.splitlines()[-1])["seconds"]
+
+
+def worker(target: str):
+    """
+    Time one data_getter function, with its inputs set up the way main.py would, and print the result as JSON.
+    """
+    from utils import basiclogger, constants, data_getter, namespaces
+
+    basiclogger.set_loglevel(basiclogger.LOGLEVEL.CRITICAL)
+    namespaces.use_namespace(namespaces.account_hash(constants.APIKEY, constants.USERID))
+
+    game_ids = [game["appid"] for game in load_fixture(".", "owned.json")[STEAMID]]
+    steamlibs = constants.STEAMLIBS
+
+    calls = {
+        "playtimes": lambda: data_getter.get_steam_playtimes(constants.APIKEY, constants.USERID),
+        "names": lambda: data_getter.steam_ids_to_names(game_ids, constants.APIKEY),
+        "sizes": lambda: data_getter.get_game_filesizes(steamlibs, game_ids, constants.DEFAULT_WORKERS),
+        "measure": lambda: data_getter.get_measured_filesizes(
+            list(data_getter.get_game_filesizes(steamlibs, game_ids, constants.DEFAULT_WORKERS).keys()),
+            constants.DEFAULT_WORKERS
+        )
+    }
+
+    started = time.perf_counter()
+    calls[target]()
+    seconds = time.perf_counter() - started
+
+    data_getter.negative_cache.flush()
+    print(json.dumps({"seconds": seconds}))
+
+
+def summarise(times):
+    return {"min": min(times), "median": statistics.median(times), "runs": len(times)}
+
+
+def bench(directory: str, targets, repeats: int):
+    state = FakeSteamState(load_fixture(directory, "apps.json"), load_fixture(directory, "owned.json"))
+    server = serve(state)
+    base_url = "http://127.0.0.1:{}".format(server.server_address[1])
+    rng = random.Random(7)
+
+    results = {}
+    try:
+        for target in targets:
+            results[target] = {}
+
+            cold = []
+            for _ in range(repeats):
+                clear_cache(directory)
+                cold.append(run_target(directory, target, base_url))
+            results[target]["cold"] = summarise(cold)
+
+            warm = [run_target(directory, target, base_url) for _ in range(repeats)]
+            results[target]["warm"] = summarise(warm)
+
+            partial = []
+            for _ in range(repeats):
+                invalidate(directory, state, rng)
+                partial.append(run_target(directory, target, base_url))
+            results[target]["partial"] = summarise(partial)
+
+            print("{:10} {}".format(target, "  ".join(
+                "{} {:8.3f}s".format(scenario, results[target][scenario]["median"]) for scenario in SCENARIOS
+            )))
+    finally:
+        server.shutdown()
+
+    return results
+
+
+def compare(results, baseline, tolerance: float) -> bool:
+    """
+    Print how each median changed against the baseline. Returns False if anything got slower than tolerance allows.
+    """
+    ok = True
+    for target, scenarios in results.items():
+        for scenario, summary in scenarios.items():
+            old = baseline.get(target, {}).get(scenario)
+            if not old:
+                continue
+
+            ratio = summary["median"] / old["median"] if old["median"] else float("inf")
+            slower = ratio > tolerance
+            ok = ok and not slower
+            print("{:10} {:8} {:8.3f}s -> {:8.3f}s ({:.2f}x){}".format(
+                target, scenario, old["median"], summary["median"], ratio, "  SLOWER" if slower else ""
+            ))
+
+    return ok
+
+
+def main():
+    args = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+
+    if "--worker" in args:
+        worker(args["--worker"])
+        return
+
+    config = {
+        "libraries": int(args.get("--libraries", 4)),
+        "manifests": int(args.get("--manifests", 20000)),
+        "apps": int(args.get("--apps", 200000)),
+        "owned": int(args.get("--owned", 25000))
+    }
+    repeats = int(args.get("--repeats", 3))
+    targets = [target for target in args.get("--targets", ",".join(TARGETS)).split(",") if target]
+
+    for target in targets:
+        if target not in TARGETS:
+            print("Unknown target {} (choose from {})".format(target, ", ".join(TARGETS)))
+            sys.exit(2)
+
+    directory = args.get("--dir") or tempfile.mkdtemp(prefix="steam_gb_per_hour_bench_")
+    try:
+        if not os.path.isfile(os.path.join(directory, "apps.json")):
+            started = time.perf_counter()
+            generate(directory, **config)
+            print("Generated {manifests} manifests in {libraries} libraries and {apps} apps in {:.1f}s".format(
+                time.perf_counter() - started, **config
+            ))
+
+        results = bench(directory, targets, repeats)
+    finally:
+        if "--dir" not in args:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    output = {"config": config, "python": sys.version.split()[0], "results": results}
+    if "--save" in args:
+        with open(args["--save"], "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=4)
+        print("Saved results to {}".format(args["--save"]))
+
+    if "--baseline" in args:
+        with open(args["--baseline"], "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        if baseline.get("config") != config:
+            print("Baseline was run with {}, not {}".format(baseline.get("config"), config))
+
+        if not compare(results, baseline["results"], float(args.get("--tolerance", 1.25))):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
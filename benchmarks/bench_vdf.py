@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Compare reading SizeOnDisk from large synthetic app manifests with the VDF tokenizer against the
+multiline regex it replaced.
+
+    python benchmarks/bench_vdf.py [depots] [repeats]
+"""
+
+import io
+import os
+import re
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import vdf  # noqa: E402
+
+
+def synthetic_manifest(appid: int, depots: int, nested_first: bool = False) -> str:
+    """
+    Build a manifest with the given number of installed depots. Steam writes the top-level keys before
+    "InstalledDepots"; nested_first moves them after it, with a "SizeOnDisk" key in every depot.
+    """
+    depot_lines = "".join(
+        '\t\t"{depot}"\n\t\t{{\n\t\t\t"manifest"\t\t"{manifest}"\n\t\t\t"size"\t\t"{size}"\n'
+        '{nested}\t\t}}\n'.format(
+            depot=appid + i, manifest=7000000000000 + i, size=i * 1024,
+            nested='\t\t\t"SizeOnDisk"\t\t"{}"\n'.format(i * 1024) if nested_first else ""
+        )
+        for i in range(depots)
+    )
+
+    top_level = (
+        '\t"StateFlags"\t\t"4"\n'
+        '\t"installdir"\t\t"Synthetic {appid}"\n'
+        '\t"LastUpdated"\t\t"1700000000"\n'
+        '\t"SizeOnDisk"\t\t"987654321"\n'
+        '\t"buildid"\t\t"123456"\n'
+    ).format(appid=appid)
+    installed_depots = '\t"InstalledDepots"\n\t{{\n{depots}\t}}\n'.format(depots=depot_lines)
+
+    return (
+        '"AppState"\n{{\n'
+        '\t"appid"\t\t"{appid}"\n'
+        '\t"Universe"\t\t"1"\n'
+        '\t"name"\t\t"Synthetic game {appid}"\n'
+        '{body}'
+        '\t"UserConfig"\n\t{{\n\t\t"language"\t\t"english"\n\t}}\n'
+        '}}\n'
+    ).format(appid=appid, body=installed_depots + top_level if nested_first else top_level + installed_depots)
+
+
+def regex_size(content: str) -> int:
+    return int(re.search(r'^.*"SizeOnDisk".*"(.*)".*$', content, flags=re.M).group(1))
+
+
+def vdf_size(content: str) -> int:
+    return vdf_size_from(io.StringIO(content))
+
+
+def vdf_size_from(fp) -> int:
+    fields = vdf.read_keys(fp, ("SizeOnDisk", "buildid", "LastUpdated", "installdir", "StateFlags"))
+    return int(fields["SizeOnDisk"])
+
+
+def regex_size_file(path: str) -> int:
+    with open(path, "r", encoding="utf-8") as f:
+        return regex_size(f.read())
+
+
+def vdf_size_file(path: str) -> int:
+    with open(path, "r", encoding="utf-8") as f:
+        return vdf_size_from(f)
+
+
+def main():
+    depots = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    for nested_first in (False, True):
+        content = synthetic_manifest(440, depots, nested_first)
+        print("{} layout: {} depots, {} KB".format(
+            "Nested-first" if nested_first else "Steam", depots, len(content) // 1024
+        ))
+
+        with tempfile.NamedTemporaryFile("w", suffix=".acf", encoding="utf-8", delete=False) as f:
+            f.write(content)
+
+        try:
+            for name, func, arg in (
+                    ("regex", regex_size, content), ("vdf", vdf_size, content),
+                    ("regex, from file", regex_size_file, f.name), ("vdf, from file", vdf_size_file, f.name)
+            ):
+                best = min(timeit.repeat(lambda: func(arg), number=repeats, repeat=5)) / repeats
+                size = func(arg)
+                print("  {:16} {:10.1f} us per manifest, SizeOnDisk = {}{}".format(
+                    name, best * 1000 * 1000, size, "" if size == 987654321 else " (wrong)"
+                ))
+        finally:
+            os.remove(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the parts of the Steam Web API this program uses, serving fixture data.
+
+Run it directly to serve a fixture app list, then point the program at it:
+
+    python benchmarks/fake_steam_api.py --apps apps.json --port 8765
+    STEAM_API_BASE=http://127.0.0.1:8765 python main.py
+
+apps.json is a list of {"appid", "name", "last_modified"} objects. --owned optionally takes a JSON object of
+steamid -> list of {"appid", "playtime_forever"} objects. Responses carry an ETag and are answered with 304 Not
+Modified when it matches.
+"""
+
+import hashlib
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeSteamState:
+    def __init__(self, apps: List[dict], owned_games: Optional[Dict[str, List[dict]]] = None):
+        self.apps = sorted(apps, key=lambda app: app["appid"])
+        self.owned_games = owned_games or {}
+        self.requests = []
+
+
+class FakeSteamHandler(BaseHTTPRequestHandler):
+    state: FakeSteamState = None
+
+    def log_message(self, format, *args):
+        return
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.state.requests.append((url.path.rstrip("/"), query))
+
+        route = url.path.rstrip("/")
+        if route == "/ISteamApps/GetAppList/v2":
+            self.send_json({"applist": {"apps": [
+                {"appid": app["appid"], "name": app["name"]} for app in self.state.apps
+            ]}})
+        elif route == "/IStoreService/GetAppList/v1":
+            self.send_store_page(query)
+        elif route == "/IPlayerService/GetOwnedGames/v0001":
+            games = self.state.owned_games.get(query.get("steamid"))
+            if games is None:
+                self.send_json({"response": {}})
+            else:
+                self.send_json({"response": {"game_count": len(games), "games": games}})
+        else:
+            self.send_json({}, status=404)
+
+    def send_store_page(self, query):
+        since = int(query.get("if_modified_since", 0))
+        after = int(query.get("last_appid", 0))
+        limit = int(query.get("max_results", 10000))
+
+        matching = [
+            app for app in self.state.apps if app["appid"] > after and app.get("last_modified", 0) > since
+        ]
+        page = matching[:limit]
+
+        response = {"apps": [
+            {"appid": app["appid"], "name": app["name"], "last_modified": app.get("last_modified", 0)} for app in page
+        ]}
+        if len(matching) > limit:
+            response["have_more_results"] = True
+            response["last_appid"] = page[-1]["appid"]
+
+        self.send_json({"response": response})
+
+
+def serve(state: FakeSteamState, port: int = 0):
+    """
+    Start serving state on a background thread. Returns the server; its base URL is
+    "http://127.0.0.1:{}".format(server.server_address[1]).
+
+    :param state: Fixture data to serve
+    :param port: Port to listen on, or 0 to pick a free one
+    """
+    handler = type("BoundFakeSteamHandler", (FakeSteamHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+if __name__ == "__main__":
+    args = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+
+    with open(args["--apps"], "r", encoding="utf-8") as f:
+        apps = json.load(f)
+
+    owned = {}
+    if "--owned" in args:
+        with open(args["--owned"], "r", encoding="utf-8") as f:
+            owned = json.load(f)
+
+    server = serve(FakeSteamState(apps, owned), int(args.get("--port", 8765)))
+    print("Serving on http://127.0.0.1:{}".format(server.server_address[1]))
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
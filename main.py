@@ -1,114 +1,169 @@
 #!/usr/bin/env python3
-import glob
-import hashlib
 import os.path
 import sys
 
-from utils import arg_parser, constants, data_getter, pathutils
-from utils.basiclogger import log, log_success, log_failure, log_info, log_error, log_warning, is_debug, LOGLEVEL
-from utils.pathutils import from_root
+from utils import api, arg_parser, batch, constants, daemon, data_getter, history, memory_profile, metrics, \
+    name_search, namespaces, planner, report, report_writers, stats
+from utils.basiclogger import log_info, log_error, log_warning, LOGLEVEL, enable_colours
 
 
-def print_and_write(fp, *st, end="\n"):
-    fp.write(" ".join(s for s in st) + end)
-    print(*st, end=end)
+def main() -> int:
+    enable_colours()
 
+    variables = arg_parser.parse_args()
 
-variables = arg_parser.parse_args()
+    if variables["help"]:
+        arg_parser.show_help()
+        return 0
 
-apikey = constants.APIKEY
-steamid = variables["steamid"]
-steamlibs = variables["steamlibs"]
+    if variables["metrics"]:
+        metrics.enable()
 
-info_hash = "{}|{}".format(
-    hashlib.sha256(str(apikey).encode("utf-8")).hexdigest(),
-    hashlib.sha256(str(steamid).encode("utf-8")).hexdigest()
-)
+    if variables["profile_memory"]:
+        memory_profile.enable(variables["memory_budgets"])
 
-if constants.LAST_KEY_AND_ID != info_hash:
-    log_info(LOGLEVEL.INFO, "Key or ID are different. Recaching everything.")
-    files = glob.glob(os.path.join(from_root("cache"), "*"))
-    for f in files:
-        os.remove(f)
+    try:
+        return run(variables)
+    except memory_profile.MemoryBudgetExceeded as e:
+        log_error(LOGLEVEL.CRITICAL, "{}.".format(e))
+        return 1
+    finally:
+        if variables["profile_memory"]:
+            memory_profile.log_report()
 
-with open(constants.LASTUSE_PATH, "w") as f:
-    f.write(info_hash)
+        if variables["metrics"]:
+            metrics.write(variables["metrics"])
+            log_info(LOGLEVEL.INFO, "Wrote metrics to {}".format(os.path.abspath(variables["metrics"])))
 
 
-if variables["help"]:
-    arg_parser.show_help()
-    exit(0)
+def run(variables) -> int:
+    if variables["history"]:
+        if not history.show(variables["steamid"], variables["history"]):
+            log_error(LOGLEVEL.CRITICAL, "There's no history for {} yet. Run a report first.".format(
+                variables["steamid"]
+            ))
+            return 1
 
-if not steamlibs:
-    log_warning(
-        LOGLEVEL.INFO,
-        "Didn't find any Steam libraries in {} and none were provided with -p. This won't work.".format(
-            constants.STEAMLIBS_PATH
+        return 0
+
+    if variables["search"] is not None:
+        if not name_search.show(variables["steamid"], variables["search"], variables["search_prefix"],
+                                data_getter.NAME_INDEX_PATH):
+            log_error(LOGLEVEL.CRITICAL, "There are no game names cached yet. Run a report first.")
+            return 1
+
+        return 0
+
+    apikey = constants.APIKEY
+    if apikey is None:
+        return 1
+
+    constants.ensure_directories()
+
+    steamid = variables["steamid"]
+    steamlibs = variables["steamlibs"]
+    options = report.ReportOptions(variables["format"], variables["top"], variables["bottom"], variables["echo"])
+
+    if not steamlibs:
+        log_warning(
+            LOGLEVEL.INFO,
+            "Didn't find any Steam libraries in {} and none were provided with -p. This won't work.".format(
+                constants.STEAMLIBS_PATH
+            )
         )
-    )
 
-playtimes = data_getter.get_steam_playtimes(apikey, steamid)
+    if variables["free"] is not None and (variables["batch"] or variables["daemon"] is not None):
+        log_error(LOGLEVEL.CRITICAL, "-g can't be used with -b or -d.")
+        return 1
 
-if not playtimes:
-    log_error(LOGLEVEL.CRITICAL, "Couldn't find any games because the Steam API returned no data. "
-                                 "Check your api_key and steam_id files.")
-    log_error(LOGLEVEL.CRITICAL, "If you're sure they're right, use --no-cache to clear the cache.")
-    exit(1)
+    if variables["daemon"] is not None:
+        if variables["batch"]:
+            log_error(LOGLEVEL.CRITICAL, "-d and -b can't be used together.")
+            return 1
 
-game_ids = [gameid for gameid in playtimes.keys()]
+        if variables["measure"]:
+            log_warning(LOGLEVEL.INFO, "-m isn't supported with -d, using the sizes from manifests.")
 
-name_lookups = data_getter.steam_ids_to_names(game_ids)
+        namespaces.use_namespace(namespaces.account_hash(apikey, steamid))
+        return daemon.run_daemon(
+            apikey, steamid, steamlibs, variables["daemon"], variables["workers"], variables["refresh_names"]
+        )
 
-sorted_playtimes = sorted(playtimes, key=lambda t: -playtimes[t])
+    if variables["batch"]:
+        try:
+            steamids = batch.load_steamids(variables["batch"])
+        except IOError as e:
+            log_error(LOGLEVEL.CRITICAL, "Couldn't read Steam user IDs from {} ({}).".format(variables["batch"], e))
+            return 1
 
-game_filesizes = data_getter.get_game_filesizes(steamlibs, game_ids)
+        # Batch runs get their own account cache, shared by every run over the same file
+        namespaces.use_namespace(
+            namespaces.account_hash(apikey, "batch:{}".format(os.path.abspath(variables["batch"])))
+        )
 
-sorted_playtimes = list(filter(
-    lambda pt: pt in game_filesizes and game_filesizes[pt] > 0 and pt in playtimes and playtimes[pt] > 0,
-    sorted_playtimes
-))
+        if not batch.run_batch(apikey, steamids, steamlibs, variables["workers"], variables["refresh_names"],
+                               variables["measure"], options=options):
+            log_error(LOGLEVEL.CRITICAL, "No installed games were found for any of the users in {}.".format(
+                variables["batch"]
+            ))
+            return 1
 
-filesize_values = {
-    gameid: (game_filesizes[gameid] / (1000 * 1000 * 1000)) / (playtimes[gameid] / 60) for gameid in sorted_playtimes
-}
+        return 0
 
-sorted_sizevalues = sorted(sorted_playtimes, key=lambda t: -filesize_values[t])
+    result = api.compute_report(
+        apikey, steamid, steamlibs, variables["workers"], variables["refresh_names"], variables["measure"]
+    )
 
-if len(sorted_sizevalues) > 0:
-    with open("results.log", "w", encoding="utf-8") as f:
-        print_and_write(f, "{} games installed and played:\n".format(len(sorted_playtimes)))
-        print_and_write(f, "\n".join(
-            "{:60}| {:12} | {:40} | {} GB/hr".format(
-                name_lookups[gameid],
-                "{}h {}m".format(
-                    playtimes[gameid] // 60,
-                    playtimes[gameid] % 60
-                ),
-                "{} GB ({} B)".format(round(game_filesizes[gameid] / (1000 * 1000 * 1000), 2), game_filesizes[gameid]),
-                round(filesize_values[gameid], 4)
-            ) for gameid in sorted_sizevalues
-        ))
+    if result is None:
+        log_error(LOGLEVEL.CRITICAL, "Couldn't find any games because the Steam API returned no data. "
+                                     "Check your api_key and steam_id files.")
+        log_error(LOGLEVEL.CRITICAL, "If you're sure they're right, use --no-cache to clear the cache.")
+        return 1
 
-        avg_value = sum(game_filesizes[gameid] / 1000 / 1000 / 1000 for gameid in sorted_sizevalues) / \
-                    sum(playtimes[gameid] / 60 for gameid in sorted_sizevalues)
+    if variables["free"] is not None:
+        return plan_uninstalls(result, variables["free"], variables["free_on"])
 
-        print_and_write(f, "\nThe average game size in GB for one hour of your time is {} GB.\n".format(
-            round(avg_value, 4)
-        ))
+    with metrics.stage("report"), memory_profile.stage("report"):
+        written = report.write_report(
+            report.report_path("results", options), result.playtimes, result.names, result.sizes,
+            result.declared_sizes, options, namespaces.account_cache_path("reports")
+        )
 
-        print_and_write(f, "The best value (least GB) per hour played of your games is {} ({} GB/hr).".format(
-            name_lookups[sorted_sizevalues[-1]], round(filesize_values[sorted_sizevalues[-1]], 4)
-        ))
+    history.add_run(steamid, result.playtimes, result.declared_sizes or result.sizes)
 
-        print_and_write(f, "The worst value (most GB) per hour played of your games is {} ({} GB/hr).".format(
-            name_lookups[sorted_sizevalues[0]], round(filesize_values[sorted_sizevalues[0]], 4)
-        ))
+    if not written:
+        log_error(LOGLEVEL.CRITICAL, "No installed games were found. "
+                                     "Check your api_key, steam_id and steam_libraries.json files.")
+        log_error(LOGLEVEL.CRITICAL, "If you're sure they're right, use --no-cache to clear the cache.")
+        log_error(LOGLEVEL.CRITICAL, "Use -h ({} -h) for help.".format(sys.argv[0]))
+
+    return 0
+
+
+def plan_uninstalls(result: api.ReportResult, free_gb: float, free_on) -> int:
+    target = int(free_gb * stats.BYTES_PER_GB)
+    # A game with no size (e.g. a manifest saying "SizeOnDisk" "0") frees nothing, so it's never worth uninstalling
+    sizes = {gameid: size for gameid, size in result.sizes.items() if gameid in result.playtimes and size > 0}
 
-        print("The above output has also been written to {}.".format(
-            os.path.abspath("results.log")
+    if free_on:
+        try:
+            on_drives = planner.on_drives(result.manifests, free_on)
+        except OSError as e:
+            log_error(LOGLEVEL.CRITICAL, "Couldn't find the drive to free space on ({}).".format(e))
+            return 1
+
+        sizes = {gameid: size for gameid, size in sizes.items() if gameid in on_drives}
+
+    uninstall = planner.plan(sizes, result.playtimes, target)
+    if uninstall is None:
+        log_error(LOGLEVEL.CRITICAL, "Uninstalling every game{} would only free {}.".format(
+            " on those drives" if free_on else "", report_writers.format_gb(sum(sizes.values()))
         ))
-else:
-    log_error(LOGLEVEL.CRITICAL, "No installed games were found. "
-                                 "Check your api_key, steam_id and steam_libraries.json files.")
-    log_error(LOGLEVEL.CRITICAL, "If you're sure they're right, use --no-cache to clear the cache.")
-    log_error(LOGLEVEL.CRITICAL, "Use -h ({} -h) for help.".format(sys.argv[0]))
+        return 1
+
+    planner.show(uninstall, target, result.names, sizes, result.playtimes, result.manifests)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
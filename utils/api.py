@@ -0,0 +1,123 @@
+"""Entry point for using the program from other Python code.
+
+    from utils.api import compute_report
+
+    result = compute_report(apikey, steamid, ["D:/Steam/steamapps"])
+    for game in result.games:
+        print(game.name, game.gb_per_hour)
+
+Nothing here reads the config directory or prints a report; everything compute_report needs is passed in. Caches are
+still kept in the project's "cache" directory, so repeated calls are cheap.
+"""
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from . import constants, data_getter, namespaces, negative_cache
+from .pipeline import Pipeline, StageTiming
+from .stats import GameColumns, GameResult
+
+
+class ReportResult(NamedTuple):
+    steamid: str
+    # Ranked from most to least GB per hour played
+    games: List[GameResult]
+    playtimes: Dict[int, int]
+    names: Dict[int, str]
+    sizes: Dict[int, int]
+    declared_sizes: Optional[Dict[int, int]]
+    # When each stage of the run started and finished, see pipeline
+    timings: Dict[str, StageTiming]
+    # The ranked games as columns, for percentiles, histograms, top-K etc. (see stats)
+    columns: GameColumns
+    # Game ID -> manifest path, for every installed game
+    manifests: Dict[int, str]
+
+    @property
+    def average_gb_per_hour(self) -> Optional[float]:
+        """
+        Total GB installed per total hour played across the ranked games, or None if there aren't any.
+        """
+        return self.columns.average()
+
+
+def run_report_stages(fetch_playtimes: Callable[[], Any], game_ids_of: Callable[[Any], List[int]], apikey, steamlibs,
+                      workers: int = constants.DEFAULT_WORKERS, refresh_names=False,
+                      measure=False) -> Tuple[Dict[str, Any], Pipeline]:
+    """
+    Get playtimes, names and sizes with as much overlap as possible. The library scan and, when the whole name list
+    has to be downloaded anyway, the download start straight away; only picking out the owned games' names and sizes
+    waits for the playtimes.
+
+    :param fetch_playtimes: Returns the playtimes, in whatever form game_ids_of takes
+    :param game_ids_of: Returns the owned game IDs from what fetch_playtimes returned
+    :return: (stage name -> result, the pipeline that was run). The stages are "playtimes", "names", "sizes" and,
+             if measuring, "measured".
+    """
+    pipeline = Pipeline()
+
+    pipeline.add("playtimes", fetch_playtimes)
+    pipeline.add("name_index", lambda: data_getter.prefetch_name_index(refresh_names))
+    pipeline.add("library_scan", lambda: data_getter.scan_installed_games(steamlibs, workers))
+
+    pipeline.add("names", lambda playtimes, prefetched: data_getter.steam_ids_to_names(
+        game_ids_of(playtimes), apikey, refresh_names, prefetched
+    ) if playtimes else {}, after=("playtimes", "name_index"))
+
+    pipeline.add("sizes", lambda playtimes, installed: data_getter.select_game_filesizes(
+        installed, game_ids_of(playtimes)
+    ) if playtimes else {}, after=("playtimes", "library_scan"))
+
+    if measure:
+        pipeline.add("measured", lambda sizes: data_getter.get_measured_filesizes(
+            list(sizes.keys()), workers
+        ), after=("sizes",))
+
+    results = pipeline.run()
+
+    # Everything that can add or remove ignored games has run, so they're saved once
+    negative_cache.flush()
+
+    return results, pipeline
+
+
+def compute_report(apikey, steamid, steamlibs, workers: int = constants.DEFAULT_WORKERS, refresh_names=False,
+                   measure=False) -> Optional[ReportResult]:
+    """
+    Work out how many GB each of an account's installed games takes up per hour played.
+
+    :param apikey: Steam web API key
+    :param steamid: Steam ID of the account
+    :param steamlibs: Paths of the Steam libraries to look for installed games in
+    :param workers: How many drives are read from at the same time
+    :param refresh_names: Refresh the whole game name list instead of only what changed
+    :param measure: Measure game sizes on disk instead of using the sizes from their manifests
+    :return: The report, or None if Steam returned no games for the account
+    """
+    constants.ensure_directories()
+    namespaces.use_namespace(namespaces.account_hash(apikey, steamid))
+
+    results, pipeline = run_report_stages(
+        lambda: data_getter.get_steam_playtimes(apikey, steamid),
+        lambda playtimes: list(playtimes.keys()),
+        apikey, steamlibs, workers, refresh_names, measure
+    )
+
+    playtimes = results["playtimes"]
+    if not playtimes:
+        return None
+
+    name_lookups = results["names"]
+    game_filesizes = results["sizes"]
+
+    declared_filesizes = None
+    if measure:
+        declared_filesizes = game_filesizes
+        game_filesizes = results["measured"]
+
+    columns = GameColumns.from_dicts(playtimes, game_filesizes)
+    games = list(columns.games(columns.ranked(), name_lookups, declared_filesizes))
+
+    return ReportResult(
+        steamid, games, playtimes, name_lookups, game_filesizes, declared_filesizes, pipeline.timings, columns,
+        results["library_scan"].manifests
+    )
@@ -1,11 +1,12 @@
 import glob
 import inspect
 import os
+import shutil
 import sys
 import textwrap
 from typing import Dict, Callable, Optional
 
-from . import constants
+from . import constants, history, memory_profile, report_writers
 from .basiclogger import log_error, LOGLEVEL, set_loglevel
 from .pathutils import from_root
 
@@ -47,10 +48,120 @@ def argact_add_steamlib(variables, steam_library_path):
     variables["steamlibs"].append(steam_library_path)
 
 
+def argact_set_workers(variables, workers):
+    if workers.isdigit() and int(workers) >= 1:
+        variables["workers"] = int(workers)
+    else:
+        log_error(LOGLEVEL.CRITICAL, "Invalid number of workers provided ({}).".format(workers))
+        variables["help"] = True
+
+
+def argact_set_batch(variables, steam_id_file):
+    variables["batch"] = steam_id_file
+
+
+def argact_set_metrics(variables, metrics_dir):
+    variables["metrics"] = metrics_dir
+
+
+def argact_profile_memory(variables):
+    variables["profile_memory"] = True
+
+
+def argact_set_memory_budget(variables, budget):
+    budgets = memory_profile.parse_budgets(budget)
+    if budgets is not None:
+        variables["memory_budgets"] = budgets
+        variables["profile_memory"] = True
+    else:
+        log_error(LOGLEVEL.CRITICAL, "Invalid memory budget provided ({}).".format(budget))
+        variables["help"] = True
+
+
+def argact_set_format(variables, output_format):
+    if output_format.lower() in report_writers.WRITERS:
+        variables["format"] = output_format.lower()
+    else:
+        log_error(LOGLEVEL.CRITICAL, "Invalid report format provided ({}).".format(output_format))
+        variables["help"] = True
+
+
+def argact_set_top(variables, count):
+    if count.isdigit() and int(count) >= 1:
+        variables["top"] = int(count)
+    else:
+        log_error(LOGLEVEL.CRITICAL, "Invalid number of games provided ({}).".format(count))
+        variables["help"] = True
+
+
+def argact_set_bottom(variables, count):
+    if count.isdigit() and int(count) >= 1:
+        variables["bottom"] = int(count)
+    else:
+        log_error(LOGLEVEL.CRITICAL, "Invalid number of games provided ({}).".format(count))
+        variables["help"] = True
+
+
+def argact_set_daemon(variables, port):
+    if port.isdigit() and int(port) <= 65535:
+        variables["daemon"] = int(port)
+    else:
+        log_error(LOGLEVEL.CRITICAL, "Invalid port provided ({}).".format(port))
+        variables["help"] = True
+
+
+def argact_set_history(variables, query):
+    if query.lower() in history.QUERIES:
+        variables["history"] = query.lower()
+    else:
+        log_error(LOGLEVEL.CRITICAL, "Invalid history query provided ({}).".format(query))
+        variables["help"] = True
+
+
+def argact_set_free(variables, gigabytes):
+    try:
+        variables["free"] = float(gigabytes)
+    except ValueError:
+        variables["free"] = None
+
+    if variables["free"] is None or not variables["free"] > 0:
+        log_error(LOGLEVEL.CRITICAL, "Invalid amount of space to free provided ({}).".format(gigabytes))
+        variables["help"] = True
+
+
+def argact_add_free_on(variables, path):
+    variables["free_on"].append(path)
+
+
+def argact_search(variables, query):
+    variables["search"] = query
+    variables["search_prefix"] = False
+
+
+def argact_search_prefix(variables, query):
+    variables["search"] = query
+    variables["search_prefix"] = True
+
+
+def argact_no_echo(variables):
+    variables["echo"] = False
+
+
+def argact_measure(variables):
+    variables["measure"] = True
+
+
+def argact_refresh_names(variables):
+    variables["refresh_names"] = True
+
+
 def argact_nocache(variables):
     files = glob.glob(os.path.join(from_root("cache"), "*"))
     for f in files:
-        os.remove(f)
+        if os.path.isdir(f):
+            shutil.rmtree(f)
+        else:
+            os.remove(f)
 
 
 default_arg_actions: Dict[str, ArgAction] = {
@@ -96,13 +207,141 @@ arg_actions: Dict[str, ArgAction] = {
         "Delete all caches before starting processing. Use if something looks like it's going wrong.",
         argact_nocache
     ),
+
+    "-r": ArgAction(
+        "Download the full list of Steam game names again instead of only fetching games added or changed since "
+        "the last refresh.",
+        argact_refresh_names
+    ),
+
+    "-j": ArgAction(
+        "Set how many drives game manifests are read from at the same time. Manifests on the same drive are always "
+        "read one after another. Defaults to {}.".format(constants.DEFAULT_WORKERS),
+        argact_set_workers
+    ),
+
+    "-m": ArgAction(
+        "Measure how much space each game really takes up on disk (including workshop content) instead of trusting "
+        "the size Steam reports for it. The first run is slow, later runs only look at folders that changed.",
+        argact_measure
+    ),
+
+    "-b": ArgAction(
+        "Write reports for every Steam user ID listed in a file (one per line) instead of a single user. Each user "
+        "gets their own results_<steam_id> report, and the results report shows everyone's playtime added together.",
+        argact_set_batch
+    ),
+
+    "-M": ArgAction(
+        "Record how long each stage took, cache hit rates and how much was downloaded, read and stat'd, and write "
+        "them to metrics.json and steam_gb_per_hour.prom (for node_exporter's textfile collector) in a directory.",
+        argact_set_metrics
+    ),
+
+    "-P": ArgAction(
+        "Profile memory use with tracemalloc, showing how high each stage's memory use peaked and where it "
+        "allocated the most. Stages run one at a time while profiling, so the run is slower.",
+        argact_profile_memory
+    ),
+
+    "-L": ArgAction(
+        "Fail the run if a stage's memory use peaks above a budget in MB, either for every stage (e.g. \"256\") or "
+        "per stage (e.g. \"names=200,sizes=50\"). Stages are {} and {}. Implies -P.".format(
+            ", ".join(memory_profile.STAGES[:-1]), memory_profile.STAGES[-1]
+        ),
+        argact_set_memory_budget
+    ),
+
+    "-f": ArgAction(
+        "Set the report format: table [default] (results.log), csv (results.csv), jsonl (results.jsonl, one game "
+        "per line) or json (results.json, the games plus the statistics at the end of the table). CSV and JSONL "
+        "only have the games.",
+        argact_set_format
+    ),
+
+    "-k": ArgAction(
+        "Only list this many games with the most GB per hour played. Statistics still cover every game. Can be "
+        "used with -K.",
+        argact_set_top
+    ),
+
+    "-K": ArgAction(
+        "Only list this many games with the least GB per hour played. Statistics still cover every game. Can be "
+        "used with -k.",
+        argact_set_bottom
+    ),
+
+    "-d": ArgAction(
+        "Keep running and serve the report as JSON on http://127.0.0.1:<port>/report (also /summary and "
+        "/games?top=K&bottom=K). Steam libraries are watched for games being installed, updated or removed, and "
+        "playtimes are fetched again every {} minutes. Sizes come from manifests, -m isn't supported. Port 0 picks "
+        "a free port.".format(constants.DAEMON_PLAYTIME_INTERVAL // 60),
+        argact_set_daemon
+    ),
+
+    "-H": ArgAction(
+        "Show how the Steam user's games changed over the runs so far instead of making a report: gb_per_hour "
+        "(average GB per hour played at each run), weekly_hours (hours played each week) or library_growth (GB "
+        "installed at each run). Every report adds to the history in the \"history\" directory.",
+        argact_set_history
+    ),
+
+    "-q": ArgAction(
+        "Only write the report to its file instead of printing it as well.",
+        argact_no_echo
+    ),
+
+    "-g": ArgAction(
+        "Instead of making a report, work out which installed games to uninstall to free this many GB while losing "
+        "as few hours played as possible. Usually better than uninstalling the games with the most GB per hour "
+        "first, which is shown for comparison.",
+        argact_set_free
+    ),
+
+    "-G": ArgAction(
+        "With -g, only uninstall games from Steam libraries on the same drive as this path. Can be given more than "
+        "once.",
+        argact_add_free_on
+    ),
+
+    "-s": ArgAction(
+        "Instead of making a report, look up the {} games whose names are most alike this (typos are fine), with "
+        "the playtime, size and GB per hour from the Steam user's last report. Games they own or have installed "
+        "come first. Only uses names and sizes already cached, so no API key is needed.".format(
+            constants.SEARCH_RESULTS
+        ),
+        argact_search
+    ),
+
+    "-S": ArgAction(
+        "Like -s, but only looks up games with a word in their names starting with each word of this, e.g. "
+        "\"wit hun\" for The Witcher 3: Wild Hunt.",
+        argact_search_prefix
+    ),
 }
 
 arg_aliases: Dict[str, str] = {
     **default_arg_aliases,
     "--user-id": "-u",
     "--steam-library-path": "-p",
-    "--no-cache": "-n"
+    "--no-cache": "-n",
+    "--refresh-names": "-r",
+    "--jobs": "-j",
+    "--measure": "-m",
+    "--batch": "-b",
+    "--metrics": "-M",
+    "--profile-memory": "-P",
+    "--memory-budget": "-L",
+    "--format": "-f",
+    "--top": "-k",
+    "--bottom": "-K",
+    "--no-echo": "-q",
+    "--daemon": "-d",
+    "--history": "-H",
+    "--free": "-g",
+    "--free-on": "-G",
+    "--search": "-s",
+    "--search-prefix": "-S"
 }
 
 
@@ -163,7 +402,23 @@ def parse_args():
         "loglevel": LOGLEVEL.INFO,
         "steamid": constants.USERID,
         "steamlibs": constants.STEAMLIBS,
-        "apikey": constants.APIKEY,
+        "refresh_names": False,
+        "workers": constants.DEFAULT_WORKERS,
+        "measure": False,
+        "batch": None,
+        "metrics": None,
+        "profile_memory": False,
+        "memory_budgets": None,
+        "format": "table",
+        "top": None,
+        "bottom": None,
+        "echo": True,
+        "daemon": None,
+        "history": None,
+        "free": None,
+        "free_on": [],
+        "search": None,
+        "search_prefix": False,
         "help": False
     }
 
@@ -1,8 +1,6 @@
 from enum import Enum
 import os
 
-os.system('')
-
 
 class LOGLEVEL(Enum):
     CRITICAL = 0        # Always, even when silent
@@ -14,6 +12,15 @@ class LOGLEVEL(Enum):
 CURRENT_LOGLEVEL = LOGLEVEL.INFO
 
 
+def enable_colours():
+    """
+    Make the Windows console understand the escape codes used for colours. Does nothing elsewhere.
+    """
+    if os.name == "nt":
+        # Running any command through the shell switches the console into VT mode as a side effect
+        os.system('')
+
+
 def is_debug():
     return CURRENT_LOGLEVEL.value >= LOGLEVEL.DEBUG.value
 
@@ -31,7 +38,8 @@ def set_loglevel(loglevel: LOGLEVEL):
 def log(loglevel: LOGLEVEL, *objects, prefix="\u001b[0m[ ]", suffix="\u001b[0m"):
     if CURRENT_LOGLEVEL.value >= loglevel.value:
         text = " ".join(str(o) for o in objects)
-        print(prefix + " [{:^10}] ".format(loglevel.name) + text + suffix)
+        # One write per line, so lines logged from different threads don't run into each other
+        print(prefix + " [{:^10}] ".format(loglevel.name) + text + suffix + "\n", end="")
 
 
 def log_error(loglevel, *objects):
@@ -0,0 +1,119 @@
+"""Reports for many accounts at once, sharing the name and size lookups between them."""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from . import api, constants, data_getter, history, memory_profile, metrics, namespaces, negative_cache, report
+from .basiclogger import log_failure, log_info, log_success, LOGLEVEL
+
+
+class RateLimiter:
+    def __init__(self, per_second: float):
+        self.interval = 1 / per_second if per_second > 0 else 0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_until = max(now, self.next_time)
+            self.next_time = wait_until + self.interval
+
+        if wait_until > now:
+            time.sleep(wait_until - now)
+
+
+def load_steamids(path: str) -> List[str]:
+    """
+    Read Steam IDs from a file, one per line. Blank lines and lines starting with # are skipped.
+
+    :param path: Path to the file
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def fetch_playtimes(apikey, steamids: List[str], workers: int = constants.DEFAULT_WORKERS,
+                    per_second: float = constants.BATCH_REQUESTS_PER_SECOND) -> Dict[str, Dict[int, int]]:
+    """
+    Get the playtimes of several accounts concurrently, starting at most per_second requests a second.
+
+    :param apikey: Steam web API key
+    :param steamids: Steam IDs to look up
+    :param workers: Maximum number of requests in flight
+    :param per_second: Maximum number of requests started per second
+    :return: Steam ID -> playtimes, for the accounts that returned any
+    """
+    limiter = RateLimiter(per_second)
+    ignore_ids = negative_cache.get()
+
+    def fetch(steamid):
+        limiter.wait()
+        return steamid, data_getter.get_steam_playtimes(apikey, steamid, ignore_ids)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(metrics.worker(fetch), steamids))
+
+    return {steamid: playtimes for steamid, playtimes in results if playtimes}
+
+
+def run_batch(apikey, steamids: List[str], steamlibs, workers: int = constants.DEFAULT_WORKERS,
+              refresh_names=False, measure=False, output_dir=".", options=report.ReportOptions()) -> bool:
+    """
+    Write one report per account plus an aggregate report with everyone's playtime added up. Only the aggregate
+    report is printed.
+
+    :return: False if none of the accounts had anything to report
+    """
+    log_info(LOGLEVEL.INFO, "Getting playtimes for {} accounts".format(len(steamids)))
+
+    # Names and sizes only depend on the game, so they're looked up once for everyone
+    results, pipeline = api.run_report_stages(
+        lambda: fetch_playtimes(apikey, steamids, workers),
+        lambda all_playtimes: sorted({gameid for playtimes in all_playtimes.values() for gameid in playtimes}),
+        apikey, steamlibs, workers, refresh_names, measure
+    )
+
+    all_playtimes = results["playtimes"]
+    for steamid in steamids:
+        if steamid not in all_playtimes:
+            log_failure(LOGLEVEL.INFO, "The Steam API returned no games for {}, skipping it".format(steamid))
+
+    if not all_playtimes:
+        return False
+
+    name_lookups = results["names"]
+    game_filesizes = results["sizes"]
+
+    declared_filesizes = None
+    if measure:
+        declared_filesizes = game_filesizes
+        game_filesizes = results["measured"]
+
+    with metrics.stage("report"), memory_profile.stage("report"):
+        cache_dir = namespaces.account_cache_path("reports")
+        aggregate = {}
+        for steamid, playtimes in all_playtimes.items():
+            path = report.report_path(os.path.join(output_dir, "results_{}".format(steamid)), options)
+            if report.write_report(path, playtimes, name_lookups, game_filesizes, declared_filesizes,
+                                   options._replace(echo=False), cache_dir):
+                log_success(LOGLEVEL.INFO, "Wrote report for {} to {}".format(steamid, os.path.abspath(path)))
+            else:
+                log_failure(LOGLEVEL.INFO, "No installed games were found for {}".format(steamid))
+
+            for gameid, playtime in playtimes.items():
+                aggregate[gameid] = aggregate.get(gameid, 0) + playtime
+
+        written = report.write_report(
+            report.report_path(os.path.join(output_dir, "results"), options), aggregate, name_lookups, game_filesizes,
+            declared_filesizes, options, cache_dir
+        )
+
+    for steamid, playtimes in all_playtimes.items():
+        history.add_run(steamid, playtimes, declared_filesizes or game_filesizes)
+
+    return written
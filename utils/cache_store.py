@@ -0,0 +1,309 @@
+"""SQLite-backed store for the small caches that used to be separate JSON files.
+
+The database runs in WAL mode, so several processes can read it while one writes, and every write is a
+transaction that only touches the rows that changed. A crash mid-write leaves the previous contents intact.
+
+The app-name index stays a separate memory-mapped file (see name_index), because it's written in one go from a
+streamed download and only ever read by binary search.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .basiclogger import log_failure, log_info, LOGLEVEL
+from .pathutils import from_root
+
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_sizes (
+    appid INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    installdir TEXT,
+    buildid INTEGER,
+    last_updated INTEGER,
+    state_flags INTEGER,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    st_size INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ignored (
+    namespace TEXT NOT NULL,
+    appid INTEGER NOT NULL,
+    reason TEXT NOT NULL DEFAULT 'not_installed',
+    added_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, appid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS directory_sizes (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    -- JSON lists, see disk_usage.walk
+    links TEXT NOT NULL,
+    dirs TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+FILE_SIZE_COLUMNS = ("size", "installdir", "buildid", "last_updated", "state_flags", "path", "mtime_ns", "st_size")
+
+_local = threading.local()
+
+
+class CacheStore:
+    def __init__(self, path: str):
+        self.path = path
+
+        # Transactions are started explicitly, see transaction()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+
+        self.db.executescript(SCHEMA)
+
+        if self.get_meta("schema_version") != str(SCHEMA_VERSION):
+            self.upgrade()
+
+    def upgrade(self):
+        """
+        Bring the database up to SCHEMA_VERSION. Other threads and processes can be opening it at the same time, so
+        the version is read again once the write lock is held, and only whoever gets there first upgrades it.
+        """
+        with self.transaction() as db:
+            version = self.get_meta("schema_version")
+            migrated = []
+            if version is None:
+                migrated = self.migrate_json()
+            else:
+                if int(version) < 2:
+                    # Ignored games gained a reason and a time they were added. An added time of 0 makes old entries
+                    # expire straight away, so they're looked at again once and then re-added with a proper reason.
+                    db.execute("ALTER TABLE ignored ADD COLUMN reason TEXT NOT NULL DEFAULT 'not_installed'")
+                    db.execute("ALTER TABLE ignored ADD COLUMN added_at REAL NOT NULL DEFAULT 0")
+                if int(version) < 3:
+                    # Measured directory sizes were still kept in a JSON file
+                    migrated = self.migrate_directory_sizes()
+
+            if version != str(SCHEMA_VERSION):
+                self.set_meta("schema_version", str(SCHEMA_VERSION))
+
+        # Only once the import is committed
+        for path in migrated:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        if migrated:
+            log_info(LOGLEVEL.DEBUG, "Migrated {} JSON cache files into {}".format(len(migrated), self.path))
+
+    @contextmanager
+    def transaction(self):
+        if self.db.in_transaction:
+            # Part of a transaction that's already open, which commits or rolls back everything
+            yield self.db
+            return
+
+        # IMMEDIATE takes the write lock up front, so two processes can't both read and then overwrite each other
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        else:
+            self.db.execute("COMMIT")
+
+    def close(self):
+        self.db.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self.transaction() as db:
+            db.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    def load_file_sizes(self) -> Dict[int, dict]:
+        rows = self.db.execute("SELECT appid, {} FROM file_sizes".format(", ".join(FILE_SIZE_COLUMNS)))
+        return {row[0]: dict(zip(FILE_SIZE_COLUMNS, row[1:])) for row in rows}
+
+    def update_file_sizes(self, changed: Dict[int, dict], removed: Iterable[int] = ()):
+        """
+        Upsert the changed entries and delete the removed ones in one transaction.
+
+        :param changed: Game ID -> entry with every column in FILE_SIZE_COLUMNS
+        :param removed: Game IDs to delete
+        """
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO file_sizes (appid, {columns}) VALUES (?, {placeholders}) "
+                "ON CONFLICT(appid) DO UPDATE SET {updates}".format(
+                    columns=", ".join(FILE_SIZE_COLUMNS),
+                    placeholders=", ".join("?" for _ in FILE_SIZE_COLUMNS),
+                    updates=", ".join("{0} = excluded.{0}".format(column) for column in FILE_SIZE_COLUMNS)
+                ),
+                ((appid, *(entry.get(column) for column in FILE_SIZE_COLUMNS)) for appid, entry in changed.items())
+            )
+            db.executemany("DELETE FROM file_sizes WHERE appid = ?", ((appid,) for appid in removed))
+
+    def load_ignored(self, namespace: str) -> Dict[int, Tuple[str, float]]:
+        rows = self.db.execute("SELECT appid, reason, added_at FROM ignored WHERE namespace = ?", (namespace,))
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def update_ignored(self, namespace: str, added: Dict[int, Tuple[str, float]], removed: Iterable[int] = ()):
+        """
+        Upsert the added entries and delete the removed ones for one namespace in one transaction.
+
+        :param added: Game ID -> (reason, time added)
+        :param removed: Game IDs to delete
+        """
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO ignored (namespace, appid, reason, added_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, appid) DO UPDATE SET reason = excluded.reason, added_at = excluded.added_at",
+                ((namespace, int(appid), reason, added_at) for appid, (reason, added_at) in added.items())
+            )
+            db.executemany(
+                "DELETE FROM ignored WHERE namespace = ? AND appid = ?",
+                ((namespace, int(appid)) for appid in removed)
+            )
+
+    def load_directory_sizes(self) -> Dict[str, dict]:
+        rows = self.db.execute("SELECT path, mtime_ns, files, links, dirs FROM directory_sizes")
+        return {
+            row[0]: {"mtime_ns": row[1], "files": row[2], "links": json.loads(row[3]), "dirs": json.loads(row[4])}
+            for row in rows
+        }
+
+    def update_directory_sizes(self, changed: Dict[str, dict], removed: Iterable[str] = ()):
+        """
+        Upsert the changed entries and delete the removed ones in one transaction.
+
+        :param changed: Directory path -> entry, see disk_usage.walk
+        :param removed: Directory paths to delete
+        """
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO directory_sizes (path, mtime_ns, files, links, dirs) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, files = excluded.files, "
+                "links = excluded.links, dirs = excluded.dirs",
+                (
+                    (path, entry["mtime_ns"], entry["files"], json.dumps(entry["links"]), json.dumps(entry["dirs"]))
+                    for path, entry in changed.items()
+                )
+            )
+            db.executemany("DELETE FROM directory_sizes WHERE path = ?", ((path,) for path in removed))
+
+    def delete_namespace(self, namespace: str):
+        with self.transaction() as db:
+            db.execute("DELETE FROM ignored WHERE namespace = ?", (namespace,))
+
+    def migrate_json(self) -> List[str]:
+        """
+        Import the JSON caches written by older versions.
+
+        :return: The JSON files imported (or dropped), to delete once the import is committed
+        """
+        cache_dir = from_root("cache")
+        migrated = []
+
+        size_path = os.path.join(cache_dir, "game_filesize_cache.json")
+        try:
+            with open(size_path, "r", encoding="utf-8") as f:
+                sizes = json.load(f)
+
+            # Entries from before sizes were keyed on manifest mtimes would be re-read anyway, so they're dropped
+            self.update_file_sizes({
+                int(appid): entry for appid, entry in sizes.items()
+                if isinstance(entry, dict)
+                and all(column in entry for column in ("size", "installdir", "path", "mtime_ns", "st_size"))
+            })
+            migrated.append(size_path)
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError, AttributeError) as e:
+            log_failure(LOGLEVEL.DEBUG, "Couldn't migrate size cache, dropping it")
+            migrated.append(size_path)
+
+        state_path = os.path.join(cache_dir, "steam_game_names_state.json")
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+
+            self.set_meta("names_last_appid", str(int(state["last_appid"])))
+            self.set_meta("names_last_refresh", str(int(state["last_refresh"])))
+            migrated.append(state_path)
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            log_failure(LOGLEVEL.DEBUG, "Couldn't migrate id->name cache state, dropping it")
+            migrated.append(state_path)
+
+        # Ignore lists from before caches were split per account can't be matched to an account, so only the
+        # per-account ones are kept
+        legacy_ignore_path = os.path.join(cache_dir, "ignored_game_ids.json")
+        if os.path.isfile(legacy_ignore_path):
+            migrated.append(legacy_ignore_path)
+
+        accounts_dir = os.path.join(cache_dir, "accounts")
+        if os.path.isdir(accounts_dir):
+            for namespace in os.listdir(accounts_dir):
+                ignore_path = os.path.join(accounts_dir, namespace, "ignored_game_ids.json")
+                try:
+                    # Why these were ignored wasn't recorded, so they're added as already expired
+                    with open(ignore_path, "r", encoding="utf-8") as f:
+                        self.update_ignored(namespace, {int(appid): ("not_installed", 0) for appid in json.load(f)})
+                    migrated.append(ignore_path)
+                except FileNotFoundError:
+                    pass
+                except (IOError, ValueError, TypeError) as e:
+                    log_failure(LOGLEVEL.DEBUG, "Couldn't migrate ignored games for {}, dropping them".format(
+                        namespace
+                    ))
+                    migrated.append(ignore_path)
+
+        return migrated + self.migrate_directory_sizes()
+
+    def migrate_directory_sizes(self) -> List[str]:
+        """
+        Import the measured directory sizes, which stayed in a JSON file for a version longer than the other caches.
+
+        :return: The JSON file if it was imported (or dropped), to delete once the import is committed
+        """
+        path = from_root(os.path.join("cache", "directory_size_cache.json"))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.update_directory_sizes(json.load(f))
+        except FileNotFoundError:
+            return []
+        except (IOError, ValueError, AttributeError, KeyError, TypeError) as e:
+            log_failure(LOGLEVEL.DEBUG, "Couldn't migrate directory size cache, dropping it")
+
+        return [path]
+
+
+def store() -> CacheStore:
+    """
+    Return this thread's connection to the cache database, opening it on first use.
+    """
+    current = getattr(_local, "store", None)
+    if current is None:
+        current = CacheStore(from_root(os.path.join("cache", "cache.sqlite3")))
+        _local.store = current
+
+    return current
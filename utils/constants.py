@@ -1,48 +1,87 @@
+"""Settings and configuration.
+
+The API key, Steam ID and Steam libraries in "config" are read the first time APIKEY, USERID or STEAMLIBS is used,
+not when this module is imported, so importing it never touches the disk.
+"""
+
 import json
 import os
 
 from . import pathutils
 from .basiclogger import log_failure, log_info, log_error, LOGLEVEL, log_warning
 
-LASTUSE_PATH = pathutils.from_root(os.path.join("config", "last_use"))
-LAST_KEY_AND_ID = ""
-if os.path.exists(LASTUSE_PATH):
-    with open(LASTUSE_PATH, "r") as f:
-        LAST_KEY_AND_ID = f.read()
-
-if not os.path.isdir(pathutils.from_root("config")):
-    os.mkdir(pathutils.from_root("config"))
-
-if not os.path.isdir(pathutils.from_root("cache")):
-    os.mkdir(pathutils.from_root("cache"))
-
 APIKEY_PATH = pathutils.from_root(os.path.join("config", "api_key"))
 USERID_PATH = pathutils.from_root(os.path.join("config", "steam_id"))
 STEAMLIBS_PATH = pathutils.from_root(os.path.join("config", "steam_libraries.json"))
 
-APIKEY = None
-USERID = None
-STEAMLIBS = []
+DEFAULT_WORKERS = 4
+
+# How many accounts' caches are kept before the least recently used one is deleted
+MAX_ACCOUNT_CACHES = 8
+
+# Steam asks for no more than 100,000 web API calls a day, which this stays well under
+BATCH_REQUESTS_PER_SECOND = 5
+
+# Owned games and playtimes fetched less than this many seconds ago are reused instead of asking Steam again
+OWNED_GAMES_TTL = 5 * 60
+
+# Daemon mode (-d): how often playtimes are fetched again, how often libraries are listed when they can't be watched,
+# and how long to wait after a manifest changes for Steam to finish writing it
+DAEMON_PLAYTIME_INTERVAL = OWNED_GAMES_TTL
+DAEMON_POLL_INTERVAL = 10
+DAEMON_SETTLE_TIME = 0.5
+
+# Uninstall planning (--free): sizes are rounded down to buckets of at least PLAN_MIN_BUCKET bytes, with no more than
+# PLAN_MAX_BUCKETS of them between nothing and the space to free. Past PLAN_MAX_CELLS games x buckets, finding the best
+# plan would take too long and one is approximated instead.
+PLAN_MIN_BUCKET = 1000 * 1000
+PLAN_MAX_BUCKETS = 1000
+PLAN_MAX_CELLS = 2 * 1000 * 1000
+
+# Name search (--search, --search-prefix): how many games are shown, and how many of the best matches are looked at
+# to pick them, so games in the library come first even when others match slightly better. A word matches a searched
+# word fuzzily when they share at least SEARCH_MIN_SIMILARITY of the trigrams either of them has.
+SEARCH_RESULTS = 10
+SEARCH_CANDIDATES = 200
+SEARCH_MIN_SIMILARITY = 0.3
+
+# How many seconds ignored games stay ignored, by why they were ignored. Games that get installed are looked at
+# again straight away, so not being installed can be remembered for longest.
+NOT_INSTALLED_TTL = 30 * 24 * 60 * 60
+NOT_IN_CATALOGUE_TTL = 7 * 24 * 60 * 60
+CORRUPT_MANIFEST_TTL = 24 * 60 * 60
+
+
+def ensure_directories():
+    """
+    Create the config and cache directories if they don't exist yet.
+    """
+    for directory in ("config", "cache"):
+        os.makedirs(pathutils.from_root(directory), exist_ok=True)
+
+
+def load_apikey():
+    log_info(LOGLEVEL.DEBUG, "Loading API key from {}".format(os.path.abspath(APIKEY_PATH)))
+    if os.path.exists(APIKEY_PATH):
+        with open(APIKEY_PATH, "r") as f:
+            return f.read().split("\n")[0]
 
-log_info(LOGLEVEL.DEBUG, "Loading API key from {}".format(os.path.abspath(APIKEY_PATH)))
-if os.path.exists(APIKEY_PATH):
-    with open(APIKEY_PATH, "r") as f:
-        APIKEY = f.read().split("\n")[0]
-else:
     log_error(
         LOGLEVEL.CRITICAL,
         "Tried to find file containing steam web API key (\"{}\") but it did not exist.".format(
             APIKEY_PATH
         )
     )
-    exit(1)
 
+    return None
+
+
+def load_userid():
+    log_info(LOGLEVEL.DEBUG, "Loading user ID from {}".format(os.path.abspath(USERID_PATH)))
+    if os.path.exists(USERID_PATH):
+        with open(USERID_PATH, "r") as f:
+            return f.read().split("\n")[0]
 
-log_info(LOGLEVEL.DEBUG, "Loading user ID from {}".format(os.path.abspath(USERID_PATH)))
-if os.path.exists(USERID_PATH):
-    with open(USERID_PATH, "r") as f:
-        USERID = f.read().split("\n")[0]
-else:
     log_warning(
         LOGLEVEL.INFO,
         "Didn't load a Steam user ID from {}. Place one there and the program will default to that user ID.".format(
@@ -50,22 +89,45 @@ else:
         )
     )
 
+    return None
 
-log_info(LOGLEVEL.DEBUG, "Loading steam libraries from {}".format(os.path.abspath(STEAMLIBS_PATH)))
-try:
-    with open(STEAMLIBS_PATH, "r") as f:
-        STEAMLIBS = json.load(f)
-except FileNotFoundError as e:
-    log_failure(LOGLEVEL.DEBUG, "Steam libraries file doesn't exist")
-except (IOError, json.JSONDecodeError) as e:
-    log_failure(LOGLEVEL.DEBUG, "Couldn't parse steam libraries file")
 
+def load_steamlibs():
+    steamlibs = []
 
-if not STEAMLIBS:
-    log_warning(
-        LOGLEVEL.DEBUG,
-        "Didn't load any Steam libraries from {}. "
-        "Place one there and the program will default to those library paths.".format(
-            STEAMLIBS_PATH
+    log_info(LOGLEVEL.DEBUG, "Loading steam libraries from {}".format(os.path.abspath(STEAMLIBS_PATH)))
+    try:
+        with open(STEAMLIBS_PATH, "r") as f:
+            steamlibs = json.load(f)
+    except FileNotFoundError as e:
+        log_failure(LOGLEVEL.DEBUG, "Steam libraries file doesn't exist")
+    except (IOError, json.JSONDecodeError) as e:
+        log_failure(LOGLEVEL.DEBUG, "Couldn't parse steam libraries file")
+
+    if not steamlibs:
+        log_warning(
+            LOGLEVEL.DEBUG,
+            "Didn't load any Steam libraries from {}. "
+            "Place one there and the program will default to those library paths.".format(
+                STEAMLIBS_PATH
+            )
         )
-    )
+
+    return steamlibs
+
+
+CONFIG_LOADERS = {
+    "APIKEY": load_apikey,
+    "USERID": load_userid,
+    "STEAMLIBS": load_steamlibs
+}
+
+
+def __getattr__(name):
+    if name in CONFIG_LOADERS:
+        value = CONFIG_LOADERS[name]()
+        globals()[name] = value
+
+        return value
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
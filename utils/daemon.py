@@ -0,0 +1,314 @@
+"""Daemon mode (-d): keep one account's report up to date in memory and serve it over HTTP.
+
+Playtimes, names and installed games are loaded once. After that, manifests are only read again when the library
+watcher sees them change, and playtimes are fetched again every few minutes. Each change re-ranks only the games it
+touched, and the summary is read off the ranking rather than worked out from every game again. The JSON served is
+rebuilt once per change rather than per request, so a request only copies bytes that are already there.
+
+Endpoints, all on 127.0.0.1:
+    /report                   every game from most to least GB per hour played, and the summary
+    /summary                  the summary only (average, best, worst, percentiles, histogram, Pareto frontier)
+    /games?top=K&bottom=K     the K games with the most and/or least GB per hour played
+"""
+
+import json
+import threading
+import time
+from itertools import chain
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from . import api, constants, data_getter, negative_cache, report_writers
+from .basiclogger import log_error, log_failure, log_info, log_success, LOGLEVEL
+from .stats import BYTES_PER_GB, GameResult, gb_per_hour, MINUTES_PER_HOUR, pareto_frontier, Ranking
+from .watcher import open_watcher
+
+
+class Snapshot(NamedTuple):
+    # Goes up by one every time anything changes, used as the ETag
+    version: int
+    report: bytes
+    summary: bytes
+    # Each game's JSON, from most to least GB per hour played
+    games: List[bytes]
+
+
+class ReportState:
+    def __init__(self, playtimes: Dict[int, int], names: Dict[int, str], installed: data_getter.InstalledGames):
+        """
+        :param playtimes: Game ID -> minutes played
+        :param names: Game ID -> name
+        :param installed: Result of scan_installed_games
+        """
+        self.playtimes = playtimes
+        self.names = names
+        self.installed = installed
+        # Game ID -> size in bytes, for the owned and installed games being ranked
+        self.sizes: Dict[int, int] = {}
+        # Sums over the ranked games, for the average
+        self.total_minutes = 0
+        self.total_size = 0
+        # Game IDs on the Pareto frontier of the ranked games, smallest first, or None to work it out again
+        self.frontier: Optional[List[int]] = []
+
+        self.ranking = Ranking()
+        self.game_json: Dict[int, bytes] = {}
+        self.snapshot = Snapshot(0, b"", b"", [])
+
+        self.update(set(playtimes) | set(installed.sizes))
+
+    def size_of(self, gameid: int) -> Optional[int]:
+        entry = self.installed.sizes.get(gameid)
+        if entry is None or gameid not in self.playtimes or gameid not in self.names:
+            return None
+
+        return entry["size"]
+
+    def update(self, gameids: Iterable[int]):
+        """
+        Re-rank the given games from the current playtimes, names and installed games, then rebuild the snapshot.
+        """
+        gameids = set(gameids)
+        for gameid in gameids:
+            size = self.size_of(gameid)
+            minutes = self.playtimes.get(gameid, 0)
+
+            if gameid in self.sizes:
+                # The ranking still has the minutes it was ranked with, which playtimes may no longer have
+                self.total_minutes -= self.ranking.key_of[gameid][1]
+                self.total_size -= self.sizes[gameid]
+
+            if size and minutes > 0:
+                self.total_minutes += minutes
+                self.total_size += size
+                self.sizes[gameid] = size
+                self.game_json[gameid] = json.dumps(GameResult(
+                    gameid, self.names[gameid], minutes, size, None, gb_per_hour(size, minutes)
+                )._asdict()).encode("utf-8")
+            else:
+                self.sizes.pop(gameid, None)
+                self.game_json.pop(gameid, None)
+
+        if self.frontier is not None:
+            if gameids.isdisjoint(self.frontier):
+                # Every game off the frontier is beaten by one on it, and still is since none of those changed
+                self.frontier = pareto_frontier(
+                    (gameid, self.playtimes[gameid], self.sizes[gameid])
+                    for gameid in chain(self.frontier, gameids) if gameid in self.sizes
+                )
+            else:
+                self.frontier = None
+
+        # Each insert moves every game ranked above it, so for lots of changes one sort is quicker
+        if len(gameids) > len(self.ranking) // 4:
+            self.ranking = Ranking.build(
+                (gameid, self.playtimes[gameid], size) for gameid, size in self.sizes.items()
+            )
+        else:
+            for gameid in gameids:
+                if gameid in self.sizes:
+                    self.ranking.update(gameid, self.playtimes[gameid], self.sizes[gameid])
+                else:
+                    self.ranking.remove(gameid)
+
+        self.snapshot = self.build_snapshot()
+
+    def summarise(self) -> report_writers.ReportSummary:
+        """
+        The same summary as report.summarise(), read off the ranking rather than worked out from every game.
+        """
+        if self.frontier is None:
+            self.frontier = pareto_frontier(
+                (gameid, self.playtimes[gameid], size) for gameid, size in self.sizes.items()
+            )
+
+        def game(key) -> GameResult:
+            gb, minutes, gameid = key
+            return GameResult(gameid, self.names[gameid], minutes, self.sizes[gameid], None, gb)
+
+        return report_writers.ReportSummary(
+            total=len(self.ranking),
+            average_gb_per_hour=self.total_size * MINUTES_PER_HOUR / (self.total_minutes * BYTES_PER_GB),
+            best=game(self.ranking.keys[0]),
+            worst=game(self.ranking.keys[-1]),
+            percentiles=self.ranking.percentiles(),
+            histogram=self.ranking.histogram(),
+            pareto_frontier=[game(self.ranking.key_of[gameid]) for gameid in self.frontier]
+        )
+
+    def build_snapshot(self) -> Snapshot:
+        games = [self.game_json[gameid] for gameid in self.ranking.ranked()]
+
+        summary = b"null"
+        if len(self.ranking):
+            summary = json.dumps(report_writers.summary_dict(self.summarise())).encode("utf-8")
+
+        return Snapshot(
+            self.snapshot.version + 1,
+            b'{"games": [' + b", ".join(games) + b'], "summary": ' + summary + b"}",
+            summary,
+            games
+        )
+
+    def apply_manifests(self, steamlibs, paths: Iterable[str]):
+        """
+        Read the given manifests again and re-rank the games they belong to.
+        """
+        changed = data_getter.refresh_manifests(self.installed, steamlibs, paths)
+        negative_cache.flush()
+
+        if changed:
+            log_info(LOGLEVEL.DEBUG, "{} manifests changed".format(len(changed)))
+            self.update(changed)
+
+    def rescan(self, steamlibs, workers: int):
+        """
+        Scan every library again, for when changes might have been missed.
+        """
+        before = set(self.installed.sizes)
+        self.installed = data_getter.scan_installed_games(steamlibs, workers)
+        negative_cache.flush()
+
+        self.update(before | set(self.installed.sizes))
+
+    def refresh_playtimes(self, apikey, steamid):
+        """
+        Fetch playtimes again and re-rank the games whose playtime changed, looking up names for new games.
+        """
+        playtimes = data_getter.get_steam_playtimes(apikey, steamid)
+        if not playtimes:
+            log_failure(LOGLEVEL.INFO, "Couldn't refresh playtimes, keeping the ones from before")
+            return
+
+        changed = {
+            gameid for gameid in playtimes.keys() | self.playtimes.keys()
+            if playtimes.get(gameid) != self.playtimes.get(gameid)
+        }
+        if not changed:
+            return
+
+        new_games = [gameid for gameid in changed if gameid in playtimes and gameid not in self.names]
+        if new_games:
+            self.names.update(data_getter.steam_ids_to_names(new_games, apikey) or {})
+            negative_cache.flush()
+
+        log_info(LOGLEVEL.DEBUG, "{} playtimes changed".format(len(changed)))
+        self.playtimes = playtimes
+        self.update(changed)
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes, which Nagle's algorithm would hold up on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        snapshot: Snapshot = self.server.state.snapshot
+        url = urlsplit(self.path)
+
+        if url.path == "/report":
+            body = snapshot.report
+        elif url.path == "/summary":
+            body = snapshot.summary
+        elif url.path == "/games":
+            try:
+                query = parse_qs(url.query)
+                top = int(query.get("top", ["0"])[0])
+                bottom = int(query.get("bottom", ["0"])[0])
+            except ValueError:
+                self.send_error(400, "top and bottom must be numbers")
+                return
+
+            games = snapshot.games
+            if (top or bottom) and top + bottom < len(games):
+                games = games[:max(top, 0)] + (games[-bottom:] if bottom > 0 else [])
+
+            body = b"[" + b", ".join(games) + b"]"
+        else:
+            self.send_error(404)
+            return
+
+        etag = '"{}"'.format(snapshot.version)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log_info(LOGLEVEL.DEBUG, "{} - {}".format(self.address_string(), format % args))
+
+
+def serve(state: ReportState, port: int) -> ThreadingHTTPServer:
+    """
+    Serve state on 127.0.0.1:port from a background thread. Port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), ReportHandler)
+    server.daemon_threads = True
+    server.state = state
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_daemon(apikey, steamid, steamlibs, port: int, workers: int = constants.DEFAULT_WORKERS,
+               refresh_names=False) -> int:
+    """
+    Serve the report for steamid and keep it up to date until interrupted.
+
+    :return: Exit code
+    """
+    results, _ = api.run_report_stages(
+        lambda: data_getter.get_steam_playtimes(apikey, steamid),
+        lambda playtimes: list(playtimes.keys()),
+        apikey, steamlibs, workers, refresh_names
+    )
+
+    if not results["playtimes"]:
+        log_error(LOGLEVEL.CRITICAL, "Couldn't find any games because the Steam API returned no data. "
+                                     "Check your api_key and steam_id files.")
+        return 1
+
+    state = ReportState(results["playtimes"], results["names"], results["library_scan"])
+
+    try:
+        server = serve(state, port)
+    except OSError as e:
+        log_error(LOGLEVEL.CRITICAL, "Couldn't listen on port {} ({}).".format(port, e))
+        return 1
+
+    log_success(LOGLEVEL.INFO, "Serving the report for {} games at http://127.0.0.1:{}/report (Ctrl+C to stop)".format(
+        len(state.ranking), server.server_address[1]
+    ))
+
+    watcher = open_watcher(steamlibs, constants.DAEMON_POLL_INTERVAL, constants.DAEMON_SETTLE_TIME)
+    next_playtimes = time.monotonic() + constants.DAEMON_PLAYTIME_INTERVAL
+    try:
+        while True:
+            changed = watcher.changes(max(0.0, next_playtimes - time.monotonic()))
+            if changed is None:
+                log_info(LOGLEVEL.DEBUG, "Missed some library changes, scanning every library again")
+                state.rescan(steamlibs, workers)
+            elif changed:
+                state.apply_manifests(steamlibs, changed)
+
+            if time.monotonic() >= next_playtimes:
+                state.refresh_playtimes(apikey, steamid)
+                next_playtimes = time.monotonic() + constants.DAEMON_PLAYTIME_INTERVAL
+    except KeyboardInterrupt:
+        log_info(LOGLEVEL.INFO, "Stopping")
+    finally:
+        watcher.close()
+        server.shutdown()
+        server.server_close()
+
+    return 0
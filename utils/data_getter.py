@@ -1,126 +1,281 @@
 import json
 import os
-import re
+import time
 
-import requests
-
-from typing import Union, Dict, List
+from typing import Union, Dict, Iterable, List, NamedTuple, Set
 
+from . import cache_store, constants, disk_usage, http_client, library_scanner, metrics, name_index, namespaces, \
+    negative_cache, vdf
 from .pathutils import from_root
-from .basiclogger import log, log_success, log_failure, log_info, log_error, log_warning, is_debug, LOGLEVEL
+from .basiclogger import log_failure, log_info, log_error, LOGLEVEL
 
+# Overridable so the program can be pointed at a local stand-in for the Steam Web API
+STEAM_API_BASE = os.environ.get("STEAM_API_BASE", "https://api.steampowered.com").rstrip("/")
 
-def load_ignored_games():
-    ignore_path = from_root(os.path.join("cache", "ignored_game_ids.json"))
-    try:
-        with open(ignore_path, "r", encoding="utf-8") as f:
-            return set(json.load(f))
-    except FileNotFoundError as e:
-        log_failure(LOGLEVEL.DEBUG, "Ignored games cache file doesn't exist")
-    except (IOError, json.JSONDecodeError) as e:
-        log_failure(LOGLEVEL.DEBUG, "Couldn't parse ignored games cache, clearing it")
-        os.remove(ignore_path)
+# Top-level appmanifest keys kept in the size cache
+MANIFEST_FIELDS = ("SizeOnDisk", "buildid", "LastUpdated", "installdir", "StateFlags")
+
+# appid -> name index, with the name search index next to it
+NAME_INDEX_PATH = from_root(os.path.join("cache", "steam_game_names.idx"))
 
-    return set()
+# Page size used when asking IStoreService for apps changed since the last refresh
+DELTA_PAGE_SIZE = 10000
 
+# Only games Steam doesn't know about are skipped when looking up names and playtimes. Games that aren't installed
+# still need a name in case the library scan finds them later in the run.
+NAME_IGNORE_REASONS = (negative_cache.NOT_IN_CATALOGUE,)
+
+
+def load_name_index_state():
+    store = cache_store.store()
+    last_appid = store.get_meta("names_last_appid")
+    last_refresh = store.get_meta("names_last_refresh")
+    if last_appid is None or last_refresh is None:
+        log_failure(LOGLEVEL.DEBUG, "id->name cache state doesn't exist")
+        return None
 
-def get_game_id_info():
+    return int(last_appid), int(last_refresh)
+
+
+def save_name_index_state(last_appid, last_refresh):
+    store = cache_store.store()
+    store.set_meta("names_last_appid", str(last_appid))
+    store.set_meta("names_last_refresh", str(last_refresh))
+
+
+def get_game_id_info(index_path) -> Union[None, int]:
     log_info(LOGLEVEL.DEBUG, "Loading all game names")
 
-    req = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
+    req = "{}/ISteamApps/GetAppList/v2/".format(STEAM_API_BASE)
+    http_cache = from_root(os.path.join("cache", "http"))
+    started = int(time.time())
 
-    result = requests.get(
-        url=req
-    )
+    # Only ask whether the list changed if there's still an index built from the last one
+    index = name_index.open_index(index_path)
+    result = http_client.get_revalidated_stream(req, http_cache, use_validators=index is not None)
 
-    if result.status_code == 200:
-        try:
-            return json.loads(result.content)["applist"]["apps"]
-        except json.JSONDecodeError as e:
-            log_error(LOGLEVEL.INFO, "Couldn't parse result of Steam games query for cache")
-            return None
-    else:
+    if result is None:
         log_error(LOGLEVEL.INFO, "Failed to get list of Steam games for cache")
         return None
 
+    with result:
+        if result.status_code == 304 and index:
+            log_info(LOGLEVEL.DEBUG, "List of Steam games hasn't changed since it was cached")
+            with index:
+                state = load_name_index_state()
+                save_name_index_state(state[0] if state else index.max_appid(), started)
+                return len(index)
+
+        if index:
+            index.close()
+
+        if result.status_code == 200:
+            last_appid = 0
+
+            def entries(apps):
+                nonlocal last_appid
+                for entry in apps:
+                    appid = int(entry["appid"])
+                    last_appid = max(last_appid, appid)
+                    yield appid, str(entry["name"])
+
+            try:
+                apps = name_index.iter_json_array(
+                    metrics.counted_bytes(result.iter_content(chunk_size=1 << 16)), "apps"
+                )
+                count = name_index.build_index(entries(apps), index_path)
+            except (ValueError, KeyError, TypeError, IOError) as e:
+                log_error(LOGLEVEL.INFO, "Couldn't parse result of Steam games query for cache")
+                return None
+
+            http_client.store_validators(req, http_cache, result)
+            save_name_index_state(last_appid, started)
+            return count
+        else:
+            log_error(LOGLEVEL.INFO, "Failed to get list of Steam games for cache")
+            return None
 
-def steam_ids_to_names(games: List[int]) -> Union[None, Dict[int, str]]:
-    log_info(LOGLEVEL.DEBUG, "Getting steam game IDs -> names")
 
-    cache_path = from_root(os.path.join("cache", "steam_game_names.json"))
-    ignore_ids = load_ignored_games()
+def get_game_id_delta(index_path, apikey, last_appid, last_refresh) -> Union[None, int]:
+    log_info(LOGLEVEL.DEBUG, "Loading game names changed since {}".format(last_refresh))
+
+    req = "{}/IStoreService/GetAppList/v1/".format(STEAM_API_BASE)
+    started = int(time.time())
+
+    # Paging starts from the beginning rather than from last_appid so that older apps which were only released or
+    # renamed since the last refresh are picked up too. if_modified_since keeps the pages small either way.
+    params = {
+        "key": apikey,
+        "if_modified_since": last_refresh,
+        "include_games": "true",
+        "include_dlc": "true",
+        "include_software": "true",
+        "include_videos": "true",
+        "include_hardware": "true",
+        "max_results": DELTA_PAGE_SIZE,
+        "last_appid": 0
+    }
 
-    cached_info = {}
-    try:
-        with open(cache_path, "r", encoding="utf-8") as f:
-            cached_info = json.load(f)
+    changed = []
+    while True:
+        result = http_client.get(req, params=params)
 
-        log_info(LOGLEVEL.DEBUG, "id->name cache is valid")
-    except FileNotFoundError as e:
-        log_failure(LOGLEVEL.DEBUG, "id->name cache file doesn't exist")
-    except (IOError, json.JSONDecodeError) as e:
-        log_failure(LOGLEVEL.DEBUG, "Couldn't parse id->name cache, clearing it")
-        os.remove(cache_path)
-
-    ids_to_names = {
-        **{int(gameid): cached_info[str(gameid)] for gameid in games if str(gameid) in cached_info and gameid not in ignore_ids}
-    }
+        if result is None or result.status_code != 200:
+            log_error(LOGLEVEL.INFO, "Failed to get changed Steam games for cache")
+            return None
 
-    if any(game not in ids_to_names and game not in ignore_ids for game in games):
-        log_info(LOGLEVEL.DEBUG, "Some games not in id->name cache, recaching")
-        load_result = get_game_id_info()
+        try:
+            page = json.loads(result.content)["response"]
+            changed.extend((int(entry["appid"]), str(entry["name"])) for entry in page.get("apps", []))
+        except (ValueError, KeyError, TypeError) as e:
+            log_error(LOGLEVEL.INFO, "Couldn't parse result of changed Steam games query for cache")
+            return None
+
+        if not page.get("have_more_results") or "last_appid" not in page:
+            break
+
+        params["last_appid"] = page["last_appid"]
+
+    log_info(LOGLEVEL.DEBUG, "{} games changed since the last refresh".format(len(changed)))
+
+    if changed:
+        name_index.merge_index(index_path, changed)
+        last_appid = max(last_appid, max(appid for appid, name in changed))
+
+    save_name_index_state(last_appid, started)
+    return len(changed)
+
+
+def normalise_ids(games: Iterable) -> List[int]:
+    """
+    Return games as a list of unique int game IDs, in the order given. Everything past this point can use them as
+    dict and set keys without converting them again.
+    """
+    return list(dict.fromkeys(int(gameid) for gameid in games))
+
+
+def lookup_names(index, games: List[int], ids_to_names: Dict[int, str]) -> List[int]:
+    """
+    Look games up in the index, adding the ones found to ids_to_names.
+
+    :return: The games that weren't found
+    """
+    misses = []
+    for gameid in games:
+        name = index.get(gameid)
+        if name is not None:
+            ids_to_names[gameid] = name
+        else:
+            misses.append(gameid)
 
-        new_cache = {}
-        for entry in load_result:
-            appid = str(entry["appid"])
-            name = str(entry["name"])
+    return misses
 
-            new_cache[appid] = name
-            if int(appid) not in ids_to_names and int(appid) in games and int(appid) not in ignore_ids:
-                ids_to_names[int(appid)] = name
 
-        log_info(LOGLEVEL.DEBUG, "Writing new id->name cache")
+def prefetch_name_index(full_refresh=False) -> bool:
+    """
+    Download the full id->name list straight away if it's going to be needed whichever games are looked up, i.e. if
+    there's no usable index or a full refresh was asked for, so the download doesn't have to wait for the game IDs.
 
-        with open(cache_path, "w", encoding="utf-8") as f:
-            json.dump(new_cache, f)
+    :return: Whether the list was downloaded
+    """
+    index_path = NAME_INDEX_PATH
+
+    if not full_refresh:
+        index = name_index.open_index(index_path)
+        if index:
+            index.close()
+            return False
+
+    log_info(LOGLEVEL.DEBUG, "Fetching the full id->name list ahead of time")
+    return get_game_id_info(index_path) is not None
+
+
+def steam_ids_to_names(games: List[int], apikey=None, full_refresh=False,
+                       prefetched=False) -> Union[None, Dict[int, str]]:
+    """
+    :param prefetched: The index was just downloaded by prefetch_name_index, so misses aren't fetched again
+    """
+    log_info(LOGLEVEL.DEBUG, "Getting steam game IDs -> names")
+
+    index_path = NAME_INDEX_PATH
+    ignore_ids = negative_cache.get()
+
+    if prefetched:
+        full_refresh = False
+
+    ids_to_names = {}
+    misses = [game for game in normalise_ids(games) if not ignore_ids.blocks(game, NAME_IGNORE_REASONS)]
+    looked_up = len(misses)
+
+    index = None if full_refresh else name_index.open_index(index_path)
+    if index:
+        log_info(LOGLEVEL.DEBUG, "id->name cache is valid")
+        with index:
+            misses = lookup_names(index, misses, ids_to_names)
+
+        metrics.cache_lookups("names", len(ids_to_names), len(misses))
+    elif full_refresh:
+        log_info(LOGLEVEL.DEBUG, "Full id->name refresh requested")
+    else:
+        log_failure(LOGLEVEL.DEBUG, "id->name cache file doesn't exist or couldn't be parsed")
+
+    if prefetched:
+        log_info(LOGLEVEL.DEBUG, "id->name cache was just refreshed, not fetching misses")
+    elif full_refresh or misses:
+        state = load_name_index_state() if index else None
+
+        if state and apikey:
+            log_info(LOGLEVEL.DEBUG, "{} of {} games not in id->name cache, fetching changes since the last "
+                                     "refresh".format(len(misses), looked_up))
+            loaded = get_game_id_delta(index_path, apikey, *state)
+        else:
+            log_info(LOGLEVEL.DEBUG, "Recaching the full id->name list")
+            loaded = get_game_id_info(index_path)
+
+        if loaded:
+            index = name_index.open_index(index_path)
+            if index:
+                with index:
+                    misses = lookup_names(index, misses, ids_to_names)
     else:
         log_info(LOGLEVEL.DEBUG, "No id->name cache misses")
 
     # If there are still some games left we haven't got, we need to ignore them because they aren't in the full list
-    for game in games:
-        if game not in ids_to_names:
-            ignore_ids.add(game)
-
-    ignore_path = from_root(os.path.join("cache", "ignored_game_ids.json"))
-    with open(ignore_path, "w", encoding="utf-8") as f:
-        json.dump(list(ignore_ids), f)
+    for game in misses:
+        ignore_ids.add(game, negative_cache.NOT_IN_CATALOGUE)
 
     return ids_to_names
 
 
-def get_steam_playtimes(apikey, steamid) -> Union[None, Dict[int, int]]:
+def get_steam_playtimes(apikey, steamid, ignore_ids=None) -> Union[None, Dict[int, int]]:
     log_info(LOGLEVEL.DEBUG, "Loading steam playtimes")
 
-    ignore_ids = load_ignored_games()
+    if ignore_ids is None:
+        ignore_ids = negative_cache.get()
 
-    req = "https://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/?" \
-          "key={apikey}&steamid={steamid}&include_played_free_games=true&format=json".format(
-        apikey=apikey, steamid=steamid
-    )
+    req = "{}/IPlayerService/GetOwnedGames/v0001/".format(STEAM_API_BASE)
+    params = {
+        "key": apikey,
+        "steamid": steamid,
+        "include_played_free_games": "true",
+        "format": "json"
+    }
 
-    result = requests.get(
-        url=req
+    # Cached per account for a few minutes, so runs in quick succession don't hit the API again
+    content = http_client.get_cached(
+        req, namespaces.account_cache_path("http"), params, ttl=constants.OWNED_GAMES_TTL
     )
 
-    if result.status_code == 200:
+    if content is not None:
         try:
-            data = json.loads(result.content)
+            data = json.loads(content)
             playtimes = {
-                d["appid"]: d["playtime_forever"] for d in data["response"]["games"] if d["appid"] not in ignore_ids
+                int(d["appid"]): int(d["playtime_forever"]) for d in data["response"]["games"]
+                if not ignore_ids.blocks(d["appid"], NAME_IGNORE_REASONS)
             }
 
             return playtimes
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, KeyError) as e:
             log_error(LOGLEVEL.CRITICAL, "Couldn't parse result of playtimes query (check Steam ID and API key)")
             return None
     else:
@@ -131,85 +286,258 @@ def get_steam_playtimes(apikey, steamid) -> Union[None, Dict[int, int]]:
         return None
 
 
-def get_game_filesizes(steamlibs, games) -> Dict[int, int]:
+def read_manifest(location) -> Union[None, Dict[str, Union[int, str]]]:
+    try:
+        with open(location, "r", encoding="utf-8") as f:
+            fields = vdf.read_keys(f, MANIFEST_FIELDS)
+
+        manifest = {
+            "size": int(fields["SizeOnDisk"]),
+            "installdir": fields.get("installdir"),
+            "buildid": int(fields.get("buildid", 0)),
+            "last_updated": int(fields.get("LastUpdated", 0)),
+            "state_flags": int(fields.get("StateFlags", 0))
+        }
+    except (IOError, UnicodeDecodeError, KeyError, ValueError) as e:
+        return None
+
+    return manifest
+
+
+def load_size_cache() -> Dict[int, dict]:
+    return cache_store.store().load_file_sizes()
+
+
+class InstalledGames(NamedTuple):
+    # Game ID -> size cache entry, for every installed game with a readable manifest
+    sizes: Dict[int, dict]
+    # Game ID -> manifest path, for every manifest found
+    manifests: Dict[int, str]
+    # Game IDs whose manifests couldn't be read this time
+    unreadable: Set[int]
+
+
+def scan_installed_games(steamlibs, workers=1) -> InstalledGames:
+    """
+    Find every installed game and its size, updating the size cache. Doesn't depend on which games are owned, so it
+    can run while playtimes are still being fetched.
+    """
     log_info(LOGLEVEL.DEBUG, "Getting steam game sizes")
 
-    cache_path = from_root(os.path.join("cache", "game_filesize_cache.json"))
-    ignore_ids = load_ignored_games()
+    ignore_ids = negative_cache.get()
 
-    cached_info = {}
-    try:
-        with open(cache_path, "r", encoding="utf-8") as f:
-            cached_info = json.load(f)
-
-        log_info(LOGLEVEL.DEBUG, "size cache is valid")
-    except FileNotFoundError as e:
-        log_failure(LOGLEVEL.DEBUG, "size cache file doesn't exist")
-    except (IOError, json.JSONDecodeError) as e:
-        log_failure(LOGLEVEL.DEBUG, "Couldn't parse size cache, clearing it")
-        os.remove(cache_path)
-
-    ids_to_sizes = {
-        **{gameid: int(cached_info[str(gameid)]) for gameid in games if str(gameid) in cached_info and gameid not in ignore_ids}
-    }
+    cached_info = load_size_cache()
 
-    cache_misses = list(filter(
-        lambda game: int(game) not in ids_to_sizes and int(game) not in ignore_ids,
-        games
-    ))
+    manifests = library_scanner.scan_libraries(steamlibs)
+
+    # Every cached size is keyed on its manifest's path, mtime and size, so updated, moved and uninstalled games are
+    # noticed with one stat per manifest instead of needing a full recache
+    new_cache = {}
+    stale = {}
+    manifest_mtimes = {}
+    for gameid, location in manifests.items():
+        try:
+            stat = os.stat(location)
+        except OSError as e:
+            log_failure(LOGLEVEL.DEBUG, "Couldn't stat manifest for game ID {} ({})".format(gameid, e))
+            continue
+
+        manifest_mtimes[gameid] = stat.st_mtime
+        cached = cached_info.get(gameid)
+        if cached and cached["path"] == location and \
+                cached["mtime_ns"] == stat.st_mtime_ns and cached["st_size"] == stat.st_size:
+            new_cache[gameid] = cached
+        else:
+            stale[gameid] = (location, stat)
+
+    metrics.count("stat_calls", len(manifests), call="stat")
+    metrics.cache_lookups("sizes", len(new_cache), len(stale))
+
+    ignore_ids.revalidate(manifest_mtimes)
+
+    # Corrupt manifests that haven't changed since they were found aren't read again until their entry expires
+    for gameid in [gameid for gameid in stale if ignore_ids.active(gameid) == negative_cache.CORRUPT_MANIFEST]:
+        del stale[gameid]
+
+    read_manifests = library_scanner.read_grouped_by_device(
+        {gameid: (location, stat.st_dev) for gameid, (location, stat) in stale.items()},
+        read_manifest,
+        workers
+    )
+    metrics.count("manifests_opened", len(read_manifests))
+
+    changed = {}
+    unreadable = set()
+    for gameid, manifest in read_manifests.items():
+        location, stat = stale[gameid]
+        if manifest is not None:
+            log_info(LOGLEVEL.DEBUG, "game ID {}: caching size {}".format(
+                gameid, manifest["size"]
+            ))
+
+            changed[gameid] = {
+                **manifest,
+                "path": location,
+                "mtime_ns": stat.st_mtime_ns,
+                "st_size": stat.st_size
+            }
+            ignore_ids.discard(gameid)
+        else:
+            unreadable.add(gameid)
 
-    if len(cache_misses) > 0:
-        log_info(LOGLEVEL.DEBUG, "Some games not in size cache, recaching")
+    new_cache.update(changed)
+    removed = [gameid for gameid in cached_info.keys() if gameid not in new_cache]
 
-        new_cache = {
-            **ids_to_sizes
-        }
+    if changed or removed:
+        log_info(LOGLEVEL.DEBUG, "{} manifests changed and {} were removed, updating size cache".format(
+            len(changed), len(removed)
+        ))
 
-        for gameid in cache_misses:
-            manifest_filename = "appmanifest_{}.acf".format(gameid)
-            location = None
-            for steamlib in steamlibs:
-                p = os.path.join(steamlib, manifest_filename)
-                if os.path.isfile(p):
-                    location = p
-                    break
-
-            if location:
-                with open(location, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    match = re.search(r'^.*"SizeOnDisk".*"(.*)".*$', content, flags=re.M)
-                    if match:
-                        sizeondisk = int(match.group(1))
-                        log_info(LOGLEVEL.DEBUG, "game ID {}: caching size {}".format(
-                            gameid, sizeondisk
-                        ))
+        cache_store.store().update_file_sizes(changed, removed)
+    else:
+        log_info(LOGLEVEL.DEBUG, "No size cache misses")
 
-                        ids_to_sizes[int(gameid)] = sizeondisk
-                        new_cache[gameid] = sizeondisk
-                    else:
-                        log_failure(LOGLEVEL.INFO,
-                                    "Game ID {} has a corrupted manifest. Will ignore in future.".format(
-                                        gameid
-                                    ))
-            else:
-                log_failure(LOGLEVEL.DEBUG, "Couldn't find game ID {} in any library. Will ignore in future.".format(
+    return InstalledGames(new_cache, manifests, unreadable)
+
+
+def refresh_manifests(installed: InstalledGames, steamlibs, paths: Iterable[str]) -> Set[int]:
+    """
+    Read only the given manifests again, e.g. after they were seen changing, updating installed and the size cache.
+    A removed manifest is replaced by the same game's manifest in another library if there is one.
+
+    :param installed: Result of scan_installed_games, updated in place
+    :param steamlibs: Paths of the Steam libraries
+    :param paths: Paths of manifests that were written, added or removed
+    :return: IDs of the games whose size cache entries changed or were removed
+    """
+    ignore_ids = negative_cache.get()
+
+    changed = {}
+    removed = []
+    opened = 0
+    for path in paths:
+        match = library_scanner.MANIFEST_PATTERN.match(os.path.basename(path))
+        if not match:
+            continue
+
+        gameid = int(match.group(1))
+        current = installed.manifests.get(gameid)
+        candidates = [path] + [
+            os.path.join(steamlib, os.path.basename(path)) for steamlib in steamlibs
+            if os.path.join(steamlib, os.path.basename(path)) != path
+        ]
+        if current is not None and current != path and os.path.isfile(current):
+            # The game is already installed in another library, which stays the one used
+            continue
+
+        for location in candidates:
+            try:
+                stat = os.stat(location)
+            except OSError:
+                continue
+
+            opened += 1
+            installed.manifests[gameid] = location
+            manifest = read_manifest(location)
+            if manifest is None:
+                log_failure(LOGLEVEL.INFO, "Game ID {} has a corrupted manifest. Will ignore in future.".format(
                     gameid
                 ))
+                installed.unreadable.add(gameid)
+                installed.sizes.pop(gameid, None)
+                ignore_ids.add(gameid, negative_cache.CORRUPT_MANIFEST)
+                removed.append(gameid)
+                break
+
+            log_info(LOGLEVEL.DEBUG, "game ID {}: caching size {}".format(gameid, manifest["size"]))
+            changed[gameid] = installed.sizes[gameid] = {
+                **manifest,
+                "path": location,
+                "mtime_ns": stat.st_mtime_ns,
+                "st_size": stat.st_size
+            }
+            installed.unreadable.discard(gameid)
+            ignore_ids.discard(gameid)
+            break
+        else:
+            log_info(LOGLEVEL.DEBUG, "game ID {} was uninstalled".format(gameid))
+            installed.manifests.pop(gameid, None)
+            installed.sizes.pop(gameid, None)
+            installed.unreadable.discard(gameid)
+            removed.append(gameid)
+
+    metrics.count("manifests_opened", opened)
+
+    if changed or removed:
+        cache_store.store().update_file_sizes(changed, removed)
+
+    return set(changed) | set(removed)
+
+
+def select_game_filesizes(installed: InstalledGames, games) -> Dict[int, int]:
+    """
+    Pick the sizes of the given games out of a library scan, ignoring the ones that aren't installed or have
+    corrupted manifests in future.
+    """
+    ignore_ids = negative_cache.get()
+    games = normalise_ids(games)
+
+    log_info(LOGLEVEL.DEBUG, "{} installed games aren't owned".format(
+        len(library_scanner.unowned_manifests(installed.manifests, games))
+    ))
 
-        log_info(LOGLEVEL.DEBUG, "Writing new size cache")
+    ids_to_sizes = {}
+    skipped = 0
+    for gameid in games:
+        if gameid in ignore_ids:
+            skipped += 1
+            continue
+
+        entry = installed.sizes.get(gameid)
+        if entry is not None:
+            ids_to_sizes[gameid] = entry["size"]
+        elif gameid in installed.unreadable:
+            log_failure(LOGLEVEL.INFO,
+                        "Game ID {} has a corrupted manifest. Will ignore in future.".format(
+                            gameid
+                        ))
+            ignore_ids.add(gameid, negative_cache.CORRUPT_MANIFEST)
+        elif gameid not in installed.manifests:
+            log_failure(LOGLEVEL.DEBUG, "Couldn't find game ID {} in any library. Will ignore in future.".format(
+                gameid
+            ))
+            ignore_ids.add(gameid, negative_cache.NOT_INSTALLED)
 
-        with open(cache_path, "w", encoding="utf-8") as f:
-            json.dump(new_cache, f)
-    else:
-        log_info(LOGLEVEL.DEBUG, "No size cache misses")
+    # A hit is an owned game that was skipped without looking for it
+    metrics.cache_lookups("ignored", skipped, len(games) - skipped)
+
+    return ids_to_sizes
+
+
+def get_game_filesizes(steamlibs, games, workers=1) -> Dict[int, int]:
+    return select_game_filesizes(scan_installed_games(steamlibs, workers), games)
 
-    # If there are still some games left we haven't got, we need to ignore them because they aren't in the full list
-    for game in games:
-        if game not in ids_to_sizes:
-            ignore_ids.add(game)
 
-    ignore_path = from_root(os.path.join("cache", "ignored_game_ids.json"))
-    with open(ignore_path, "w", encoding="utf-8") as f:
-        json.dump(list(ignore_ids), f)
+def get_measured_filesizes(games, workers=1) -> Dict[int, int]:
+    # Only games already in the size cache can be measured, because that's where their install paths come from
+    log_info(LOGLEVEL.DEBUG, "Measuring steam game sizes")
+
+    size_cache = load_size_cache()
+    cached_dirs = cache_store.store().load_directory_sizes()
+
+    roots = {}
+    for gameid in normalise_ids(games):
+        entry = size_cache.get(gameid)
+        if entry and entry.get("installdir"):
+            roots[gameid] = disk_usage.game_roots(entry["path"], gameid, entry["installdir"])
+        else:
+            log_failure(LOGLEVEL.DEBUG, "Don't know where game ID {} is installed, can't measure it".format(gameid))
+
+    ids_to_sizes, new_cache = disk_usage.measure(roots, cached_dirs, workers)
+
+    cache_store.store().update_directory_sizes(
+        {path: entry for path, entry in new_cache.items() if cached_dirs.get(path) != entry},
+        cached_dirs.keys() - new_cache.keys()
+    )
 
     return ids_to_sizes
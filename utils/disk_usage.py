@@ -0,0 +1,154 @@
+"""Measure how much disk space directory trees really use.
+
+Per-directory totals are cached keyed on the directory's mtime. A directory's mtime changes when entries are added,
+removed or renamed in it, so unchanged subtrees are taken from the cache without being listed again. Files that
+are rewritten in place without their directory changing aren't noticed until something else in that directory
+changes (or the cache is cleared with -n).
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from . import metrics
+from .basiclogger import log_failure, log_info, LOGLEVEL
+
+
+def allocated_size(st: os.stat_result) -> int:
+    # st_blocks is always in 512 byte units. Windows doesn't have it, so use the apparent size there.
+    blocks = getattr(st, "st_blocks", None)
+    if blocks is None:
+        return st.st_size
+
+    return blocks * 512
+
+
+def walk(root: str, cache: Dict[str, dict], new_cache: Dict[str, dict]) -> Tuple[int, int]:
+    """
+    Measure one directory tree.
+
+    :param root: Directory to measure
+    :param cache: Cached per-directory totals from a previous run
+    :param new_cache: Totals of every directory visited are written here
+    :return: (bytes allocated, number of directories that had to be listed again)
+    """
+    total = 0
+    rescanned = 0
+    visited = 0
+    stat_calls = 0
+    scandir_calls = 0
+    seen_links = set()
+
+    pending = [root]
+    while pending:
+        path = pending.pop()
+        stat_calls += 1
+        try:
+            mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+        except OSError as e:
+            log_failure(LOGLEVEL.DEBUG, "Couldn't stat {} ({})".format(path, e))
+            continue
+
+        entry = cache.get(path)
+        if not entry or entry["mtime_ns"] != mtime_ns:
+            rescanned += 1
+            entry = {"mtime_ns": mtime_ns, "files": 0, "links": [], "dirs": []}
+
+            try:
+                scandir_calls += 1
+                with os.scandir(path) as it:
+                    for child in it:
+                        if child.is_dir(follow_symlinks=False):
+                            entry["dirs"].append(child.name)
+                        elif child.is_file(follow_symlinks=False):
+                            stat_calls += 1
+                            st = child.stat(follow_symlinks=False)
+                            if st.st_nlink > 1:
+                                entry["links"].append([st.st_dev, st.st_ino, allocated_size(st)])
+                            else:
+                                entry["files"] += allocated_size(st)
+            except OSError as e:
+                log_failure(LOGLEVEL.DEBUG, "Couldn't list {} ({})".format(path, e))
+                continue
+
+        new_cache[path] = entry
+        visited += 1
+
+        total += entry["files"]
+        for dev, ino, size in entry["links"]:
+            if (dev, ino) not in seen_links:
+                seen_links.add((dev, ino))
+                total += size
+
+        pending.extend(os.path.join(path, name) for name in entry["dirs"])
+
+    metrics.count("stat_calls", stat_calls, call="stat")
+    metrics.count("stat_calls", scandir_calls, call="scandir")
+    metrics.cache_lookups("directories", visited - rescanned, rescanned)
+
+    return total, rescanned
+
+
+def measure(roots: Dict[int, List[str]], cache: Dict[str, dict], workers: int = 1) -> Tuple[Dict[int, int], dict]:
+    """
+    Measure several groups of directory trees in parallel, one group per game. Hard links are only counted once
+    per group. Missing roots count as empty.
+
+    :param roots: Game ID -> directories to measure for it
+    :param cache: Cached per-directory totals from a previous run
+    :param workers: Number of groups measured at the same time
+    :return: (game ID -> bytes allocated, the updated cache)
+    """
+    def measure_group(gameid):
+        group_cache = {}
+        total = 0
+        rescanned = 0
+        for root in roots[gameid]:
+            if os.path.isdir(root):
+                size, walked = walk(root, cache, group_cache)
+                total += size
+                rescanned += walked
+
+        return gameid, total, rescanned, group_cache
+
+    gameids = sorted(roots.keys())
+    if workers <= 1:
+        results = [measure_group(gameid) for gameid in gameids]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(metrics.worker(measure_group), gameids))
+
+    # Entries under trees that weren't measured this time (e.g. games owned by another account) are kept
+    measured_roots = {root for group in roots.values() for root in group}
+    measured_prefixes = tuple(os.path.join(root, "") for root in measured_roots)
+    new_cache = {
+        path: entry for path, entry in cache.items()
+        if path not in measured_roots and not path.startswith(measured_prefixes)
+    }
+
+    sizes = {}
+    rescanned = 0
+    for gameid, total, walked, group_cache in results:
+        sizes[gameid] = total
+        rescanned += walked
+        new_cache.update(group_cache)
+
+    log_info(LOGLEVEL.DEBUG, "Measured {} games, {} directories had to be listed again".format(len(sizes), rescanned))
+
+    return sizes, new_cache
+
+
+def game_roots(manifest_path: str, gameid: int, installdir: str) -> List[str]:
+    """
+    Directories holding a game's files, given the path of its appmanifest.
+
+    :param manifest_path: Path to appmanifest_<id>.acf
+    :param gameid: Game ID
+    :param installdir: "installdir" value from the manifest
+    """
+    steamapps = os.path.dirname(manifest_path)
+    return [
+        os.path.join(steamapps, "common", installdir),
+        os.path.join(steamapps, "workshop", "content", str(gameid))
+    ]
+
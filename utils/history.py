@@ -0,0 +1,356 @@
+"""Append-only history of each account's playtimes and installed sizes, for seeing how they change over time.
+
+Every report appends a snapshot to history/<steam ID>/. Each column is a file of fixed-width values in native byte
+order, so a query only maps the columns it needs:
+
+    snapshots.col  (timestamp, number of records so far) x u64 per snapshot
+    appid.col      u32 per record
+    playtime.col   u32 per record, minutes played
+    size.col       u64 per record, SizeOnDisk in bytes (0 if not installed)
+
+A snapshot only has records for the games whose playtime or size changed since the one before, so a run where
+nothing changed adds 16 bytes. Games that go away are recorded with 0 for both. Records are written before the
+snapshot that covers them, so an interrupted run leaves records no snapshot points at, and the next run cuts them off.
+
+state.bin has the latest values for every game, so working out what changed doesn't mean replaying the whole
+history. It's rebuilt from the history if it's missing or behind.
+"""
+
+import datetime
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .basiclogger import log_failure, log_info, LOGLEVEL
+from .pathutils import from_root
+from .stats import BYTES_PER_GB, MINUTES_PER_HOUR
+
+HISTORY_DIR = from_root("history")
+
+QUERIES = ("gb_per_hour", "weekly_hours", "library_growth")
+
+# Column name -> array typecode
+COLUMNS = {"appid": "I", "playtime": "I", "size": "Q"}
+
+STATE_MAGIC = b"SGHS"
+STATE_VERSION = 1
+# magic, version, number of snapshots the state is up to date with, number of games
+STATE_HEADER = struct.Struct("=4sIQI")
+
+
+def history_dir(steamid) -> str:
+    return os.path.join(HISTORY_DIR, str(steamid))
+
+
+class History:
+    """
+    Read-only view of one account's history. Columns are memory-mapped when first asked for.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._maps: List[mmap.mmap] = []
+        self._views: List[memoryview] = []
+
+        snapshots = self.column("snapshots", "Q")
+        self.count = len(snapshots) // 2
+        self.timestamps: List[int] = snapshots[0:self.count * 2:2].tolist()
+        self.ends: List[int] = snapshots[1:self.count * 2:2].tolist()
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def column(self, name: str, typecode: str) -> memoryview:
+        """
+        Map a column file, returning an empty view if it doesn't exist yet.
+        """
+        try:
+            f = open(os.path.join(self.directory, name + ".col"), "rb")
+        except FileNotFoundError:
+            return memoryview(array(typecode))
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return memoryview(array(typecode))
+
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._maps.append(mapped)
+
+        itemsize = array(typecode).itemsize
+        view = memoryview(mapped)
+        column = view[:size // itemsize * itemsize].cast(typecode)
+        view.release()
+
+        self._views.append(column)
+        return column
+
+    def deltas(self, *names: str) -> Iterator[Tuple[int, Iterator[tuple]]]:
+        """
+        For each snapshot, (timestamp, rows), where each row is a changed game's ID followed by its values in the
+        named columns.
+        """
+        appids = self.column("appid", COLUMNS["appid"])
+        columns = [self.column(name, COLUMNS[name]) for name in names]
+
+        start = 0
+        for timestamp, end in zip(self.timestamps, self.ends):
+            yield timestamp, zip(appids[start:end].tolist(), *(column[start:end].tolist() for column in columns))
+            start = end
+
+    def latest(self) -> Dict[int, Tuple[int, int]]:
+        """
+        Replay the whole history to get each game's latest (minutes played, size).
+        """
+        games = {}
+        for timestamp, rows in self.deltas("playtime", "size"):
+            for appid, minutes, size in rows:
+                if minutes or size:
+                    games[appid] = (minutes, size)
+                else:
+                    games.pop(appid, None)
+
+        return games
+
+    def totals(self, name: str) -> List[Tuple[int, int]]:
+        """
+        (timestamp, sum of a column over every game) for each snapshot.
+        """
+        values = {}
+        total = 0
+        result = []
+        for timestamp, rows in self.deltas(name):
+            for appid, value in rows:
+                total += value - values.get(appid, 0)
+                values[appid] = value
+
+            result.append((timestamp, total))
+
+        return result
+
+    def gb_per_hour(self) -> List[Tuple[int, Optional[float]]]:
+        """
+        (timestamp, GB per hour played over every installed and played game) for each snapshot.
+        """
+        games = {}
+        total_size = 0
+        total_minutes = 0
+        result = []
+        for timestamp, rows in self.deltas("playtime", "size"):
+            for appid, minutes, size in rows:
+                old_minutes, old_size = games.get(appid, (0, 0))
+                if old_minutes and old_size:
+                    total_minutes -= old_minutes
+                    total_size -= old_size
+
+                games[appid] = (minutes, size)
+                if minutes and size:
+                    total_minutes += minutes
+                    total_size += size
+
+            result.append((
+                timestamp,
+                total_size * MINUTES_PER_HOUR / (total_minutes * BYTES_PER_GB) if total_minutes else None
+            ))
+
+        return result
+
+    def hours_per_week(self) -> List[Tuple[str, float]]:
+        """
+        (ISO week, hours played that week) for each week with a snapshot. Playtime from before the first snapshot
+        isn't counted, and neither are games going away. A game that comes back (e.g. after missing from a run's
+        playtimes) only counts the minutes played since it was last seen.
+        """
+        # Each game's most minutes played seen so far, kept while it's away
+        minutes = {}
+        played = 0
+        weeks = {}
+        previous = None
+        for timestamp, rows in self.deltas("playtime"):
+            for appid, value in rows:
+                known = minutes.get(appid, 0)
+                if value > known:
+                    played += value - known
+                    minutes[appid] = value
+
+            year, week, _ = datetime.date.fromtimestamp(timestamp).isocalendar()
+            key = "{}-W{:02}".format(year, week)
+            if key not in weeks:
+                weeks[key] = [played if previous is None else previous, played]
+
+            weeks[key][1] = played
+            previous = played
+
+        return [(key, (last - first) / MINUTES_PER_HOUR) for key, (first, last) in weeks.items()]
+
+    def library_growth(self) -> List[Tuple[int, int]]:
+        """
+        (timestamp, total bytes installed) for each snapshot.
+        """
+        return self.totals("size")
+
+    def close(self):
+        for view in self._views:
+            view.release()
+
+        for mapped in self._maps:
+            mapped.close()
+
+        self._views = []
+        self._maps = []
+
+
+def load_state(directory: str, snapshots: int) -> Optional[Dict[int, Tuple[int, int]]]:
+    """
+    Read state.bin, or return None if it's missing, unreadable or not up to date with the given number of snapshots.
+    """
+    try:
+        with open(os.path.join(directory, "state.bin"), "rb") as f:
+            data = f.read()
+
+        magic, version, state_snapshots, count = STATE_HEADER.unpack_from(data, 0)
+    except (OSError, struct.error):
+        return None
+
+    if magic != STATE_MAGIC or version != STATE_VERSION or state_snapshots != snapshots:
+        return None
+
+    appids = array("I")
+    minutes = array("I")
+    sizes = array("Q")
+    offset = STATE_HEADER.size
+    for column in (appids, minutes, sizes):
+        end = offset + count * column.itemsize
+        if end > len(data):
+            return None
+
+        column.frombytes(data[offset:end])
+        offset = end
+
+    return {appid: (played, size) for appid, played, size in zip(appids, minutes, sizes)}
+
+
+def latest_games(steamid) -> Dict[int, Tuple[int, int]]:
+    """
+    Each game's (minutes played, size) as of the account's last run, or nothing if there's no history.
+    """
+    directory = history_dir(steamid)
+    with History(directory) as history:
+        games = load_state(directory, len(history))
+        return history.latest() if games is None else games
+
+
+def save_state(directory: str, snapshots: int, games: Dict[int, Tuple[int, int]]):
+    appids = sorted(games)
+    path = os.path.join(directory, "state.bin")
+    with open(path + ".tmp", "wb") as f:
+        f.write(STATE_HEADER.pack(STATE_MAGIC, STATE_VERSION, snapshots, len(appids)))
+        f.write(array("I", appids).tobytes())
+        f.write(array("I", (games[appid][0] for appid in appids)).tobytes())
+        f.write(array("Q", (games[appid][1] for appid in appids)).tobytes())
+
+    os.replace(path + ".tmp", path)
+
+
+def append_column(directory: str, name: str, typecode: str, committed: int, values):
+    """
+    Cut a column file back to the committed number of values, then append values to it.
+    """
+    with open(os.path.join(directory, name + ".col"), "ab") as f:
+        f.truncate(committed * array(typecode).itemsize)
+        f.write(array(typecode, values).tobytes())
+
+
+def record(steamid, playtimes: Dict[int, int], sizes: Dict[int, int], timestamp: Optional[int] = None) -> int:
+    """
+    Append a snapshot of an account's games.
+
+    :param steamid: Steam ID of the account
+    :param playtimes: Game ID -> minutes played, for every owned game
+    :param sizes: Game ID -> SizeOnDisk, for the installed ones
+    :param timestamp: When the snapshot was taken, defaults to now
+    :return: How many games changed since the last snapshot
+    """
+    directory = history_dir(steamid)
+    os.makedirs(directory, exist_ok=True)
+
+    with History(directory) as history:
+        snapshots = history.count
+        committed = history.ends[-1] if snapshots else 0
+        games = load_state(directory, snapshots)
+        if games is None:
+            games = history.latest()
+
+    current = {appid: (playtimes.get(appid, 0), sizes.get(appid, 0)) for appid in playtimes.keys() | sizes.keys()}
+    changed = sorted(
+        [(appid, value) for appid, value in current.items() if games.get(appid, (0, 0)) != value] +
+        [(appid, (0, 0)) for appid in games.keys() - current.keys()]
+    )
+
+    append_column(directory, "appid", COLUMNS["appid"], committed, (appid for appid, _ in changed))
+    append_column(directory, "playtime", COLUMNS["playtime"], committed, (value[0] for _, value in changed))
+    append_column(directory, "size", COLUMNS["size"], committed, (value[1] for _, value in changed))
+    # Written last, so the records above only count once this is
+    append_column(directory, "snapshots", "Q", snapshots * 2, (
+        int(time.time()) if timestamp is None else timestamp, committed + len(changed)
+    ))
+
+    save_state(directory, snapshots + 1, {appid: value for appid, value in current.items() if value != (0, 0)})
+
+    return len(changed)
+
+
+def add_run(steamid, playtimes: Dict[int, int], sizes: Dict[int, int]):
+    """
+    record(), logging instead of raising if the history can't be written.
+    """
+    try:
+        changed = record(steamid, playtimes, sizes)
+        log_info(LOGLEVEL.DEBUG, "Added {} changed games to the history of {}".format(changed, steamid))
+    except OSError as e:
+        log_failure(LOGLEVEL.INFO, "Couldn't add this run to the history of {} ({})".format(steamid, e))
+
+
+def format_time(timestamp: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+def show(steamid, query: str) -> bool:
+    """
+    Print a trend from an account's history.
+
+    :param query: One of QUERIES
+    :return: False if there's no history for the account
+    """
+    with History(history_dir(steamid)) as history:
+        if not len(history):
+            return False
+
+        if query == "gb_per_hour":
+            for timestamp, value in history.gb_per_hour():
+                print("{}  {}".format(format_time(timestamp), "-" if value is None else "{} GB/hr".format(
+                    round(value, 4)
+                )))
+        elif query == "weekly_hours":
+            for week, hours in history.hours_per_week():
+                print("{}  {} h".format(week, round(hours, 1)))
+        elif query == "library_growth":
+            previous = None
+            for timestamp, total in history.library_growth():
+                print("{}  {:10} GB{}".format(
+                    format_time(timestamp), round(total / BYTES_PER_GB, 2),
+                    "" if previous is None else "  ({:+} GB)".format(round((total - previous) / BYTES_PER_GB, 2))
+                ))
+                previous = total
+
+    return True
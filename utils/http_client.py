@@ -0,0 +1,209 @@
+"""Shared HTTP client for talking to the Steam web API.
+
+Every request goes through one pooled session with explicit timeouts, and is retried with jittered exponential
+backoff on connection errors and 429/5xx responses. Responses can be cached on disk: cached ones are revalidated
+with If-None-Match/If-Modified-Since, or not requested at all while they're younger than a TTL.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, TYPE_CHECKING
+
+from . import constants, metrics
+from .basiclogger import log_failure, log_info, LOGLEVEL
+
+# requests takes a while to import, so it's only imported once a request is made
+if TYPE_CHECKING:
+    import requests
+
+# (connect, read) in seconds
+DEFAULT_TIMEOUT = (10, 60)
+RETRIES = 3
+BACKOFF_SECONDS = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def session() -> "requests.Session":
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, constants.DEFAULT_WORKERS * 2))
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session.headers["Accept-Encoding"] = "gzip, deflate"
+
+        return _session
+
+
+def backoff_delay(attempt: int, response: Optional["requests.Response"] = None) -> float:
+    delay = BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, int(retry_after))
+
+    return delay
+
+
+def get(url: str, params: Optional[dict] = None, headers: Optional[dict] = None, stream: bool = False,
+        timeout=DEFAULT_TIMEOUT, retries: int = RETRIES) -> Optional["requests.Response"]:
+    """
+    GET url, retrying on connection errors and retryable statuses.
+
+    :return: The last response received, or None if no response could be received at all
+    """
+    import requests
+
+    for attempt in range(retries + 1):
+        metrics.count("http_requests")
+        try:
+            response = session().get(url, params=params, headers=headers, stream=stream, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                log_failure(LOGLEVEL.INFO, "Request to {} failed ({})".format(url.split("?")[0], e))
+                return None
+
+            delay = backoff_delay(attempt)
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                # Streamed bodies are counted by whoever reads them, see metrics.counted_bytes
+                if metrics.ENABLED and not stream:
+                    metrics.count("downloaded_bytes", len(response.content))
+
+                return response
+
+            response.close()
+            delay = backoff_delay(attempt, response)
+
+        log_info(LOGLEVEL.DEBUG, "Retrying request to {} in {:.1f}s".format(url.split("?")[0], delay))
+        time.sleep(delay)
+
+    return None
+
+
+def cache_key(url: str, params: Optional[dict] = None) -> str:
+    # Params can include the API key, so only a hash of them ends up on disk
+    full = url + "?" + "&".join("{}={}".format(k, v) for k, v in sorted((params or {}).items()))
+    return hashlib.sha256(full.encode("utf-8")).hexdigest()
+
+
+def load_meta(directory: str, key: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, key + ".json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def save_meta(directory: str, key: str, response: "requests.Response", fetched_at: float):
+    os.makedirs(directory, exist_ok=True)
+
+    meta = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": fetched_at
+    }
+
+    tmp_path = os.path.join(directory, key + ".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    os.replace(tmp_path, os.path.join(directory, key + ".json"))
+
+
+def touch_meta(directory: str, key: str, meta: dict, fetched_at: float):
+    meta["fetched_at"] = fetched_at
+
+    tmp_path = os.path.join(directory, key + ".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    os.replace(tmp_path, os.path.join(directory, key + ".json"))
+
+
+def validator_headers(meta: Optional[dict]) -> Dict[str, str]:
+    headers = {}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    return headers
+
+
+def get_cached(url: str, directory: str, params: Optional[dict] = None, ttl: float = 0) -> Optional[bytes]:
+    """
+    GET url through an on-disk response cache in directory. A cached response younger than ttl seconds is
+    returned without any request; an older one is revalidated.
+
+    :return: The response body, or None if the request failed
+    """
+    key = cache_key(url, params)
+    body_path = os.path.join(directory, key + ".body")
+
+    meta = load_meta(directory, key)
+    if meta and not os.path.isfile(body_path):
+        meta = None
+
+    now = time.time()
+    if meta and now - meta.get("fetched_at", 0) < ttl:
+        log_info(LOGLEVEL.DEBUG, "Using cached response for {}".format(url))
+        metrics.cache_lookups("http", 1, 0)
+        with open(body_path, "rb") as f:
+            return f.read()
+
+    response = get(url, params=params, headers=validator_headers(meta))
+    if response is None:
+        return None
+
+    if response.status_code == 304 and meta:
+        log_info(LOGLEVEL.DEBUG, "Cached response for {} is still valid".format(url))
+        metrics.cache_lookups("http", 1, 0)
+        touch_meta(directory, key, meta, now)
+        with open(body_path, "rb") as f:
+            return f.read()
+
+    if response.status_code != 200:
+        return None
+
+    metrics.cache_lookups("http", 0, 1)
+    os.makedirs(directory, exist_ok=True)
+    with open(body_path + ".tmp", "wb") as f:
+        f.write(response.content)
+
+    os.replace(body_path + ".tmp", body_path)
+    save_meta(directory, key, response, now)
+
+    return response.content
+
+
+def get_revalidated_stream(url: str, directory: str, use_validators: bool = True) -> Optional["requests.Response"]:
+    """
+    Start a streamed GET of url, sending the validators from the last time it was fetched. Only validators are
+    kept, not the body, so the caller has to still have what it built from the last response.
+
+    :param use_validators: Whether to send the stored validators, e.g. False if the caller lost its copy
+    :return: The response (check for 304), or None if the request failed. Call store_validators once the body
+             has been used successfully.
+    """
+    key = cache_key(url)
+    meta = load_meta(directory, key) if use_validators else None
+
+    return get(url, headers=validator_headers(meta), stream=True)
+
+
+def store_validators(url: str, directory: str, response: "requests.Response"):
+    save_meta(directory, cache_key(url), response, time.time())
@@ -0,0 +1,78 @@
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Tuple, TypeVar
+
+from . import metrics
+from .basiclogger import log_failure, log_info, LOGLEVEL
+
+T = TypeVar("T")
+
+MANIFEST_PATTERN = re.compile(r"^appmanifest_(\d+)\.acf$")
+
+
+def scan_libraries(steamlibs: Iterable[str]) -> Dict[int, str]:
+    """
+    List every app manifest in the given libraries with one directory scan per library.
+    If a game has a manifest in more than one library, the first library listed wins.
+
+    :param steamlibs: Paths to steamapps directories
+    :return: Game ID -> path to its appmanifest_<id>.acf
+    """
+    manifests = {}
+
+    for steamlib in steamlibs:
+        try:
+            with os.scandir(steamlib) as it:
+                for entry in it:
+                    match = MANIFEST_PATTERN.match(entry.name)
+                    if match:
+                        manifests.setdefault(int(match.group(1)), entry.path)
+        except OSError as e:
+            log_failure(LOGLEVEL.INFO, "Couldn't read Steam library {} ({})".format(steamlib, e))
+
+    log_info(LOGLEVEL.DEBUG, "Found {} manifests in {} libraries".format(len(manifests), len(steamlibs)))
+    metrics.count("stat_calls", len(steamlibs), call="scandir")
+
+    return manifests
+
+
+def unowned_manifests(manifests: Dict[int, str], games: Iterable[int]) -> Dict[int, str]:
+    """
+    Return the manifests found by scan_libraries that belong to games outside of games
+    (installed, but not owned by the account being looked at).
+
+    :param manifests: Result of scan_libraries
+    :param games: Game IDs owned by the account
+    """
+    owned = set(games)
+    return {gameid: path for gameid, path in manifests.items() if gameid not in owned}
+
+
+def read_grouped_by_device(paths: Dict[int, Tuple[str, int]], reader: Callable[[str], T],
+                           workers: int = 1) -> Dict[int, T]:
+    """
+    Run reader over many files, reading files on the same device one after another while different devices are
+    read in parallel. Results are returned in game ID order whatever the number of workers.
+
+    :param paths: Game ID -> (path, st_dev of the path)
+    :param reader: Function reading one path
+    :param workers: Maximum number of devices read at the same time
+    :return: Game ID -> result of reader
+    """
+    by_device = defaultdict(list)
+    for gameid in sorted(paths.keys()):
+        path, device = paths[gameid]
+        by_device[device].append((gameid, path))
+
+    def read_all(group):
+        return [(gameid, reader(path)) for gameid, path in group]
+
+    if workers <= 1 or len(by_device) <= 1:
+        groups = [read_all(group) for group in by_device.values()]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(by_device))) as executor:
+            groups = list(executor.map(metrics.worker(read_all), by_device.values()))
+
+    return dict(sorted(result for group in groups for result in group))
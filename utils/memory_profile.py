@@ -0,0 +1,135 @@
+"""Per-stage memory profiling with tracemalloc, and memory budgets that fail the run.
+
+tracemalloc can't tell threads apart, so while profiling is on, pipelines run one stage at a time and each stage's
+peak is its own. For each stage, the peak is how far traced memory rose above where it was when the stage started,
+and the top allocation sites are the lines holding the most new memory when it finished.
+"""
+
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from . import metrics
+from .basiclogger import log_info, log_warning, LOGLEVEL
+
+ENABLED = False
+
+# Stages that can be given a budget, in the order they run
+STAGES = ("playtimes", "name_index", "library_scan", "names", "sizes", "measured", "report")
+
+# Stage name -> bytes. "*" applies to every stage without its own budget.
+BUDGETS: Dict[str, int] = {}
+
+TOP_SITES = 5
+
+# Leaves tracemalloc's own snapshots out of the allocation sites
+SNAPSHOT_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+
+class StageMemory(NamedTuple):
+    peak: int
+    # (file:line, bytes allocated during the stage and still held at its end)
+    top_sites: List[Tuple[str, int]]
+
+
+class MemoryBudgetExceeded(Exception):
+    def __init__(self, stage: str, peak: int, budget: int):
+        super().__init__("Stage {} used {:.3f} MB, over its budget of {:.3f} MB".format(
+            stage, peak / (1000 * 1000), budget / (1000 * 1000)
+        ))
+        self.stage = stage
+        self.peak = peak
+        self.budget = budget
+
+
+stages: Dict[str, StageMemory] = {}
+
+
+def parse_budgets(spec: str) -> Optional[Dict[str, int]]:
+    """
+    Parse "names=200,sizes=50" (MB per stage) or "256" (MB for every stage).
+
+    :return: Stage name -> bytes, or None if spec isn't valid: a stage not in STAGES, or a budget that isn't a
+             number above 0
+    """
+    budgets = {}
+    for part in spec.split(","):
+        stage, sep, megabytes = part.strip().rpartition("=")
+        stage = stage.strip() if sep else "*"
+        if stage != "*" and stage not in STAGES:
+            return None
+
+        try:
+            budget = int(float(megabytes) * 1000 * 1000)
+        except (ValueError, OverflowError):
+            return None
+
+        if not budget > 0:
+            return None
+
+        budgets[stage] = budget
+
+    return budgets
+
+
+def enable(budgets: Optional[Dict[str, int]] = None):
+    global ENABLED, BUDGETS
+
+    BUDGETS = dict(budgets or {})
+    stages.clear()
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    ENABLED = True
+
+
+def budget_for(stage: str) -> Optional[int]:
+    return BUDGETS.get(stage, BUDGETS.get("*"))
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Profile a block of work as a stage, raising MemoryBudgetExceeded afterwards if it went over its budget.
+    """
+    if not ENABLED:
+        yield
+        return
+
+    before = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+    # Before Python 3.9 the peak can't be reset, so it's the peak since profiling started
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    try:
+        yield
+    finally:
+        # Recorded even if the stage raised, so it's still in the report
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        after = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+        top_sites = [
+            ("{}:{}".format(diff.traceback[0].filename, diff.traceback[0].lineno), diff.size_diff)
+            for diff in after.compare_to(before, "lineno")[:TOP_SITES] if diff.size_diff > 0
+        ]
+        stages[name] = StageMemory(peak, top_sites)
+        metrics.record_stage_memory(name, peak)
+
+    budget = budget_for(name)
+    if budget is not None and peak > budget:
+        raise MemoryBudgetExceeded(name, peak, budget)
+
+
+def log_report():
+    for name, memory in stages.items():
+        budget = budget_for(name)
+        log = log_warning if budget is not None and memory.peak > budget else log_info
+        log(LOGLEVEL.INFO, "Stage {} peaked at {} MB{}".format(
+            name, round(memory.peak / (1000 * 1000), 2),
+            " (budget {} MB)".format(round(budget / (1000 * 1000), 2)) if budget is not None else ""
+        ))
+
+        for site, size in memory.top_sites:
+            log_info(LOGLEVEL.INFO, "    {:>10} KB  {}".format(round(size / 1000, 1), site))
@@ -0,0 +1,275 @@
+"""Counters and timings for finding out why a run is slow.
+
+Collection is off unless enable() is called (-M), and every recording function returns straight away while it's off,
+so leaving the calls in costs a function call each. Call sites in loops add up locally and record once at the end.
+
+write() saves a JSON summary, and a Prometheus textfile-collector file that node_exporter can pick up from the same
+directory.
+
+A stage's CPU time counts the thread it runs on plus any work it hands to other threads through worker(), which is
+always measured since pipeline logs it too.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Tuple, TypeVar
+
+T = TypeVar("T")
+
+PROMETHEUS_PREFIX = "steam_gb_per_hour"
+
+ENABLED = False
+
+# (name, ((label, value), ...)) -> value
+_counters: Dict[Tuple[str, tuple], float] = {}
+# Stage name -> (wall seconds, CPU seconds)
+_stages: Dict[str, Tuple[float, float]] = {}
+# Stage name -> peak traced bytes, only set while memory profiling (-P)
+_stage_memory: Dict[str, int] = {}
+_lock = threading.Lock()
+# StageCpu of the stage running on the current thread, if any
+_local = threading.local()
+
+_started_wall = 0.0
+_started_cpu = 0.0
+
+COUNTER_HELP = {
+    "cache_hits": "Lookups answered from a cache",
+    "cache_misses": "Lookups that weren't in a cache",
+    "http_requests": "HTTP requests sent, including retries",
+    "downloaded_bytes": "Bytes of HTTP response bodies received",
+    "manifests_opened": "App manifests opened and parsed",
+    "stat_calls": "stat and scandir calls made on libraries, manifests and game files, by call"
+}
+
+
+def enable():
+    """
+    Start collecting, resetting anything collected so far.
+    """
+    global ENABLED, _started_wall, _started_cpu
+
+    with _lock:
+        _counters.clear()
+        _stages.clear()
+        _stage_memory.clear()
+
+    _started_wall = time.perf_counter()
+    _started_cpu = time.process_time()
+    ENABLED = True
+
+
+def count(name: str, amount: float = 1, **labels):
+    if not ENABLED:
+        return
+
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def cache_lookups(cache: str, hits: int, misses: int):
+    if not ENABLED:
+        return
+
+    count("cache_hits", hits, cache=cache)
+    count("cache_misses", misses, cache=cache)
+
+
+def counted_bytes(chunks: Iterable[bytes], name: str = "downloaded_bytes") -> Iterable[bytes]:
+    """
+    Pass chunks through, adding up their lengths as they go. Returns chunks untouched while collection is off.
+    """
+    if not ENABLED:
+        return chunks
+
+    def counting():
+        total = 0
+        try:
+            for chunk in chunks:
+                total += len(chunk)
+                yield chunk
+        finally:
+            count(name, total)
+
+    return counting()
+
+
+def record_stage(name: str, wall: float, cpu: float):
+    if not ENABLED:
+        return
+
+    with _lock:
+        _stages[name] = (wall, cpu)
+
+
+def record_stage_memory(name: str, peak: int):
+    if not ENABLED:
+        return
+
+    with _lock:
+        _stage_memory[name] = peak
+
+
+class StageCpu:
+    """
+    CPU time used by a stage: by the thread it runs on since it started, and by the calls it handed to other threads.
+    """
+
+    def __init__(self):
+        self.started = time.thread_time()
+        self.workers = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.workers += seconds
+
+    def total(self) -> float:
+        return time.thread_time() - self.started + self.workers
+
+
+@contextmanager
+def stage_cpu() -> Iterator[StageCpu]:
+    """
+    Measure the CPU time of a stage running on the current thread, including what functions wrapped with worker()
+    use on other threads.
+    """
+    cpu = StageCpu()
+    outer = getattr(_local, "stage_cpu", None)
+    _local.stage_cpu = cpu
+    try:
+        yield cpu
+    finally:
+        _local.stage_cpu = outer
+
+
+def worker(func: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wrap func before handing it to other threads (e.g. a ThreadPoolExecutor), so the CPU time it uses there counts
+    towards the stage running on this thread. Returns func untouched outside of a stage.
+    """
+    cpu = getattr(_local, "stage_cpu", None)
+    if cpu is None:
+        return func
+
+    def measured(*args, **kwargs):
+        # Work this hands on again counts towards the same stage
+        outer = getattr(_local, "stage_cpu", None)
+        _local.stage_cpu = cpu
+        started = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            cpu.add(time.thread_time() - started)
+            _local.stage_cpu = outer
+
+    return measured
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block of work done on the current thread, and by workers it hands work to, as a stage.
+    """
+    if not ENABLED:
+        yield
+        return
+
+    started_wall = time.perf_counter()
+    with stage_cpu() as cpu:
+        try:
+            yield
+        finally:
+            record_stage(name, time.perf_counter() - started_wall, cpu.total())
+
+
+def summary() -> dict:
+    """
+    Everything collected so far. Counters with a label are nested under the label's value.
+    """
+    counters = {}
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            if labels:
+                counters.setdefault(name, {})[",".join(str(v) for _, v in labels)] = value
+            else:
+                counters[name] = value
+
+        stages = {name: {"wall_seconds": wall, "cpu_seconds": cpu} for name, (wall, cpu) in _stages.items()}
+        for name, peak in _stage_memory.items():
+            stages.setdefault(name, {})["peak_memory_bytes"] = peak
+
+    return {
+        "wall_seconds": time.perf_counter() - _started_wall,
+        "cpu_seconds": time.process_time() - _started_cpu,
+        "stages": stages,
+        "counters": counters
+    }
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels
+    ) + "}"
+
+
+def prometheus_text() -> str:
+    data = summary()
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        full_name = "{}_{}".format(PROMETHEUS_PREFIX, name)
+        lines.append("# HELP {} {}".format(full_name, help_text))
+        lines.append("# TYPE {} {}".format(full_name, kind))
+        for labels, value in samples:
+            lines.append("{}{} {}".format(full_name, format_labels(labels), repr(float(value))))
+
+    metric("run_wall_seconds", "gauge", "Wall time of the last run", [((), data["wall_seconds"])])
+    metric("run_cpu_seconds", "gauge", "CPU time of the last run", [((), data["cpu_seconds"])])
+
+    stages = sorted(data["stages"].items())
+    metric("stage_wall_seconds", "gauge", "Wall time of each stage of the last run",
+           [((("stage", name),), times["wall_seconds"]) for name, times in stages if "wall_seconds" in times])
+    metric("stage_cpu_seconds", "gauge", "CPU time of each stage of the last run",
+           [((("stage", name),), times["cpu_seconds"]) for name, times in stages if "cpu_seconds" in times])
+
+    memory = [
+        ((("stage", name),), times["peak_memory_bytes"]) for name, times in stages if "peak_memory_bytes" in times
+    ]
+    if memory:
+        metric("stage_peak_memory_bytes", "gauge", "Peak traced memory of each stage of the last run", memory)
+
+    with _lock:
+        counters = sorted(_counters.items())
+
+    names = sorted({name for (name, labels), value in counters})
+    for name in names:
+        metric(name + "_total", "counter", COUNTER_HELP.get(name, name),
+               [(labels, value) for (counter_name, labels), value in counters if counter_name == name])
+
+    return "\n".join(lines) + "\n"
+
+
+def write(directory: str):
+    """
+    Write metrics.json and steam_gb_per_hour.prom to directory. Both are replaced atomically, so the textfile
+    collector never reads half a file.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    for filename, content in (
+            ("metrics.json", json.dumps(summary(), indent=4) + "\n"),
+            ("{}.prom".format(PROMETHEUS_PREFIX), prometheus_text())
+    ):
+        path = os.path.join(directory, filename)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,280 @@
+"""Compact on-disk appid -> name index.
+
+The index is a single file laid out as:
+
+    header   magic (4 bytes), version (u32), count (u32)
+    appids   count x u32, sorted ascending
+    offsets  (count + 1) x u32, byte offsets of each name inside the name blob
+    names    UTF-8 name blob
+
+It is memory-mapped and binary-searched, so a lookup touches a handful of pages instead of
+parsing the whole catalogue.
+"""
+
+import codecs
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional, Tuple
+
+MAGIC = b"SGNI"
+VERSION = 1
+HEADER = struct.Struct("=4sII")
+
+
+class NameIndex:
+    def __init__(self, path: str):
+        self.path = path
+
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file, can't be mapped
+            self._file.close()
+            raise ValueError("Name index {} is empty".format(path))
+
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Name index {} has an unknown format".format(path))
+
+        self.count = count
+
+        ids_start = HEADER.size
+        offsets_start = ids_start + 4 * count
+        self._names_start = offsets_start + 4 * (count + 1)
+
+        view = memoryview(self._map)
+        self._appids = view[ids_start:offsets_start].cast("I")
+        self._offsets = view[offsets_start:self._names_start].cast("I")
+        view.release()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, appid):
+        return self._find(appid) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _find(self, appid: int) -> Optional[int]:
+        idx = bisect_left(self._appids, appid)
+        if idx < self.count and self._appids[idx] == appid:
+            return idx
+
+        return None
+
+    def _name_at(self, idx: int) -> str:
+        start = self._names_start + self._offsets[idx]
+        end = self._names_start + self._offsets[idx + 1]
+        return self._map[start:end].decode("utf-8")
+
+    def get(self, appid: int, default=None) -> Optional[str]:
+        idx = self._find(appid)
+        if idx is None:
+            return default
+
+        return self._name_at(idx)
+
+    def at(self, idx: int) -> Tuple[int, str]:
+        """
+        The appid and name of the idx-th game, in appid order.
+        """
+        return self._appids[idx], self._name_at(idx)
+
+    def max_appid(self) -> int:
+        return self._appids[-1] if self.count else 0
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        for idx in range(self.count):
+            yield self._appids[idx], self._name_at(idx)
+
+    def close(self):
+        if getattr(self, "_appids", None) is not None:
+            self._appids.release()
+            self._offsets.release()
+            self._appids = None
+            self._offsets = None
+
+        if not self._map.closed:
+            self._map.close()
+
+        self._file.close()
+
+
+def open_index(path: str) -> Optional[NameIndex]:
+    """
+    Open the index at path, or return None if it doesn't exist or can't be read.
+
+    :param path: Path to the index file
+    """
+    try:
+        return NameIndex(path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def build_index(entries: Iterable[Tuple[int, str]], path: str) -> int:
+    """
+    Write an index from (appid, name) pairs in any order, replacing path atomically.
+    When an appid appears more than once, the last non-empty name wins.
+
+    :param entries: Iterable of (appid, name) pairs
+    :param path: Destination path of the index
+    :return: The number of apps written
+    """
+    slots = {}
+    appids = array("I")
+    starts = array("I")
+    lengths = array("I")
+    names = bytearray()
+
+    for appid, name in entries:
+        encoded = name.encode("utf-8")
+        if appid in slots:
+            if not encoded:
+                continue
+
+            # Superseded names stay in the scratch blob, they're dropped when it's compacted below
+            slot = slots[appid]
+            starts[slot] = len(names)
+            lengths[slot] = len(encoded)
+        else:
+            slots[appid] = len(appids)
+            appids.append(appid)
+            starts.append(len(names))
+            lengths.append(len(encoded))
+
+        names += encoded
+
+    del slots
+    order = sorted(range(len(appids)), key=appids.__getitem__)
+
+    sorted_ids = array("I", (appids[i] for i in order))
+    sorted_offsets = array("I")
+    blob = bytearray()
+    for i in order:
+        sorted_offsets.append(len(blob))
+        blob += names[starts[i]:starts[i] + lengths[i]]
+
+    sorted_offsets.append(len(blob))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sorted_ids)))
+        sorted_ids.tofile(f)
+        sorted_offsets.tofile(f)
+        f.write(blob)
+
+    os.replace(tmp_path, path)
+
+    return len(sorted_ids)
+
+
+def iter_json_array(chunks: Iterable[bytes], key: str, chunk_hint: int = 1 << 16) -> Iterator[dict]:
+    """
+    Incrementally yield the objects of the first JSON array found under key, without loading the whole
+    document. Only the current chunk and the object being decoded are held in memory.
+
+    :param chunks: Iterable of raw bytes, e.g. a streamed HTTP response body
+    :param key: Name of the key holding the array (e.g. "apps")
+    :param chunk_hint: Buffer size after which consumed text is discarded
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+
+    buf = ""
+    pos = 0
+    exhausted = False
+
+    def more():
+        nonlocal buf, pos, exhausted
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            exhausted = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+            pos = 0
+            return
+
+        buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+
+    # Find the start of the array
+    marker = '"{}"'.format(key)
+    while True:
+        found = buf.find(marker, pos)
+        if found != -1:
+            bracket = buf.find("[", found + len(marker))
+            if bracket != -1:
+                pos = bracket + 1
+                break
+
+            pos = found
+        else:
+            # Keep enough of the tail to match a marker split across chunks
+            pos = max(pos, len(buf) - len(marker))
+
+        if exhausted:
+            raise ValueError("No \"{}\" array in response".format(key))
+
+        more()
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+
+        if pos >= len(buf):
+            if exhausted:
+                raise ValueError("Truncated \"{}\" array in response".format(key))
+
+            more()
+            continue
+
+        if buf[pos] == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+
+            more()
+            continue
+
+        pos = end
+        if pos > chunk_hint:
+            buf = buf[pos:]
+            pos = 0
+
+        yield obj
+
+
+def merge_index(path: str, entries: Iterable[Tuple[int, str]]) -> int:
+    """
+    Merge (appid, name) pairs into the index at path, creating it if needed. New names replace old ones.
+
+    :param path: Path to the index file
+    :param entries: Iterable of (appid, name) pairs to merge in
+    :return: The number of apps in the merged index
+    """
+    def merged():
+        old = open_index(path)
+        if old:
+            # Closed as soon as it's been read, before the new index replaces it
+            with old:
+                yield from old.items()
+
+        yield from entries
+
+    return build_index(merged(), path)
@@ -0,0 +1,400 @@
+"""Fuzzy and prefix search over the cached game names (see name_index).
+
+Names are split into lowercase words. Searching for a word looks it up in the sorted list of every word in the
+catalogue: a prefix search takes the run of words starting with it, and a fuzzy search takes the words that share
+enough trigrams (runs of three characters) with it, so typos and missing letters still match. Each word then lists
+the games whose names contain it.
+
+The index is written to a file next to the name index. It's only built when a search finds it missing or built from
+an older name index, so refreshing names for a report never waits on it:
+
+    header        see HEADER
+    word_offsets  (words + 1) x u32, byte offsets of each word inside the word blob
+    name_offsets  (words + 1) x u32, where each word's games start inside the game postings
+    gram_keys     trigrams x u64, sorted ascending, each the trigram's three code points packed 21 bits apiece
+    gram_offsets  (trigrams + 1) x u32, where each trigram's words start inside the word postings
+    word_grams    words x u8, number of distinct trigrams in each word
+    name_words    games x u8, number of distinct words in each game's name
+    games         u32 per word per game with it in its name, positions in the name index
+    word ids      u32 per trigram per word with it
+    words         UTF-8 word blob, words in sorted order
+
+Like the name index it's memory-mapped, so a search only reads the parts of it that it needs.
+"""
+
+import heapq
+import mmap
+import os
+import re
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import cache_store, constants, history
+from .basiclogger import log_failure, log_info, LOGLEVEL
+from .name_index import NameIndex, open_index
+from .report_writers import format_gb, format_playtime
+from .stats import gb_per_hour
+
+MAGIC = b"SGTS"
+VERSION = 1
+# magic, version, games in the name index, its size and mtime (ns) when this was built, words, trigrams
+HEADER = struct.Struct("=4sIIQQII")
+
+# Anything that isn't a letter or a digit separates words
+SEPARATORS = re.compile(r"(?:[^\w\n]|_)+")
+
+
+def search_path(index_path: str) -> str:
+    """
+    Path of the search index for the name index at index_path.
+    """
+    return os.path.splitext(index_path)[0] + ".tri"
+
+
+def words_of(name: str) -> List[str]:
+    return SEPARATORS.sub(" ", name.casefold()).split()
+
+
+def trigrams(word: str) -> Set[int]:
+    """
+    The word's trigrams, counting the start and end of the word as a space, packed into ints.
+    """
+    padded = [ord(c) for c in " {} ".format(word)]
+    return {(a << 42) | (b << 21) | c for a, b, c in zip(padded, padded[1:], padded[2:])}
+
+
+def index_stamp(index_path: str) -> Tuple[int, int]:
+    stat = os.stat(index_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class NameSearch:
+    def __init__(self, path: str):
+        self.path = path
+
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("Search index {} is empty".format(path))
+
+        self._views: List[memoryview] = []
+        try:
+            magic, version, self.games, index_size, index_mtime, self.words, self.grams = HEADER.unpack_from(
+                self._map, 0
+            )
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("Search index {} has an unknown format".format(path))
+
+            self.stamp = (index_size, index_mtime)
+
+            self._offset = HEADER.size
+            self._word_offsets = self._column("I", self.words + 1)
+            self._name_offsets = self._column("I", self.words + 1)
+            self._gram_keys = self._column("Q", self.grams)
+            self._gram_offsets = self._column("I", self.grams + 1)
+            self._word_grams = self._column("B", self.words)
+            self._name_words = self._column("B", self.games)
+            self._names = self._column("I", self._name_offsets[-1])
+            self._word_ids = self._column("I", self._gram_offsets[-1])
+            self._blob_start = self._offset
+        except (ValueError, struct.error, TypeError, IndexError):
+            self.close()
+            raise
+
+    def _column(self, typecode: str, count: int) -> memoryview:
+        end = self._offset + count * array(typecode).itemsize
+        if end > len(self._map):
+            raise ValueError("Search index {} is truncated".format(self.path))
+
+        view = memoryview(self._map)
+        column = view[self._offset:end].cast(typecode)
+        view.release()
+
+        self._views.append(column)
+        self._offset = end
+        return column
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _word(self, word_id: int) -> str:
+        start = self._blob_start + self._word_offsets[word_id]
+        end = self._blob_start + self._word_offsets[word_id + 1]
+        return self._map[start:end].decode("utf-8")
+
+    def _first_word_from(self, word: str) -> int:
+        """
+        The first word ID whose word sorts at or after word.
+        """
+        low, high = 0, self.words
+        while low < high:
+            middle = (low + high) // 2
+            if self._word(middle) < word:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _games_with(self, word_id: int) -> memoryview:
+        return self._names[self._name_offsets[word_id]:self._name_offsets[word_id + 1]]
+
+    def prefixed(self, word: str) -> range:
+        """
+        IDs of the words starting with word.
+        """
+        start = self._first_word_from(word)
+        end = start
+        while end < self.words and self._word(end).startswith(word):
+            end += 1
+
+        return range(start, end)
+
+    def similar(self, word: str) -> Dict[int, float]:
+        """
+        Word ID -> how alike it is to word (from 0 to 1), for the words alike enough to match.
+        """
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            i = bisect_left(self._gram_keys, gram)
+            if i < self.grams and self._gram_keys[i] == gram:
+                shared.update(self._word_ids[self._gram_offsets[i]:self._gram_offsets[i + 1]])
+
+        matches = {}
+        for word_id, count in shared.items():
+            similarity = count / (len(grams) + self._word_grams[word_id] - count)
+            if similarity >= constants.SEARCH_MIN_SIMILARITY:
+                matches[word_id] = similarity
+
+        return matches
+
+    def fuzzy(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """
+        Games whose names are most alike the query, even with typos.
+
+        :return: (position in the name index, score from 0 to 1), best first
+        """
+        query_words = words_of(query)
+        totals = Counter()
+        for word in query_words:
+            # Each game's most alike word, by going from the least to the most alike
+            best: Dict[int, float] = {}
+            for word_id, similarity in sorted(self.similar(word).items(), key=itemgetter(1)):
+                best.update(dict.fromkeys(self._games_with(word_id), similarity))
+
+            totals.update(best)
+
+        # Matching every searched word counts for most, then having few other words in the name
+        return heapq.nlargest(limit, (
+            (game, 2 * total / (len(query_words) + self._name_words[game])) for game, total in totals.items()
+        ), key=lambda result: result[1])
+
+    def prefix(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """
+        Games with a word in their names starting with each word of the query, e.g. "wit hun" for "The Witcher 3:
+        Wild Hunt".
+
+        :return: (position in the name index, score from 0 to 1), the names with the fewest other words first
+        """
+        query_words = words_of(query)
+        games = None
+        for word in query_words:
+            matched = set()
+            for word_id in self.prefixed(word):
+                matched.update(self._games_with(word_id))
+
+            games = matched if games is None else games & matched
+            if not games:
+                return []
+
+        return heapq.nlargest(limit, (
+            (game, len(query_words) / max(len(query_words), self._name_words[game])) for game in games or ()
+        ), key=lambda result: result[1])
+
+    def close(self):
+        for view in self._views:
+            view.release()
+
+        self._views = []
+
+        if not self._map.closed:
+            self._map.close()
+
+        self._file.close()
+
+
+def open_search(index_path: str) -> Optional[NameSearch]:
+    """
+    Open the search index for the name index at index_path, or return None if it doesn't exist, can't be read or
+    was built from a different name index.
+    """
+    try:
+        search = NameSearch(search_path(index_path))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    try:
+        stamp = index_stamp(index_path)
+    except OSError:
+        stamp = None
+
+    if search.stamp != stamp:
+        search.close()
+        return None
+
+    return search
+
+
+def build_search(index: NameIndex, index_path: str) -> int:
+    """
+    Write the search index for the name index at index_path, replacing it atomically.
+
+    :param index: The name index, open
+    :return: The number of distinct words
+    """
+    stamp = index_stamp(index_path)
+
+    word_ids: Dict[str, int] = {}
+    postings: List[array] = []
+    name_words = array("B")
+    for game, (_, name) in enumerate(index.items()):
+        words = set(words_of(name))
+        name_words.append(min(len(words), 255))
+        for word in words:
+            word_id = word_ids.get(word)
+            if word_id is None:
+                word_ids[word] = len(postings)
+                postings.append(array("I", (game,)))
+            else:
+                postings[word_id].append(game)
+
+    vocabulary = sorted(word_ids)
+
+    word_offsets = array("I", [0])
+    name_offsets = array("I", [0])
+    games = array("I")
+    blob = bytearray()
+    word_grams = array("B")
+    gram_words: Dict[int, List[int]] = {}
+    for word_id, word in enumerate(vocabulary):
+        blob += word.encode("utf-8")
+        word_offsets.append(len(blob))
+
+        games += postings[word_ids[word]]
+        name_offsets.append(len(games))
+
+        grams = trigrams(word)
+        word_grams.append(min(len(grams), 255))
+        for gram in grams:
+            gram_words.setdefault(gram, []).append(word_id)
+
+    del postings, word_ids
+
+    gram_keys = array("Q", sorted(gram_words))
+    gram_offsets = array("I", [0])
+    word_postings = array("I")
+    for gram in gram_keys:
+        word_postings.extend(gram_words[gram])
+        gram_offsets.append(len(word_postings))
+
+    path = search_path(index_path)
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index), *stamp, len(vocabulary), len(gram_keys)))
+        for column in (word_offsets, name_offsets, gram_keys, gram_offsets, word_grams, name_words, games,
+                       word_postings):
+            column.tofile(f)
+        f.write(blob)
+
+    os.replace(path + ".tmp", path)
+
+    return len(vocabulary)
+
+
+def update_search(index_path: str) -> bool:
+    """
+    Build the search index for the name index at index_path, logging rather than raising if it can't be.
+
+    :return: Whether it was built
+    """
+    index = open_index(index_path)
+    if index is None:
+        log_failure(LOGLEVEL.DEBUG, "No name index to build the search index from")
+        return False
+
+    started = time.perf_counter()
+    try:
+        with index:
+            words = build_search(index, index_path)
+    except OSError as e:
+        log_failure(LOGLEVEL.INFO, "Couldn't build the name search index ({})".format(e))
+        return False
+
+    log_info(LOGLEVEL.DEBUG, "Built the name search index ({} words) in {:.2f}s".format(
+        words, time.perf_counter() - started
+    ))
+    return True
+
+
+def show(steamid, query: str, prefix: bool, index_path: str) -> bool:
+    """
+    Print the games whose names best match query, with the playtime and size from the Steam user's last report. Games
+    the user has played or installed come first.
+
+    :param prefix: Match words starting with the query's words, rather than words alike them
+    :return: False if there are no game names cached to search
+    """
+    index = open_index(index_path)
+    if index is None:
+        return False
+
+    with index:
+        search = open_search(index_path)
+        if search is None and update_search(index_path):
+            search = open_search(index_path)
+
+        if search is None:
+            return False
+
+        with search:
+            if prefix:
+                matches = search.prefix(query, constants.SEARCH_CANDIDATES)
+            else:
+                matches = search.fuzzy(query, constants.SEARCH_CANDIDATES)
+
+            found = [index.at(game) for game, _ in matches]
+
+    games = history.latest_games(steamid)
+    cached_sizes = cache_store.store().load_file_sizes()
+
+    def details(appid):
+        minutes, size = games.get(appid, (0, 0))
+        if not size and appid in cached_sizes:
+            size = cached_sizes[appid].get("size", 0)
+        return minutes, size
+
+    # Stable, so each group stays in order of how well it matched
+    found.sort(key=lambda game: not any(details(game[0])))
+
+    if not found:
+        print("No games match \"{}\".".format(query))
+        return True
+
+    for appid, name in found[:constants.SEARCH_RESULTS]:
+        minutes, size = details(appid)
+        print("{:60}| {:12} | {:12} | {:18} | {}".format(
+            name, format_playtime(minutes) if minutes else "-", format_gb(size) if size else "-",
+            "{} GB/hr".format(round(gb_per_hour(size, minutes), 4)) if minutes and size else "-", appid
+        ))
+
+    return True
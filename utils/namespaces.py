@@ -0,0 +1,88 @@
+"""Per-account cache directories.
+
+Caches that only depend on what's installed or on Steam's catalogue (app names, manifest sizes) live directly in
+"cache". Caches that depend on the account being looked at live in "cache/accounts/<namespace>", one namespace per
+API key and Steam ID pair, so switching between accounts doesn't throw anything away. Only the most recently used
+namespaces are kept.
+"""
+
+import hashlib
+import os
+import shutil
+from typing import Optional
+
+from . import cache_store, constants
+from .basiclogger import log_info, LOGLEVEL
+from .pathutils import from_root
+
+ACCOUNTS_DIR = from_root(os.path.join("cache", "accounts"))
+
+ACTIVE_NAMESPACE: Optional[str] = None
+
+
+def account_hash(apikey, account_id) -> str:
+    """
+    Return the info hash identifying an API key and account pair, without either of them in the clear.
+
+    :param apikey: Steam web API key
+    :param account_id: Steam ID, or anything else identifying whose data is being looked at
+    """
+    return "{}|{}".format(
+        hashlib.sha256(str(apikey).encode("utf-8")).hexdigest(),
+        hashlib.sha256(str(account_id).encode("utf-8")).hexdigest()
+    )
+
+
+def namespace_for(info_hash: str) -> str:
+    return hashlib.sha256(info_hash.encode("utf-8")).hexdigest()[:16]
+
+
+def use_namespace(info_hash: str):
+    """
+    Make the namespace for info_hash the one account caches are read from and written to, creating it if needed
+    and evicting the least recently used namespaces if there are too many.
+
+    :param info_hash: Identifies the account, e.g. hashes of the API key and Steam ID
+    """
+    global ACTIVE_NAMESPACE
+
+    namespace = namespace_for(info_hash)
+    path = os.path.join(ACCOUNTS_DIR, namespace)
+    if os.path.isdir(path):
+        log_info(LOGLEVEL.DEBUG, "Using account cache {}".format(namespace))
+    else:
+        log_info(LOGLEVEL.DEBUG, "Creating account cache {}".format(namespace))
+        os.makedirs(path)
+
+    # The directory's mtime is used as its last use time
+    os.utime(path)
+    ACTIVE_NAMESPACE = namespace
+
+    evict(constants.MAX_ACCOUNT_CACHES)
+
+
+def evict(keep: int):
+    try:
+        namespaces = [entry for entry in os.scandir(ACCOUNTS_DIR) if entry.is_dir()]
+    except FileNotFoundError:
+        return
+
+    namespaces.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+    for entry in namespaces[keep:]:
+        if entry.name != ACTIVE_NAMESPACE:
+            log_info(LOGLEVEL.DEBUG, "Evicting least recently used account cache {}".format(entry.name))
+            shutil.rmtree(entry.path, ignore_errors=True)
+            cache_store.store().delete_namespace(entry.name)
+
+
+def account_cache_path(filename: str) -> str:
+    """
+    Return the path of an account-specific cache file in the active namespace. Before a namespace is chosen, this
+    is the shared cache directory.
+
+    :param filename: Name of the cache file
+    """
+    if ACTIVE_NAMESPACE is None:
+        return from_root(os.path.join("cache", filename))
+
+    return os.path.join(ACCOUNTS_DIR, ACTIVE_NAMESPACE, filename)
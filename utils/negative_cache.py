@@ -0,0 +1,132 @@
+"""Game IDs to skip, with why they're skipped and for how long.
+
+Each account's entries are loaded from the cache store once per run, and written back once at the end of it (see
+flush), only if something changed. Entries expire after a TTL that depends on their reason, after which the game is
+looked at again; games marked as not installed are also looked at again as soon as a manifest for them shows up.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from . import cache_store, constants, namespaces
+from .basiclogger import log_info, LOGLEVEL
+
+NOT_INSTALLED = "not_installed"
+NOT_IN_CATALOGUE = "not_in_catalogue"
+CORRUPT_MANIFEST = "corrupt_manifest"
+
+REASON_TTLS = {
+    NOT_INSTALLED: constants.NOT_INSTALLED_TTL,
+    NOT_IN_CATALOGUE: constants.NOT_IN_CATALOGUE_TTL,
+    CORRUPT_MANIFEST: constants.CORRUPT_MANIFEST_TTL
+}
+
+
+class NegativeCache:
+    def __init__(self, namespace: str, entries: Dict[int, Tuple[str, float]],
+                 clock: Callable[[], float] = time.time):
+        """
+        :param clock: Returns the current time. Read on every lookup, since the daemon keeps one cache for days.
+        """
+        self.namespace = namespace
+        self.entries = entries
+        self.clock = clock
+
+        self.added: Dict[int, Tuple[str, float]] = {}
+        self.removed = set()
+
+    def active(self, appid: int) -> Optional[str]:
+        """
+        Return why appid is being skipped, or None if it isn't (or its entry has expired).
+        """
+        entry = self.entries.get(appid)
+        if entry is None:
+            return None
+
+        reason, added_at = entry
+        if self.clock() - added_at >= REASON_TTLS.get(reason, 0):
+            return None
+
+        return reason
+
+    def __contains__(self, appid) -> bool:
+        return self.active(appid) is not None
+
+    def blocks(self, appid: int, reasons: Iterable[str]) -> bool:
+        return self.active(appid) in reasons
+
+    def add(self, appid: int, reason: str):
+        appid = int(appid)
+        if self.active(appid) == reason:
+            return
+
+        now = self.clock()
+        self.entries[appid] = (reason, now)
+        self.added[appid] = (reason, now)
+        self.removed.discard(appid)
+
+    def discard(self, appid: int):
+        appid = int(appid)
+        if appid in self.entries:
+            del self.entries[appid]
+            self.added.pop(appid, None)
+            self.removed.add(appid)
+
+    def revalidate(self, manifest_mtimes: Dict[int, float]):
+        """
+        Forget entries the library scan shows are out of date: "not installed" games that have a manifest now, and
+        corrupt manifests that have been written to since they were marked.
+
+        :param manifest_mtimes: Game ID -> mtime of its manifest, for every manifest in the libraries
+        """
+        for appid, mtime in manifest_mtimes.items():
+            entry = self.entries.get(appid)
+            if entry is None:
+                continue
+
+            reason, added_at = entry
+            if reason == NOT_INSTALLED:
+                log_info(LOGLEVEL.DEBUG, "Game ID {} has been installed since it was ignored".format(appid))
+                self.discard(appid)
+            elif reason == CORRUPT_MANIFEST and mtime > added_at:
+                log_info(LOGLEVEL.DEBUG, "Manifest for game ID {} has changed since it was ignored".format(appid))
+                self.discard(appid)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.added or self.removed)
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        cache_store.store().update_ignored(self.namespace, self.added, self.removed)
+        self.added = {}
+        self.removed = set()
+
+
+_loaded: Dict[str, NegativeCache] = {}
+_loaded_lock = threading.Lock()
+
+
+def get() -> NegativeCache:
+    """
+    Return the negative cache for the active account namespace, loading it on first use in this run.
+    """
+    namespace = namespaces.ACTIVE_NAMESPACE or ""
+
+    # Pipeline stages can ask for it at the same time, and must get the same one
+    with _loaded_lock:
+        if namespace not in _loaded:
+            _loaded[namespace] = NegativeCache(namespace, cache_store.store().load_ignored(namespace))
+
+        return _loaded[namespace]
+
+
+def flush():
+    """
+    Write every loaded negative cache that changed back to the cache store.
+    """
+    for negative_cache in _loaded.values():
+        negative_cache.save()
@@ -1,7 +1,11 @@
 """Utilities for manipulating path."""
 
+import os
 from os import path
-import sys
+
+# The project root is the directory containing the utils package, wherever the program is run from. It can be moved
+# elsewhere (e.g. by the benchmarks, so they don't touch the real config and caches).
+ROOT = os.environ.get("STEAM_GB_PER_HOUR_ROOT") or path.dirname(path.dirname(path.abspath(__file__)))
 
 
 def from_root(relative: str):
@@ -10,5 +14,4 @@ def from_root(relative: str):
 
     :param relative: The relative path from the root of the project
     """
-    this_folder = path.dirname(sys.argv[0])
-    return path.normpath(path.join(this_folder, relative))
+    return path.normpath(path.join(ROOT, relative))
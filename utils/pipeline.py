@@ -0,0 +1,102 @@
+"""Runs named stages concurrently, each one starting as soon as the stages it depends on have finished.
+
+    pipeline = Pipeline()
+    pipeline.add("playtimes", lambda: get_playtimes())
+    pipeline.add("scan", lambda: scan_libraries())
+    pipeline.add("sizes", lambda playtimes, scan: pick_sizes(playtimes, scan), after=("playtimes", "scan"))
+    results = pipeline.run()
+
+A stage is called with the results of the stages it depends on, in order. When each stage started and finished is
+kept in Pipeline.timings, so it's visible how much they overlapped.
+"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Tuple
+
+from . import memory_profile, metrics
+from .basiclogger import log_info, LOGLEVEL
+
+
+class StageTiming(NamedTuple):
+    # Seconds since the pipeline started
+    start: float
+    end: float
+    # CPU time used by the stage's thread and by the workers it handed work to (see metrics.worker)
+    cpu: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class Pipeline:
+    def __init__(self):
+        self.stages: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+        self.timings: Dict[str, StageTiming] = {}
+        self.wall_time = 0.0
+
+    def add(self, name: str, func: Callable[..., Any], after: Iterable[str] = ()):
+        """
+        Add a stage. Stages can only depend on stages added before them, so there can't be any cycles.
+
+        :param name: Name of the stage, used for its result and timing
+        :param func: Called with the results of the stages in after
+        :param after: Names of the stages that have to finish first
+        """
+        after = tuple(after)
+        for dependency in after:
+            if dependency not in self.stages:
+                raise ValueError("Stage {} depends on unknown stage {}".format(name, dependency))
+
+        if name in self.stages:
+            raise ValueError("Stage {} was added twice".format(name))
+
+        self.stages[name] = (func, after)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Run every stage and wait for all of them to finish. If a stage raises, the stages depending on it raise the
+        same exception, which is raised from here once everything has stopped.
+
+        :return: Stage name -> result
+        """
+        started = time.perf_counter()
+        futures: Dict[str, Future] = {}
+
+        def run_stage(name, func, after):
+            # Stages were submitted in order, so every dependency already has a future
+            args = [futures[dependency].result() for dependency in after]
+
+            stage_started = time.perf_counter()
+            with metrics.stage_cpu() as cpu:
+                try:
+                    with memory_profile.stage(name):
+                        return func(*args)
+                finally:
+                    timing = StageTiming(stage_started - started, time.perf_counter() - started, cpu.total())
+                    self.timings[name] = timing
+                    metrics.record_stage(name, timing.duration, timing.cpu)
+
+        # One thread per stage, so stages waiting on their dependencies can't starve the ones they're waiting on.
+        # Memory profiling can only tell stages apart if they run one at a time, which is safe because stages are
+        # submitted after everything they depend on.
+        workers = 1 if memory_profile.ENABLED else max(1, len(self.stages))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for name, (func, after) in self.stages.items():
+                futures[name] = executor.submit(run_stage, name, func, after)
+
+        self.wall_time = time.perf_counter() - started
+        self.log_timings()
+
+        return {name: future.result() for name, future in futures.items()}
+
+    def log_timings(self):
+        for name, timing in sorted(self.timings.items(), key=lambda item: item[1].start):
+            log_info(LOGLEVEL.DEBUG, "Stage {:12} {:7.3f}s -> {:7.3f}s ({:.3f}s, {:.3f}s CPU)".format(
+                name, timing.start, timing.end, timing.duration, timing.cpu
+            ))
+
+        log_info(LOGLEVEL.DEBUG, "Stages took {:.3f}s in total and {:.3f}s of wall time".format(
+            sum(timing.duration for timing in self.timings.values()), self.wall_time
+        ))
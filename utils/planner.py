@@ -0,0 +1,235 @@
+"""Uninstall planning (--free): which installed games to uninstall to free some space while losing as few hours played
+as possible.
+
+Uninstalling the games with the most GB per hour played first is only a heuristic. To free 50 GB from a 40 GB game
+played for 4 hours (10 GB/hr) and a 50 GB game played for 8 hours (6.25 GB/hr), it uninstalls both and loses 12 hours,
+when the 50 GB game alone only loses 8. Picking the set of games that frees enough for the fewest hours is a knapsack
+problem, solved here with dynamic programming over sizes rounded down to buckets, so a plan always frees at least
+what was asked for.
+
+Every cell of that table is worked out, so for very large libraries (or very fine buckets) the plan is approximated
+instead, from the same greedy order tidied up afterwards. Its cost is compared against a lower bound no plan can beat,
+so the approximation says how far from the best plan it could be.
+"""
+
+import math
+import os
+from itertools import repeat
+from operator import add, lt
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from . import constants
+from .basiclogger import log_failure, LOGLEVEL
+from .report_writers import format_gb, format_playtime
+
+# More minutes than any plan could lose
+NEVER = 1 << 62
+
+
+class Plan(NamedTuple):
+    # Game IDs to uninstall, from most to least GB per hour played
+    games: List[int]
+    freed: int
+    lost_minutes: int
+    # Whether the plan is the best one with sizes rounded down to bucket bytes, rather than an approximation
+    exact: bool
+    bucket: int
+    # No plan loses fewer minutes than this
+    lower_bound: float
+    # Minutes lost by uninstalling the games with the most GB per hour played first until enough is freed
+    greedy_minutes: int
+
+
+def greedy_order(sizes: Dict[int, int], playtimes: Dict[int, int]) -> List[int]:
+    """
+    Games from fewest to most minutes played per byte, i.e. most to least GB per hour played.
+    """
+    return sorted(sizes, key=lambda gameid: (playtimes[gameid] / sizes[gameid], -sizes[gameid]))
+
+
+def cost_of(games: Iterable[int], playtimes: Dict[int, int]) -> int:
+    return sum(map(playtimes.__getitem__, games))
+
+
+def tidy(games: Iterable[int], sizes: Dict[int, int], playtimes: Dict[int, int], target: int) -> List[int]:
+    """
+    Drop games that can be kept while still freeing target bytes, the most played first.
+    """
+    games = list(games)
+    freed = sum(map(sizes.__getitem__, games))
+    for gameid in sorted(games, key=lambda gameid: (playtimes[gameid], sizes[gameid]), reverse=True):
+        if freed - sizes[gameid] >= target:
+            games.remove(gameid)
+            freed -= sizes[gameid]
+
+    return games
+
+
+def approximate(order: List[int], sizes: Dict[int, int], playtimes: Dict[int, int],
+                target: int) -> Tuple[List[int], int, float]:
+    """
+    :param order: From greedy_order
+    :return: The greedy plan, the minutes it loses before tidying, and the fractional lower bound on any plan
+    """
+    chosen = []
+    freed = 0
+    lost = 0
+    lower_bound = 0.0
+    for gameid in order:
+        if freed + sizes[gameid] >= target:
+            # Only part of this game would be needed if games could be split, which no real plan beats
+            lower_bound = lost + playtimes[gameid] * (target - freed) / sizes[gameid]
+            chosen.append(gameid)
+            lost += playtimes[gameid]
+            break
+
+        chosen.append(gameid)
+        freed += sizes[gameid]
+        lost += playtimes[gameid]
+
+    return chosen, lost, lower_bound
+
+
+def solve(weights: List[int], costs: List[int], buckets: int) -> Optional[List[int]]:
+    """
+    The cheapest set of items whose weights add up to at least buckets.
+
+    Each row of the table is worked out a whole row at a time with map(), so the inner loop runs in C.
+
+    :return: Indexes of the items, or None if no set is heavy enough
+    """
+    # least[j]: fewest minutes that free at least j buckets with the items so far
+    least = [0] + [NEVER] * buckets
+    taken: List[bytes] = []
+    for weight, cost in zip(weights, costs):
+        # Freeing j buckets with this item costs its minutes plus freeing j - weight buckets without it
+        with_item = [cost] * min(weight, buckets + 1) + list(map(add, least[:max(0, buckets + 1 - weight)],
+                                                                 repeat(cost)))
+        taken.append(bytes(map(lt, with_item, least)))
+        least = list(map(min, least, with_item))
+
+    if least[buckets] >= NEVER:
+        return None
+
+    chosen = []
+    j = buckets
+    for i in range(len(weights) - 1, -1, -1):
+        if taken[i][j]:
+            chosen.append(i)
+            j = max(0, j - weights[i])
+
+    return chosen
+
+
+def plan(sizes: Dict[int, int], playtimes: Dict[int, int], target: int) -> Optional[Plan]:
+    """
+    Work out which games to uninstall to free target bytes, losing as few minutes played as possible.
+
+    :param sizes: Game ID -> size in bytes, for every game that could be uninstalled
+    :param playtimes: Game ID -> minutes played, for at least the games in sizes
+    :param target: Bytes to free
+    :return: None if uninstalling every game wouldn't free enough
+    """
+    if sum(sizes.values()) < target:
+        return None
+
+    order = greedy_order(sizes, playtimes)
+    greedy, greedy_minutes, lower_bound = approximate(order, sizes, playtimes, target)
+    best = tidy(greedy, sizes, playtimes, target)
+
+    # One game that frees enough by itself sometimes beats the greedy plan by a lot
+    big_enough = [gameid for gameid in sizes if sizes[gameid] >= target]
+    if big_enough:
+        cheapest = min(big_enough, key=playtimes.__getitem__)
+        if playtimes[cheapest] < cost_of(best, playtimes):
+            best = [cheapest]
+
+    upper_bound = cost_of(best, playtimes)
+    exact = upper_bound == 0
+    bucket = constants.PLAN_MIN_BUCKET
+    if not exact:
+        # Unplayed games cost nothing, so they're always uninstalled first
+        free = [gameid for gameid in sizes if playtimes[gameid] == 0]
+        remaining = target - sum(map(sizes.__getitem__, free))
+
+        bucket = max(constants.PLAN_MIN_BUCKET, math.ceil(remaining / constants.PLAN_MAX_BUCKETS))
+        buckets = math.ceil(remaining / bucket)
+        # Games that cost as much as the plan already found can't be part of a cheaper one, and games too small to
+        # fill a bucket can't help either
+        items = [
+            gameid for gameid in sizes if 0 < playtimes[gameid] < upper_bound and sizes[gameid] >= bucket
+        ]
+
+        if len(items) * (buckets + 1) <= constants.PLAN_MAX_CELLS:
+            exact = True
+            chosen = solve([min(sizes[gameid] // bucket, buckets) for gameid in items],
+                           [playtimes[gameid] for gameid in items], buckets)
+            if chosen is not None:
+                solved = tidy(free + [items[i] for i in chosen], sizes, playtimes, target)
+                if cost_of(solved, playtimes) < upper_bound:
+                    best = solved
+
+    rank = {gameid: i for i, gameid in enumerate(order)}
+    best.sort(key=rank.__getitem__)
+
+    lost = cost_of(best, playtimes)
+    return Plan(
+        games=best,
+        freed=sum(map(sizes.__getitem__, best)),
+        lost_minutes=lost,
+        exact=exact,
+        bucket=bucket,
+        lower_bound=min(lower_bound, lost),
+        greedy_minutes=greedy_minutes
+    )
+
+
+def on_drives(manifests: Dict[int, str], paths: Iterable[str]) -> Set[int]:
+    """
+    Game IDs whose manifests are on the same drive as any of paths.
+
+    :raises OSError: If one of paths doesn't exist
+    """
+    devices = {os.stat(path).st_dev for path in paths}
+
+    games = set()
+    for gameid, manifest in manifests.items():
+        try:
+            if os.stat(manifest).st_dev in devices:
+                games.add(gameid)
+        except OSError as e:
+            log_failure(LOGLEVEL.DEBUG, "Couldn't stat manifest for game ID {} ({})".format(gameid, e))
+
+    return games
+
+
+def show(uninstall: Plan, target: int, name_lookups: Dict[int, str], sizes: Dict[int, int],
+         playtimes: Dict[int, int], manifests: Dict[int, str]):
+    """
+    Print a plan, with the library each game is in.
+
+    :param target: Bytes that were asked to be freed
+    """
+    print("Uninstall these {} games to free {} (of {} asked for), losing {} played:\n".format(
+        len(uninstall.games), format_gb(uninstall.freed), format_gb(target), format_playtime(uninstall.lost_minutes)
+    ))
+
+    for gameid in uninstall.games:
+        print("{:60}| {:12} | {:12} | {}".format(
+            name_lookups.get(gameid, str(gameid)), format_playtime(playtimes[gameid]), format_gb(sizes[gameid]),
+            os.path.dirname(manifests.get(gameid, ""))
+        ))
+
+    print()
+    if uninstall.greedy_minutes > uninstall.lost_minutes:
+        print("Uninstalling the games with the most GB per hour played first would lose {} instead.".format(
+            format_playtime(uninstall.greedy_minutes)
+        ))
+
+    if uninstall.exact:
+        print("No other plan loses less, with sizes rounded down to the nearest {} MB.".format(
+            round(uninstall.bucket / (1000 * 1000))
+        ))
+    else:
+        print("There were too many games to check every plan, so this one was approximated. No plan loses less "
+              "than {}.".format(format_playtime(math.ceil(uninstall.lower_bound))))
@@ -0,0 +1,196 @@
+import os
+import shutil
+import sys
+from contextlib import nullcontext
+from operator import itemgetter
+from typing import Dict, List, NamedTuple, Optional
+
+from . import report_cache
+from .basiclogger import log_info, LOGLEVEL
+from .report_writers import ReportSummary, WRITERS
+from .stats import BYTES_PER_GB, GameColumns, GameResult, gb_per_hour, MINUTES_PER_HOUR, Ranking
+
+
+class ReportOptions(NamedTuple):
+    # One of report_writers.WRITERS
+    format: str = "table"
+    # Only list this many games with the most / least GB per hour played. Every game is listed if neither is set.
+    top: Optional[int] = None
+    bottom: Optional[int] = None
+    # Print the report as well as writing it
+    echo: bool = True
+
+
+def report_path(name: str, options: ReportOptions) -> str:
+    """
+    Path of the report called name (without an extension) in options' format.
+    """
+    return name + WRITERS[options.format].extension
+
+
+def summarise(columns: GameColumns, name_lookups: Dict[int, str],
+              declared_filesizes: Optional[Dict[int, int]] = None) -> ReportSummary:
+    return ReportSummary(
+        total=len(columns),
+        average_gb_per_hour=columns.average(),
+        best=columns.game(columns.top(1, most=False)[0], name_lookups, declared_filesizes),
+        worst=columns.game(columns.top(1)[0], name_lookups, declared_filesizes),
+        percentiles=columns.percentiles(),
+        histogram=columns.histogram(),
+        pareto_frontier=list(columns.games(columns.pareto_frontier(), name_lookups, declared_filesizes))
+    )
+
+
+def summarise_stored(stored: report_cache.StoredRows) -> ReportSummary:
+    """
+    The same summary as summarise(), read off the stored rows' ranking rather than worked out from every game.
+    """
+    keys = stored.ranking.keys
+    inputs = stored.inputs
+
+    def game(key) -> GameResult:
+        minutes, size, declared, name = inputs[key[2]]
+        return GameResult(key[2], name, minutes, size, declared, key[0])
+
+    return ReportSummary(
+        total=len(keys),
+        average_gb_per_hour=sum(map(itemgetter(1), inputs.values())) * MINUTES_PER_HOUR / (
+            sum(map(itemgetter(0), inputs.values())) * BYTES_PER_GB
+        ),
+        best=game(keys[0]),
+        worst=game(keys[-1]),
+        percentiles=stored.ranking.percentiles(),
+        histogram=stored.ranking.histogram(),
+        pareto_frontier=[game(stored.ranking.key_of[gameid]) for gameid in stored.frontier()]
+    )
+
+
+def write_report(path: str, playtimes: Dict[int, int], name_lookups: Dict[int, str], game_filesizes: Dict[int, int],
+                 declared_filesizes: Optional[Dict[int, int]] = None, options: ReportOptions = ReportOptions(),
+                 cache_dir: Optional[str] = None) -> bool:
+    """
+    Write the GB per hour report to path, printing it as well if options.echo is set.
+
+    :param path: File to write the report to
+    :param playtimes: Game ID -> minutes played
+    :param name_lookups: Game ID -> name
+    :param game_filesizes: Game ID -> size in bytes used for the ranking
+    :param declared_filesizes: Game ID -> size from the manifest, shown next to measured sizes
+    :param options: Format, which games to list and whether to print the report
+    :param cache_dir: If set, reuse what's stored here from the last time this report was written (see report_cache)
+    :return: False if there was nothing to report
+    """
+    if cache_dir is not None:
+        return write_memoized_report(
+            path, playtimes, name_lookups, game_filesizes, declared_filesizes, options, cache_dir
+        )
+
+    columns = GameColumns.from_dicts(playtimes, game_filesizes)
+
+    if len(columns) == 0:
+        return False
+
+    writer_type = WRITERS[options.format]
+    rows = columns.limited(options.top, options.bottom)
+
+    with open(path, "w", encoding="utf-8", newline=writer_type.newline) as f:
+        writer = writer_type(f, options.echo)
+        writer.start(len(rows), len(columns))
+        for game in columns.games(rows, name_lookups, declared_filesizes):
+            writer.game(game)
+
+        writer.finish(summarise(columns, name_lookups, declared_filesizes))
+
+    if options.echo:
+        print("The above output has also been written to {}.".format(
+            os.path.abspath(path)
+        ))
+
+    return True
+
+
+def listed_games(ranking: Ranking, options: ReportOptions) -> List[int]:
+    """
+    Game IDs to list, from most to least GB per hour played, for options' top/bottom limits. The ranking is already
+    in order, so a limited listing only reads its ends.
+    """
+    keys = ranking.keys
+    top = options.top or 0
+    bottom = options.bottom or 0
+    if not (top or bottom) or top + bottom >= len(keys):
+        return list(ranking.ranked())
+
+    listed = [key[2] for key in reversed(keys[len(keys) - top:])] if top else []
+    listed.extend(key[2] for key in reversed(keys[:bottom]))
+    return listed
+
+
+def write_memoized_report(path: str, playtimes: Dict[int, int], name_lookups: Dict[int, str],
+                          game_filesizes: Dict[int, int], declared_filesizes: Optional[Dict[int, int]],
+                          options: ReportOptions, cache_dir: str) -> bool:
+    """
+    write_report(), copying the stored report if nothing it depends on changed, and otherwise only ranking and
+    formatting the games that did.
+    """
+    inputs = report_cache.game_inputs(playtimes, name_lookups, game_filesizes, declared_filesizes)
+    if not inputs:
+        return False
+
+    writer_type = WRITERS[options.format]
+    cache = report_cache.cache_for(cache_dir, path)
+    report_fingerprint = report_cache.fingerprint(inputs, options)
+
+    if cache.matches(report_fingerprint) and cache.restore(path):
+        log_info(LOGLEVEL.DEBUG, "Nothing in {} changed since it was last written, using the stored report".format(
+            path
+        ))
+    else:
+        stored = cache.load_rows(options.format)
+        if stored is not None:
+            changed = stored.changes(inputs)
+            # Each insert moves every game ranked above it, so for lots of changes one sort is quicker
+            if len(changed) <= len(inputs) // 4:
+                stored.patch(inputs, changed)
+                log_info(LOGLEVEL.DEBUG, "Patched {} changed games into the stored report".format(len(changed)))
+            else:
+                stored = None
+
+        if stored is None:
+            stored = report_cache.StoredRows.build(inputs)
+
+        listed = listed_games(stored.ranking, options)
+        spans = {}
+        with open(path, "w", encoding="utf-8", newline=writer_type.newline) as f, \
+                (open(stored.output, "rb") if stored.spans else nullcontext()) as source:
+            # Echoed below, from the file, the same as a stored report is
+            writer = writer_type(f, False)
+            writer.start(len(listed), len(inputs))
+            for run, gameids in stored.runs(listed):
+                if run is None:
+                    gameid = gameids[0]
+                    minutes, size, declared, name = inputs[gameid]
+                    start = writer.row(writer.format_game(GameResult(
+                        gameid, name, minutes, size, declared, gb_per_hour(size, minutes)
+                    )))
+                    spans[gameid] = (start, writer.written, len(spans))
+                else:
+                    # Where the run starts now, less where it started before
+                    shift = writer.copy(source, *run) - run[0]
+                    for gameid in gameids:
+                        start, end, _ = stored.spans[gameid]
+                        spans[gameid] = (start + shift, end + shift, len(spans))
+
+            writer.finish(summarise_stored(stored))
+
+        stored.spans = spans
+        cache.save(report_fingerprint, path, options.format, stored)
+
+    if options.echo:
+        with open(path, encoding="utf-8", newline=writer_type.newline) as f:
+            shutil.copyfileobj(f, sys.stdout)
+
+        print("The above output has also been written to {}.".format(
+            os.path.abspath(path)
+        ))
+
+    return True
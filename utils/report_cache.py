@@ -0,0 +1,324 @@
+"""Memoized reports, so a run where little or nothing changed doesn't rank and format every game again.
+
+Each report file gets its own directory in the account's cache (reports/<hash of the report's path>) holding:
+
+    fingerprint   hash of everything the report depends on: each ranked game's playtime, size, declared size and
+                  name, plus the format and top/bottom limits
+    output        the report exactly as it was last written
+    rows.bin      a header, then one column per ROW_COLUMNS of fixed-width values in native byte order, with a row
+                  per ranked game from least to most GB per hour played, then the games' names and the game IDs on
+                  the Pareto frontier
+
+If the fingerprint matches, the stored report is copied into place. Otherwise the stored ranking is patched with just
+the games that changed, the summary is read off the ranking, and only the changed games' rows are formatted again: runs
+of games that were listed next to each other last time and still are get copied out of the stored report in one go, as
+bytes, a chunk at a time. The fingerprint and rows are removed before anything else is stored and the fingerprint is
+written last, so a run that's interrupted part way through is never taken for an unchanged one, and rows never point
+into a different report.
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+import struct
+from array import array
+from itertools import chain, repeat
+from operator import itemgetter
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .basiclogger import log_failure, log_info, LOGLEVEL
+from .stats import pareto_frontier, Ranking
+
+ROWS_MAGIC = b"SGHR"
+ROWS_VERSION = 3
+# magic, version, report format, number of games, whether there are declared sizes, length of the names in bytes,
+# number of games on the Pareto frontier
+ROWS_HEADER = struct.Struct("=4sI8sI?QI")
+
+# Column name -> array typecode, in the order they're stored. The names follow, separated by NUL characters, and then
+# the frontier's game IDs as "q" values.
+ROW_COLUMNS = {
+    "appid": "q",
+    "minutes": "q",
+    "size": "q",
+    # 0 if the report wasn't measured
+    "declared": "q",
+    "gb_per_hour": "d",
+    # Where the game's row is in the stored report, in bytes, and where it was in the listing. -1 for games that
+    # weren't listed because of a top/bottom limit.
+    "start": "q",
+    "end": "q",
+    "position": "q"
+}
+
+# (minutes played, size in bytes, declared size or None, name). Plain tuples rather than a NamedTuple, since there's
+# one per game on every run and they're compared with set operations.
+GameInputs = Tuple[int, int, Optional[int], str]
+# (start, end, position in the listing), see ROW_COLUMNS
+Span = Tuple[int, int, int]
+
+NOT_LISTED: Span = (-1, -1, -1)
+
+
+def game_inputs(playtimes: Dict[int, int], name_lookups: Dict[int, str], game_filesizes: Dict[int, int],
+                declared_filesizes: Optional[Dict[int, int]] = None) -> Dict[int, GameInputs]:
+    """
+    What each installed and played game's row depends on, for the same games GameColumns.from_dicts picks.
+    """
+    return {
+        gameid: (
+            minutes, game_filesizes[gameid],
+            declared_filesizes.get(gameid, 0) if declared_filesizes is not None else None,
+            name_lookups[gameid]
+        )
+        for gameid, minutes in playtimes.items() if minutes > 0 and game_filesizes.get(gameid, 0) > 0
+    }
+
+
+def fingerprint(inputs: Dict[int, GameInputs], options) -> str:
+    """
+    :param inputs: From game_inputs
+    :param options: report.ReportOptions the report is written with. Whether it's echoed doesn't change the file.
+    """
+    # pickle is only used for its speed at turning the inputs into bytes; nothing is ever unpickled. Games aren't
+    # sorted: the Steam API lists them in the same order every time, and if it didn't, the only cost would be
+    # patching the stored report with nothing instead of copying it.
+    return hashlib.sha256(pickle.dumps(
+        (ROWS_VERSION, options.format, options.top, options.bottom, inputs), protocol=4
+    )).hexdigest()
+
+
+class StoredRows:
+    def __init__(self, ranking: Ranking, inputs: Dict[int, GameInputs], spans: Dict[int, Span],
+                 output: Optional[str], frontier: Optional[List[int]] = None):
+        """
+        :param ranking: Every game in inputs, ranked
+        :param inputs: Game ID -> what its row was made from
+        :param spans: Game ID -> where its row is in output, for the games that were listed
+        :param output: Path of the report the spans point into
+        :param frontier: Game IDs on the Pareto frontier of inputs, smallest first, if known
+        """
+        self.ranking = ranking
+        self.inputs = inputs
+        self.spans = spans
+        self.output = output
+        self._frontier = frontier
+
+    @classmethod
+    def build(cls, inputs: Dict[int, GameInputs]) -> "StoredRows":
+        """
+        Rank every game from scratch, with no rows to reuse.
+        """
+        return cls(
+            Ranking.build((gameid, minutes, size) for gameid, (minutes, size, _, _) in inputs.items()), inputs, {}, None
+        )
+
+    def changes(self, inputs: Dict[int, GameInputs]) -> Set[int]:
+        """
+        Game IDs that were added, removed or changed in inputs since these rows were stored.
+        """
+        return set(map(itemgetter(0), inputs.items() ^ self.inputs.items()))
+
+    def patch(self, inputs: Dict[int, GameInputs], changed: Set[int]):
+        """
+        Re-rank the changed games, forget their rows and update the Pareto frontier.
+        """
+        if self._frontier is not None:
+            if changed.isdisjoint(self._frontier):
+                # Every game that wasn't on the frontier is beaten by one that was, and still is since none of those
+                # changed, so the changed games are the only ones that could join it
+                self._frontier = pareto_frontier(
+                    (gameid, *inputs[gameid][:2]) for gameid in chain(self._frontier, changed) if gameid in inputs
+                )
+            else:
+                self._frontier = None
+
+        for gameid in changed:
+            self.spans.pop(gameid, None)
+            if gameid in inputs:
+                minutes, size, _, _ = inputs[gameid]
+                self.ranking.update(gameid, minutes, size)
+            else:
+                self.ranking.remove(gameid)
+
+        self.inputs = inputs
+
+    def frontier(self) -> List[int]:
+        """
+        Game IDs on the Pareto frontier, smallest first.
+        """
+        if self._frontier is None:
+            self._frontier = pareto_frontier((gameid, minutes, size) for gameid, (minutes, size, _, _) in
+                                             self.inputs.items())
+
+        return self._frontier
+
+    def runs(self, listed: List[int]) -> Iterator[Tuple[Optional[Tuple[int, int]], List[int]]]:
+        """
+        Split the games to list into runs that can be copied out of the stored report whole.
+
+        :return: ((start, end) in the stored report, game IDs in it) for each run, with None instead of where it is
+                 for a game whose row needs formatting
+        """
+        spans = self.spans
+        run: List[int] = []
+        for gameid in listed:
+            span = spans.get(gameid)
+            if run and span is not None and span[2] == spans[run[-1]][2] + 1:
+                run.append(gameid)
+                continue
+
+            if run:
+                yield (spans[run[0]][0], spans[run[-1]][1]), run
+
+            if span is None:
+                run = []
+                yield None, [gameid]
+            else:
+                run = [gameid]
+
+        if run:
+            yield (spans[run[0]][0], spans[run[-1]][1]), run
+
+
+class ReportCache:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def matches(self, report_fingerprint: str) -> bool:
+        try:
+            with open(self.path("fingerprint"), encoding="utf-8") as f:
+                return f.read() == report_fingerprint
+        except OSError:
+            return False
+
+    def restore(self, path: str) -> bool:
+        """
+        Copy the stored report to path.
+
+        :return: False if it couldn't be copied
+        """
+        try:
+            shutil.copyfile(self.path("output"), path)
+            return True
+        except OSError as e:
+            log_info(LOGLEVEL.DEBUG, "Couldn't use the stored report ({})".format(e))
+            return False
+
+    def load_rows(self, report_format: str) -> Optional[StoredRows]:
+        """
+        :return: The stored ranking and rows, or None if there aren't any for this format
+        """
+        try:
+            with open(self.path("rows.bin"), "rb") as f:
+                data = f.read()
+
+            output_size = os.path.getsize(self.path("output"))
+            magic, version, stored_format, count, measured, names_length, frontier_length = ROWS_HEADER.unpack_from(
+                data, 0
+            )
+        except (OSError, ValueError, struct.error) as e:
+            log_info(LOGLEVEL.DEBUG, "No usable stored rows ({})".format(e))
+            return None
+
+        if magic != ROWS_MAGIC or version != ROWS_VERSION or stored_format.rstrip(b"\0") != report_format.encode():
+            return None
+
+        columns = {}
+        offset = ROWS_HEADER.size
+        for name, typecode in ROW_COLUMNS.items():
+            column = array(typecode)
+            end = offset + count * column.itemsize
+            if end > len(data):
+                return None
+
+            column.frombytes(data[offset:end])
+            columns[name] = column
+            offset = end
+
+        names = data[offset:offset + names_length].decode("utf-8", errors="replace").split("\0")
+        frontier = array("q")
+        frontier.frombytes(data[offset + names_length:offset + names_length + frontier_length * frontier.itemsize])
+        if len(names) != count or len(frontier) != frontier_length or (count and max(columns["end"]) > output_size):
+            return None
+
+        appids = columns["appid"]
+        # Stored in ranking order, so there's nothing to sort
+        ranking = Ranking()
+        ranking.keys = list(zip(columns["gb_per_hour"], columns["minutes"], appids))
+        ranking.key_of = dict(zip(appids, ranking.keys))
+
+        return StoredRows(
+            ranking,
+            dict(zip(appids, zip(
+                columns["minutes"], columns["size"], columns["declared"] if measured else repeat(None), names
+            ))),
+            {
+                gameid: span
+                for gameid, span in zip(appids, zip(columns["start"], columns["end"], columns["position"]))
+                if span[2] >= 0
+            },
+            self.path("output"),
+            frontier.tolist()
+        )
+
+    def save(self, report_fingerprint: str, path: str, report_format: str, stored: StoredRows):
+        """
+        Store the report just written to path, along with what it was made from.
+        """
+        keys = stored.ranking.keys
+        appids = list(map(itemgetter(2), keys))
+        games = list(map(stored.inputs.__getitem__, appids))
+        spans = [stored.spans.get(gameid, NOT_LISTED) for gameid in appids]
+        measured = bool(games) and games[0][2] is not None
+        values = {
+            "appid": appids,
+            "minutes": map(itemgetter(1), keys),
+            "size": map(itemgetter(1), games),
+            "declared": map(itemgetter(2), games) if measured else repeat(0, len(games)),
+            "gb_per_hour": map(itemgetter(0), keys),
+            "start": map(itemgetter(0), spans),
+            "end": map(itemgetter(1), spans),
+            "position": map(itemgetter(2), spans)
+        }
+        names = "\0".join(map(itemgetter(3), games)).encode("utf-8")
+        frontier = stored.frontier()
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Removed first, so nothing matches or is patched until the rest is written
+            for filename in ("fingerprint", "rows.bin"):
+                if os.path.exists(self.path(filename)):
+                    os.remove(self.path(filename))
+
+            shutil.copyfile(path, self.path("output"))
+
+            with open(self.path("rows.bin.tmp"), "wb") as f:
+                f.write(ROWS_HEADER.pack(
+                    ROWS_MAGIC, ROWS_VERSION, report_format.encode(), len(keys), measured, len(names), len(frontier)
+                ))
+                for name, typecode in ROW_COLUMNS.items():
+                    f.write(array(typecode, values[name]).tobytes())
+                f.write(names)
+                f.write(array("q", frontier).tobytes())
+            os.replace(self.path("rows.bin.tmp"), self.path("rows.bin"))
+
+            with open(self.path("fingerprint.tmp"), "w", encoding="utf-8") as f:
+                f.write(report_fingerprint)
+            os.replace(self.path("fingerprint.tmp"), self.path("fingerprint"))
+        except OSError as e:
+            log_failure(LOGLEVEL.INFO, "Couldn't store the report for next time ({})".format(e))
+
+
+def cache_for(cache_dir: str, path: str) -> ReportCache:
+    """
+    The cache for the report written to path.
+
+    :param cache_dir: Directory all of an account's stored reports are kept in
+    """
+    key = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+    return ReportCache(os.path.join(cache_dir, key))
@@ -0,0 +1,248 @@
+"""Report output formats.
+
+Writers are given the games one at a time and write each straight to the file (and the console, if echoing), so
+the report is never held in memory as text. Rows kept from an earlier report (see report_cache) are copied across as
+bytes, a chunk at a time. Add a format by subclassing ReportWriter and adding it to WRITERS.
+"""
+
+import csv
+import io
+import json
+import os
+from typing import BinaryIO, Dict, List, NamedTuple
+
+from .stats import BYTES_PER_GB, GameResult, HISTOGRAM_EDGES
+
+HISTOGRAM_WIDTH = 40
+
+# Bytes read at a time when copying rows from an earlier report
+COPY_CHUNK = 1 << 20
+
+
+class ReportSummary(NamedTuple):
+    # Every installed and played game, including any not listed because of a top/bottom limit
+    total: int
+    average_gb_per_hour: float
+    best: GameResult
+    worst: GameResult
+    # Percent -> GB/hr
+    percentiles: Dict[float, float]
+    # Games per GB/hr bucket, see stats.GameColumns.histogram
+    histogram: List[int]
+    # Games no other game is both smaller than and played for longer than, smallest first
+    pareto_frontier: List[GameResult]
+
+
+def print_and_write(fp, *st, end="\n", echo=True):
+    fp.write(" ".join(s for s in st) + end)
+    if echo:
+        print(*st, end=end)
+
+
+def format_gb(size: int) -> str:
+    return "{} GB".format(round(size / BYTES_PER_GB, 2))
+
+
+def format_playtime(minutes: int) -> str:
+    return "{}h {}m".format(minutes // 60, minutes % 60)
+
+
+def histogram_labels() -> List[str]:
+    return ["under {}".format(HISTOGRAM_EDGES[0])] + [
+        "{} to {}".format(low, high) for low, high in zip(HISTOGRAM_EDGES, HISTOGRAM_EDGES[1:])
+    ] + ["{} and up".format(HISTOGRAM_EDGES[-1])]
+
+
+class ReportWriter:
+    extension = ".log"
+    # Passed to open(); the csv module wants newline=""
+    newline = None
+
+    def __init__(self, fp, echo: bool = True):
+        """
+        :param fp: Opened with encoding="utf-8" and this writer's newline, so written counts what's in the file
+        """
+        self.fp = fp
+        self.echo = echo
+        # Bytes written to the file so far
+        self.written = 0
+        # Extra bytes each "\n" takes in the file, where it's written as os.linesep
+        self.newline_extra = len(os.linesep) - 1 if self.newline is None else 0
+
+    def write(self, text: str):
+        print_and_write(self.fp, text, end="", echo=self.echo)
+        self.written += len(text.encode("utf-8")) + (text.count("\n") * self.newline_extra if self.newline_extra else 0)
+
+    def start(self, listed: int, total: int):
+        """
+        :param listed: How many games are going to be written
+        :param total: How many games there are, including any left out because of a top/bottom limit
+        """
+
+    def format_game(self, game: GameResult) -> str:
+        raise NotImplementedError
+
+    def before_row(self):
+        """
+        Write whatever goes before each row (or run of rows copied from an earlier report).
+        """
+
+    def row(self, text: str) -> int:
+        """
+        Write text from format_game.
+
+        :return: Where text starts, in bytes written
+        """
+        self.before_row()
+        start = self.written
+        self.write(text)
+        return start
+
+    def copy(self, source: BinaryIO, start: int, end: int) -> int:
+        """
+        Copy bytes start to end of an earlier report in the same format, one or more whole rows, without decoding
+        them. They aren't echoed.
+
+        :return: Where they start, in bytes written
+        """
+        self.before_row()
+        position = self.written
+
+        # Everything written as text has to reach the file before the bytes do
+        self.fp.flush()
+        source.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = source.read(min(remaining, COPY_CHUNK))
+            if not chunk:
+                raise OSError("Earlier report ended before the rows being copied from it")
+
+            self.fp.buffer.write(chunk)
+            remaining -= len(chunk)
+
+        self.written += end - start
+        return position
+
+    def game(self, game: GameResult):
+        self.row(self.format_game(game))
+
+    def finish(self, summary: ReportSummary):
+        pass
+
+
+class TableWriter(ReportWriter):
+    def start(self, listed: int, total: int):
+        if listed < total:
+            self.write("{} games installed and played, showing {}:\n\n".format(total, listed))
+        else:
+            self.write("{} games installed and played:\n\n".format(total))
+
+    def format_game(self, game: GameResult) -> str:
+        if game.declared_size is not None:
+            size = "{} (declared {})".format(format_gb(game.size), format_gb(game.declared_size))
+        else:
+            size = "{} ({} B)".format(format_gb(game.size), game.size)
+
+        return "{:60}| {:12} | {:40} | {} GB/hr\n".format(
+            game.name, format_playtime(game.playtime), size, round(game.gb_per_hour, 4)
+        )
+
+    def finish(self, summary: ReportSummary):
+        self.write("\nThe average game size in GB for one hour of your time is {} GB.\n\n".format(
+            round(summary.average_gb_per_hour, 4)
+        ))
+
+        self.write("The best value (least GB) per hour played of your games is {} ({} GB/hr).\n".format(
+            summary.best.name, round(summary.best.gb_per_hour, 4)
+        ))
+        self.write("The worst value (most GB) per hour played of your games is {} ({} GB/hr).\n".format(
+            summary.worst.name, round(summary.worst.gb_per_hour, 4)
+        ))
+
+        self.write("\nGB/hr percentiles: {}\n".format(", ".join(
+            "{}th {}".format(percent, round(value, 4)) for percent, value in summary.percentiles.items()
+        )))
+
+        most = max(summary.histogram)
+        self.write("\nGames by GB/hr:\n")
+        for label, count in zip(histogram_labels(), summary.histogram):
+            self.write("{:>14} | {:>6} {}".format(label, count, "#" * round(count / most * HISTOGRAM_WIDTH)).rstrip()
+                       + "\n")
+
+        self.write("\nNo other game is both smaller and played for longer than these:\n")
+        for game in summary.pareto_frontier:
+            self.write("{:60}| {:12} | {}\n".format(game.name, format_playtime(game.playtime), format_gb(game.size)))
+
+
+class CsvWriter(ReportWriter):
+    extension = ".csv"
+    newline = ""
+
+    def start(self, listed: int, total: int):
+        self.buffer = io.StringIO()
+        self.rows = csv.writer(self.buffer)
+        self.row(self.format_row(GameResult._fields))
+
+    def format_row(self, values) -> str:
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.rows.writerow(values)
+        return self.buffer.getvalue()
+
+    def format_game(self, game: GameResult) -> str:
+        return self.format_row(game)
+
+
+class JsonLinesWriter(ReportWriter):
+    extension = ".jsonl"
+
+    def format_game(self, game: GameResult) -> str:
+        return json.dumps(game._asdict()) + "\n"
+
+
+class JsonWriter(ReportWriter):
+    """
+    {"games": [...], "summary": {...}}, with the games written as they come.
+    """
+    extension = ".json"
+
+    def start(self, listed: int, total: int):
+        self.first = True
+        self.write('{"games": [')
+
+    def format_game(self, game: GameResult) -> str:
+        return json.dumps(game._asdict())
+
+    def before_row(self):
+        self.write("\n    " if self.first else ",\n    ")
+        self.first = False
+
+    def finish(self, summary: ReportSummary):
+        self.write('\n], "summary": {}}}\n'.format(json.dumps(summary_dict(summary), indent=4)))
+
+
+def summary_dict(summary: ReportSummary) -> dict:
+    """
+    The summary as it's written in JSON reports.
+    """
+    return {
+        "games": summary.total,
+        "average_gb_per_hour": summary.average_gb_per_hour,
+        "best": summary.best._asdict(),
+        "worst": summary.worst._asdict(),
+        "percentiles": {str(percent): value for percent, value in summary.percentiles.items()},
+        "histogram": [
+            {"from": low, "to": high, "games": count}
+            for low, high, count in zip((None,) + HISTOGRAM_EDGES, HISTOGRAM_EDGES + (None,), summary.histogram)
+        ],
+        "pareto_frontier": [game._asdict() for game in summary.pareto_frontier]
+    }
+
+
+WRITERS: Dict[str, type] = {
+    "table": TableWriter,
+    "csv": CsvWriter,
+    "jsonl": JsonLinesWriter,
+    "json": JsonWriter
+}
+
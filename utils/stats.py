@@ -0,0 +1,284 @@
+"""Statistics over the games in a report, kept as columns of numbers.
+
+Each game is a row across a few array.array columns, so a report with hundreds of thousands of games (e.g. batch
+mode adding up many accounts) stores plain 8 byte numbers rather than a Python object per value, and whole columns
+are worked through with map() and builtins instead of per-game Python code. Best, worst and top-K use heapq, so only
+listing every game in order needs a full sort.
+"""
+
+import bisect
+import heapq
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from functools import partial
+from operator import truediv
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+BYTES_PER_GB = 1000 * 1000 * 1000
+MINUTES_PER_HOUR = 60
+
+PERCENTILES = (10, 25, 50, 75, 90)
+# GB/hr bucket boundaries. GB/hr spans a few orders of magnitude, so they're roughly logarithmic.
+HISTOGRAM_EDGES = (0.01, 0.03, 0.1, 0.3, 1, 3, 10, 30, 100)
+
+
+def gb_per_hour(size: int, minutes: int) -> float:
+    """
+    GB per hour played for one game, worked out the same way as GameColumns does for whole columns.
+    """
+    return (size * MINUTES_PER_HOUR) / (minutes * BYTES_PER_GB)
+
+
+def interpolate_percentiles(count: int, value_at: Callable[[int], float],
+                            percents: Sequence[float] = PERCENTILES) -> Dict[float, float]:
+    """
+    GB/hr at each percentile, interpolating between the games either side of it.
+
+    :param count: Number of games, at least 1
+    :param value_at: GB/hr of the i-th game, least first
+    """
+    result = {}
+    for percent in percents:
+        position = (count - 1) * percent / 100
+        lower = int(position)
+        upper = min(lower + 1, count - 1)
+        result[percent] = value_at(lower) + (value_at(upper) - value_at(lower)) * (position - lower)
+
+    return result
+
+
+def pareto_frontier(games: Iterable[Tuple[int, int, int]]) -> List[int]:
+    """
+    The games GameColumns.pareto_frontier would pick out of these.
+
+    :param games: (game ID, minutes played, size in bytes) for each game
+    :return: Their game IDs, from smallest to largest
+    """
+    frontier = []
+    most_played = 0
+    for _, negative_minutes, gameid in sorted((size, -minutes, gameid) for gameid, minutes, size in games):
+        if -negative_minutes > most_played:
+            frontier.append(gameid)
+            most_played = -negative_minutes
+
+    return frontier
+
+
+class GameResult(NamedTuple):
+    appid: int
+    name: str
+    # Minutes played
+    playtime: int
+    # Bytes, measured on disk if the report was measured
+    size: int
+    # Bytes according to the game's manifest, only set if the report was measured
+    declared_size: Optional[int]
+    gb_per_hour: float
+
+
+class GameColumns:
+    """
+    Installed and played games, one row per game. Methods that pick games out return row numbers, which index
+    every column.
+    """
+
+    def __init__(self, appids: Iterable[int], minutes: Iterable[int], sizes: Iterable[int]):
+        """
+        :param appids: Game IDs
+        :param minutes: Minutes played per game, all above 0
+        :param sizes: Size in bytes per game, all above 0
+        """
+        self.appids = array("q", appids)
+        self.minutes = array("q", minutes)
+        self.sizes = array("q", sizes)
+        # (bytes * 60) / (minutes * 10^9) rather than bytes / minutes * a factor, which rounds whole numbers off
+        self.gb_per_hour = array("d", map(
+            truediv, map(MINUTES_PER_HOUR.__mul__, self.sizes), map(BYTES_PER_GB.__mul__, self.minutes)
+        ))
+
+        self._rank_key = None
+        self._sorted_values = None
+
+    @classmethod
+    def from_dicts(cls, playtimes: Dict[int, int], game_filesizes: Dict[int, int]) -> "GameColumns":
+        """
+        :param playtimes: Game ID -> minutes played
+        :param game_filesizes: Game ID -> size in bytes
+        """
+        appids = [
+            gameid for gameid, minutes in playtimes.items() if minutes > 0 and game_filesizes.get(gameid, 0) > 0
+        ]
+        return cls(appids, map(playtimes.__getitem__, appids), map(game_filesizes.__getitem__, appids))
+
+    def __len__(self):
+        return len(self.appids)
+
+    def rank_key(self) -> List[tuple]:
+        # GB/hr, then playtime for games with the same GB/hr, then game ID, the same as Ranking's keys. Ties are
+        # broken the same way whichever of the two ranks the games, so memoized and fresh reports list them in the
+        # same order.
+        if self._rank_key is None:
+            self._rank_key = list(zip(self.gb_per_hour, self.minutes, self.appids))
+
+        return self._rank_key
+
+    def ranked(self) -> List[int]:
+        """
+        Every row, from most to least GB per hour played.
+        """
+        return sorted(range(len(self)), key=self.rank_key().__getitem__, reverse=True)
+
+    def limited(self, top: Optional[int] = None, bottom: Optional[int] = None) -> List[int]:
+        """
+        The top rows followed by the bottom rows, from most to least GB per hour played. Every row if neither is
+        set, or if they'd cover every row anyway.
+        """
+        top = top or 0
+        bottom = bottom or 0
+        if not (top or bottom) or top + bottom >= len(self):
+            return self.ranked()
+
+        rows = self.top(top) if top else []
+        if bottom:
+            rows.extend(reversed(self.top(bottom, most=False)))
+
+        return rows
+
+    def top(self, k: int, most: bool = True) -> List[int]:
+        """
+        The k rows with the most (or, if most is False, least) GB per hour played, without sorting every row.
+        """
+        if most:
+            return heapq.nlargest(k, range(len(self)), key=self.rank_key().__getitem__)
+
+        return heapq.nsmallest(k, range(len(self)), key=self.rank_key().__getitem__)
+
+    def game(self, row: int, name_lookups: Dict[int, str],
+             declared_filesizes: Optional[Dict[int, int]] = None) -> GameResult:
+        appid = self.appids[row]
+        return GameResult(
+            appid=appid,
+            name=name_lookups[appid],
+            playtime=self.minutes[row],
+            size=self.sizes[row],
+            declared_size=declared_filesizes.get(appid, 0) if declared_filesizes is not None else None,
+            gb_per_hour=self.gb_per_hour[row]
+        )
+
+    def games(self, rows: Iterable[int], name_lookups: Dict[int, str],
+              declared_filesizes: Optional[Dict[int, int]] = None) -> Iterator[GameResult]:
+        """
+        The games in rows, one at a time.
+        """
+        return (self.game(row, name_lookups, declared_filesizes) for row in rows)
+
+    def average(self) -> Optional[float]:
+        """
+        Total GB per total hour played, or None if there are no games.
+        """
+        if not len(self):
+            return None
+
+        return sum(self.sizes) * MINUTES_PER_HOUR / (sum(self.minutes) * BYTES_PER_GB)
+
+    def percentiles(self, percents: Sequence[float] = PERCENTILES) -> Dict[float, float]:
+        """
+        GB/hr at each percentile, interpolating between the games either side of it.
+        """
+        if not len(self):
+            return {}
+
+        # Sorting bare floats needs no key function, so it's much cheaper than ranking the games
+        if self._sorted_values is None:
+            self._sorted_values = array("d", sorted(self.gb_per_hour))
+
+        return interpolate_percentiles(len(self._sorted_values), self._sorted_values.__getitem__, percents)
+
+    def histogram(self, edges: Sequence[float] = HISTOGRAM_EDGES) -> List[int]:
+        """
+        Count games per GB/hr bucket. There's one more bucket than edges: bucket i holds games from edges[i - 1]
+        (inclusive) up to edges[i], the first holds everything below edges[0] and the last everything from edges[-1].
+        """
+        counts = Counter(map(partial(bisect_right, edges), self.gb_per_hour))
+        return [counts.get(bucket, 0) for bucket in range(len(edges) + 1)]
+
+    def pareto_frontier(self) -> List[int]:
+        """
+        Rows for the games no other game beats on both counts, i.e. none is smaller and has been played for longer.
+        Returned from smallest to largest. Of games the same size played for just as long, only the one with the lowest
+        game ID is on it.
+        """
+        by_size = sorted(range(len(self)), key=list(zip(
+            self.sizes, map(int.__neg__, self.minutes), self.appids
+        )).__getitem__)
+
+        frontier = []
+        most_played = 0
+        for row in by_size:
+            if self.minutes[row] > most_played:
+                frontier.append(row)
+                most_played = self.minutes[row]
+
+        return frontier
+
+
+class Ranking:
+    """
+    Game IDs ordered by GB per hour played, kept in order one game at a time instead of being sorted again.
+    """
+
+    def __init__(self):
+        # (GB/hr, minutes played, game ID), least GB/hr first. Ordered the same as GameColumns.rank_key.
+        self.keys: List[Tuple[float, int, int]] = []
+        self.key_of: Dict[int, Tuple[float, int, int]] = {}
+
+    @classmethod
+    def build(cls, games: Iterable[Tuple[int, int, int]]) -> "Ranking":
+        """
+        Rank many games at once with a single sort.
+
+        :param games: (game ID, minutes played, size in bytes) for every game
+        """
+        ranking = cls()
+        ranking.key_of = {gameid: (gb_per_hour(size, minutes), minutes, gameid) for gameid, minutes, size in games}
+        ranking.keys = sorted(ranking.key_of.values())
+        return ranking
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, gameid: int, minutes: int, size: int):
+        self.remove(gameid)
+
+        key = (gb_per_hour(size, minutes), minutes, gameid)
+        bisect.insort(self.keys, key)
+        self.key_of[gameid] = key
+
+    def remove(self, gameid: int):
+        key = self.key_of.pop(gameid, None)
+        if key is not None:
+            del self.keys[bisect.bisect_left(self.keys, key)]
+
+    def ranked(self) -> Iterator[int]:
+        """
+        Game IDs from most to least GB per hour played.
+        """
+        return (key[2] for key in reversed(self.keys))
+
+    def percentiles(self, percents: Sequence[float] = PERCENTILES) -> Dict[float, float]:
+        """
+        The same as GameColumns.percentiles, reading the few games it needs straight out of the ranking.
+        """
+        if not self.keys:
+            return {}
+
+        return interpolate_percentiles(len(self.keys), lambda i: self.keys[i][0], percents)
+
+    def histogram(self, edges: Sequence[float] = HISTOGRAM_EDGES) -> List[int]:
+        """
+        The same as GameColumns.histogram, from where each edge falls in the ranking.
+        """
+        # A 1-tuple sorts before every key with the same GB/hr, so this is how many games have less than each edge
+        below = [0] + [bisect.bisect_left(self.keys, (edge,)) for edge in edges] + [len(self.keys)]
+        return [high - low for low, high in zip(below, below[1:])]
@@ -0,0 +1,127 @@
+"""A small streaming reader for Valve's KeyValues (VDF) text format, as used by appmanifest_*.acf and
+libraryfolders.vdf."""
+
+import re
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+STRING = 0
+OPEN = 1
+CLOSE = 2
+
+# One token per match: a quoted string, a brace, a comment, a bare word, or the start of a quoted string that
+# carries on over the next line
+TOKEN_PATTERN = re.compile(r'\s*(?:"([^"\\]*(?:\\.[^"\\]*)*)"|([{}])|(//[^\n]*)|([^\s{}"]+)|("))')
+
+ESCAPES = {"\\n": "\n", "\\t": "\t", "\\\\": "\\", "\\\"": "\""}
+ESCAPE_PATTERN = re.compile(r'\\[nt\\"]')
+
+
+def unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+
+    return ESCAPE_PATTERN.sub(lambda m: ESCAPES[m.group(0)], value)
+
+
+def tokenize(fp: Iterable[str]) -> Iterator[Tuple[int, Optional[str]]]:
+    """
+    Yield (kind, value) tokens from VDF text, reading it one line at a time. kind is STRING, OPEN or CLOSE;
+    value is only set for strings.
+
+    :param fp: A text file or any iterable of lines
+    """
+    pending = ""
+    for line in fp:
+        if pending:
+            line = pending + line
+            pending = ""
+
+        for match in TOKEN_PATTERN.finditer(line):
+            group = match.lastindex
+
+            if group == 1:
+                yield STRING, unescape(match.group(1))
+            elif group == 2:
+                yield (OPEN if match.group(2) == "{" else CLOSE), None
+            elif group == 4:
+                bare = match.group(4)
+                # Conditionals like [$WIN32] apply to the previous pair, they aren't keys or values
+                if not bare.startswith("["):
+                    yield STRING, bare
+            elif group == 5:
+                pending = line[match.start():]
+                break
+
+
+def read_keys(fp: Iterable[str], keys: Iterable[str], depth: int = 1) -> Dict[str, str]:
+    """
+    Read the values of some keys at one nesting level, stopping as soon as all of them have been found or that
+    level ends. Keys are matched case-insensitively, like Steam does.
+
+    For an appmanifest, depth 1 is the contents of the top-level "AppState" section, so a key with the same
+    name inside e.g. "InstalledDepots" isn't matched.
+
+    :param fp: A text file or any iterable of lines
+    :param keys: Names of the keys to find
+    :param depth: Nesting level the keys are at
+    :return: Key as it was asked for -> value, for the keys that were found
+    """
+    wanted = {key.lower(): key for key in keys}
+    found = {}
+
+    level = 0
+    key = None
+    for kind, value in tokenize(fp):
+        if kind == OPEN:
+            level += 1
+            key = None
+        elif kind == CLOSE:
+            level -= 1
+            key = None
+            if level < depth:
+                break
+        elif key is None:
+            key = value
+        else:
+            if level == depth and key.lower() in wanted:
+                found[wanted[key.lower()]] = value
+                if len(found) == len(wanted):
+                    break
+
+            key = None
+
+    return found
+
+
+def load(fp: Iterable[str]) -> dict:
+    """
+    Parse a whole VDF document into nested dicts.
+
+    :param fp: A text file or any iterable of lines
+    """
+    root = {}
+    stack = [root]
+    key = None
+
+    for kind, value in tokenize(fp):
+        if kind == OPEN:
+            section = {}
+            stack[-1][key if key is not None else ""] = section
+            stack.append(section)
+            key = None
+        elif kind == CLOSE:
+            if len(stack) > 1:
+                stack.pop()
+            key = None
+        elif key is None:
+            key = value
+        else:
+            stack[-1][key] = value
+            key = None
+
+    return root
+
+
+def load_file(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return load(f)
@@ -0,0 +1,175 @@
+"""Watch Steam libraries for app manifests being written, added or removed.
+
+On Linux the libraries are watched with inotify (through ctypes, so nothing needs installing) and changes are seen
+as soon as they happen. Elsewhere, or if inotify can't be set up, each library is listed every few seconds and
+manifests whose mtime or size changed are reported instead.
+
+Both watchers have the same interface: changes() waits for something to change and returns the paths of the
+manifests that did, or None if changes were missed and everything should be read again.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .basiclogger import log_failure, log_info, LOGLEVEL
+from .library_scanner import MANIFEST_PATTERN
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    def __init__(self, directories: Iterable[str], settle_time: float):
+        """
+        :param directories: steamapps directories to watch
+        :param settle_time: How long to keep collecting changes after the first one, so a manifest Steam writes in
+                            several steps is only read once it's finished
+        :raises OSError: If inotify isn't available or a directory can't be watched
+        """
+        self.settle_time = settle_time
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify isn't available")
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.directories: Dict[int, str] = {}
+        try:
+            for directory in directories:
+                wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+                if wd < 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, "Couldn't watch {} ({})".format(directory, os.strerror(errno)))
+
+                self.directories[wd] = directory
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def read_events(self) -> Tuple[Set[str], bool]:
+        paths = set()
+        overflowed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                elif wd in self.directories and MANIFEST_PATTERN.match(os.fsdecode(name)):
+                    paths.add(os.path.join(self.directories[wd], os.fsdecode(name)))
+
+        return paths, overflowed
+
+    def changes(self, timeout: float) -> Optional[Set[str]]:
+        """
+        Wait up to timeout seconds for manifests to change.
+
+        :return: Paths of the manifests that changed (empty if nothing did), or None if inotify dropped events
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+
+        time.sleep(self.settle_time)
+        paths, overflowed = self.read_events()
+        return None if overflowed else paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, directories: Iterable[str], interval: float):
+        """
+        :param directories: steamapps directories to watch
+        :param interval: Seconds between listing the directories
+        """
+        self.directories: List[str] = list(directories)
+        self.interval = interval
+        self.next_poll = time.monotonic() + interval
+        self.seen = self.list_manifests()
+
+    def list_manifests(self) -> Dict[str, Tuple[int, int]]:
+        manifests = {}
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if MANIFEST_PATTERN.match(entry.name):
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue
+
+                            manifests[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError as e:
+                log_failure(LOGLEVEL.DEBUG, "Couldn't list {} ({})".format(directory, e))
+
+        return manifests
+
+    def changes(self, timeout: float) -> Optional[Set[str]]:
+        """
+        Wait up to timeout seconds for the next time to list the libraries.
+
+        :return: Paths of the manifests that changed (empty if nothing did)
+        """
+        wait = self.next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+
+        time.sleep(max(0.0, wait))
+        self.next_poll = time.monotonic() + self.interval
+
+        manifests = self.list_manifests()
+        changed = {path for path in manifests.keys() | self.seen.keys() if manifests.get(path) != self.seen.get(path)}
+        self.seen = manifests
+
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(directories: Iterable[str], poll_interval: float, settle_time: float):
+    """
+    Watch directories with inotify if possible, otherwise by listing them every poll_interval seconds.
+    """
+    directories = list(directories)
+
+    if sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher(directories, settle_time)
+            log_info(LOGLEVEL.DEBUG, "Watching {} libraries with inotify".format(len(directories)))
+            return watcher
+        except OSError as e:
+            log_failure(LOGLEVEL.INFO, "Couldn't watch Steam libraries with inotify ({}), checking them every {}s "
+                                       "instead".format(e, poll_interval))
+
+    return PollingWatcher(directories, poll_interval)